@@ -0,0 +1,162 @@
+"""
+Asynchronous batched auth activity logging for the Authentication Service
+Requests enqueue activity events into a bounded in-memory queue; a background
+task writes them in batches when the batch fills or the flush interval passes,
+so login latency no longer includes the activity write
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, List, Optional
+
+from db_executor import run_db
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+class ActivityLog:
+    """Bounded queue of activity events flushed in batches by a background task"""
+
+    def __init__(self, write_batch: Callable[[List[tuple]], None], max_queue: int = 10_000,
+                 batch_size: int = 200, flush_interval: float = 1.0,
+                 overflow: str = "drop_newest", block_timeout: float = 0.05):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown activity log overflow policy '{overflow}'")
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # Events taken off the queue but not yet written, flushed on shutdown
+        self._pending: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.write_errors = 0
+        self.lost = 0
+        self.last_flush_ms = 0.0
+
+    async def log(self, *event):
+        """Queue one activity event: the arguments of the batch writer's per-event call"""
+        try:
+            self._queue.put_nowait(event)
+            self.enqueued += 1
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow == "drop_oldest":
+            self._queue.get_nowait()
+            self._queue.put_nowait(event)
+            self.enqueued += 1
+            self.dropped += 1
+            return
+
+        if self.overflow == "block":
+            # Backpressure: hold the request briefly for room, then give up on the event
+            self.blocked += 1
+            try:
+                await asyncio.wait_for(self._queue.put(event), timeout=self.block_timeout)
+                self.enqueued += 1
+                return
+            except asyncio.TimeoutError:
+                pass
+
+        self.dropped += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _collect(self):
+        """Fill the pending batch until it is full or the flush interval has passed"""
+        if not self._pending:
+            self._pending.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(self._pending) < self.batch_size:
+            if not self._queue.empty():
+                self._pending.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        while True:
+            await self._collect()
+            batch, self._pending = self._pending, []
+            # A write in progress finishes even if the task is cancelled at shutdown
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+
+    async def _write(self, batch: List[tuple]):
+        started = time.perf_counter()
+        try:
+            await run_db(self.write_batch, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.write_errors += 1
+            self.lost += len(batch)
+            logger.error(f"Auth activity batch of {len(batch)} events failed: {e}")
+        self.batches += 1
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    async def stop(self):
+        """Stop the background task and write every pending event"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            await self._writing
+
+        while not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+        for start in range(0, len(self._pending), self.batch_size):
+            await self._write(self._pending[start:start + self.batch_size])
+        self._pending = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() + len(self._pending),
+            "max_queue": self._queue.maxsize,
+            "overflow": self.overflow,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 1) if self.batches else 0.0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "write_errors": self.write_errors,
+            "lost": self.lost,
+        }
+
+
+def build_activity_log(write_batch: Callable[[List[tuple]], None]) -> Optional[ActivityLog]:
+    """Batched activity log from ACTIVITY_LOG_* settings; None writes inline"""
+    if os.getenv("ACTIVITY_LOG_ASYNC", "true").lower() != "true":
+        return None
+    return ActivityLog(
+        write_batch,
+        max_queue=int(os.getenv("ACTIVITY_LOG_QUEUE_SIZE", "10000")),
+        batch_size=int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", "200")),
+        flush_interval=float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL", "1.0")),
+        overflow=os.getenv("ACTIVITY_LOG_OVERFLOW", "drop_newest").lower(),
+        block_timeout=float(os.getenv("ACTIVITY_LOG_BLOCK_TIMEOUT", "0.05"))
+    )
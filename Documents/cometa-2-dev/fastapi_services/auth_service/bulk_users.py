@@ -0,0 +1,115 @@
+"""
+Set-based bulk user operations for the Authentication Service
+Each batch checks uniqueness with one query, writes all valid rows in the
+caller's transaction and reports a result per input row. Functions flush but
+do not commit, so the caller commits the whole batch once
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+BULK_UNIQUE_FIELDS = ("email", "phone")
+
+
+def _taken(db: Session, model, values: Dict[str, set]) -> Dict[str, Dict[str, str]]:
+    """Existing owners (value -> user id) of the given emails and phones, in one query"""
+    conditions = [getattr(model, field).in_(list(found)) for field, found in values.items() if found]
+    taken = {field: {} for field in values}
+    if not conditions:
+        return taken
+    columns = [model.id] + [getattr(model, field) for field in values]
+    for row in db.query(*columns).filter(or_(*conditions)):
+        for field in values:
+            value = getattr(row, field)
+            if value in values[field]:
+                taken[field][value] = str(row.id)
+    return taken
+
+
+def _conflict(row: dict, taken: Dict[str, Dict[str, str]], seen: Dict[str, set],
+              user_id: Optional[str] = None) -> Optional[str]:
+    """Why the row would break email/phone uniqueness, if it would"""
+    for field in BULK_UNIQUE_FIELDS:
+        value = row.get(field)
+        if not value:
+            continue
+        owner = taken.get(field, {}).get(value)
+        if owner is not None and owner != user_id:
+            return f"{field.capitalize()} already registered"
+        if value in seen[field]:
+            return f"Duplicate {field} in batch"
+    return None
+
+
+def _claim(row: dict, seen: Dict[str, set]):
+    for field in BULK_UNIQUE_FIELDS:
+        if row.get(field):
+            seen[field].add(row[field])
+
+
+def bulk_create(db: Session, model, rows: List[dict]) -> List[dict]:
+    """Insert every row that keeps email/phone unique; one result per row"""
+    taken = _taken(db, model, {
+        field: {row[field] for row in rows if row.get(field)} for field in BULK_UNIQUE_FIELDS
+    })
+    seen = {field: set() for field in BULK_UNIQUE_FIELDS}
+    results, created = [], []
+
+    for index, row in enumerate(rows):
+        error = _conflict(row, taken, seen)
+        if error:
+            results.append({"index": index, "status": "error", "error": error})
+            continue
+        _claim(row, seen)
+        user = model(**row)
+        created.append((index, user))
+        results.append(None)
+
+    db.add_all([user for _, user in created])
+    db.flush()
+
+    for index, user in created:
+        results[index] = {"index": index, "status": "created", "id": str(user.id)}
+    return results
+
+
+def bulk_update(db: Session, model, updates: Dict[str, dict]) -> List[dict]:
+    """Apply field updates per user id; one result per id in input order"""
+    users = {str(user.id): user for user in db.query(model).filter(model.id.in_(list(updates)))}
+    taken = _taken(db, model, {
+        field: {data[field] for data in updates.values() if data.get(field)} for field in BULK_UNIQUE_FIELDS
+    })
+    seen = {field: set() for field in BULK_UNIQUE_FIELDS}
+    results = []
+
+    for user_id, data in updates.items():
+        user = users.get(str(user_id))
+        if user is None:
+            results.append({"id": user_id, "status": "error", "error": "User not found"})
+            continue
+        error = _conflict(data, taken, seen, str(user.id))
+        if error:
+            results.append({"id": user_id, "status": "error", "error": error})
+            continue
+        _claim(data, seen)
+        for field, value in data.items():
+            setattr(user, field, value)
+        results.append({"id": user_id, "status": "updated"})
+
+    db.flush()
+    return results
+
+
+def bulk_deactivate(db: Session, model, user_ids: List[str]) -> List[dict]:
+    """Deactivate the given users with a single UPDATE; one result per id"""
+    found = {str(user_id) for (user_id,) in db.query(model.id).filter(model.id.in_(list(user_ids)))}
+    if found:
+        db.query(model).filter(model.id.in_(list(found))).update(
+            {model.is_active: False}, synchronize_session=False
+        )
+    return [
+        {"id": user_id, "status": "deactivated"} if str(user_id) in found
+        else {"id": user_id, "status": "error", "error": "User not found"}
+        for user_id in user_ids
+    ]
@@ -0,0 +1,35 @@
+"""
+Bounded thread pool for blocking database work in the Authentication Service
+SQLAlchemy sessions are synchronous; running their queries through run_db keeps
+the event loop free while capping concurrency at the size of the connection pool
+"""
+import functools
+import os
+from typing import Any, Callable
+
+import anyio
+import anyio.to_thread
+
+from tracing import span
+
+# Matches the SQLAlchemy engine pool (pool_size + max_overflow) so threads never
+# queue inside the pool while holding a worker slot
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_THREADS = int(os.getenv("DB_THREADS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+db_limiter = anyio.CapacityLimiter(DB_THREADS)
+
+
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking database function in the bounded database thread pool"""
+    with span("db", call=getattr(func, "__name__", "db")):
+        return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=db_limiter)
+
+
+def db_pool_stats() -> dict:
+    return {
+        "threads": db_limiter.total_tokens,
+        "busy": db_limiter.borrowed_tokens,
+        "waiting": db_limiter.statistics().tasks_waiting,
+    }
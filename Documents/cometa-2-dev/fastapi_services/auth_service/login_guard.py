@@ -0,0 +1,355 @@
+"""
+Brute-force protection for logins to the Authentication Service
+Failed logins are counted per account and per source IP in sliding windows;
+crossing a threshold locks the key out for an exponentially growing period.
+IP locks are checked before any database work, account locks once the login
+identifier has been resolved to a user, and the counters live in a
+pluggable store: in-memory by default, a shared-memory table for the workers
+of one prefork launch, Redis when several hosts share them
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from worker_state import SharedTable, shared_table, state_dir
+
+logger = logging.getLogger(__name__)
+
+# Proxies whose X-Forwarded-For entries are trusted: loopback, plus the API
+# Gateway's addresses from LOGIN_TRUSTED_PROXIES. Whole private ranges are not
+# trusted, since any client on them could forge forwarding hops
+DEFAULT_TRUSTED_PROXIES = "127.0.0.0/8,::1/128"
+
+
+@dataclass
+class LockoutRule:
+    """threshold failures within window seconds lock the key out"""
+    threshold: int
+    window: float
+    base_lockout: float
+    max_lockout: float
+    # Lockout escalation is forgotten after this long without failures
+    reset_after: float
+
+    @classmethod
+    def from_env(cls, kind: str, threshold: int, window: float) -> "LockoutRule":
+        prefix = f"LOGIN_LOCKOUT_{kind.upper()}"
+        return cls(
+            threshold=int(os.getenv(f"{prefix}_THRESHOLD", str(threshold))),
+            window=float(os.getenv(f"{prefix}_WINDOW", str(window))),
+            base_lockout=float(os.getenv("LOGIN_LOCKOUT_BASE_SECONDS", "30")),
+            max_lockout=float(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS", "3600")),
+            reset_after=float(os.getenv("LOGIN_LOCKOUT_RESET_SECONDS", "86400")),
+        )
+
+    def lockout_for(self, lockouts: int) -> float:
+        return min(self.base_lockout * (2 ** lockouts), self.max_lockout)
+
+
+class LockoutStore:
+    """Failure counters and locks; implementations must update atomically"""
+
+    async def locked_for(self, keys: List[str]) -> float:
+        """Seconds until every given key is unlocked"""
+        raise NotImplementedError
+
+    async def fail(self, key: str, rule: LockoutRule) -> float:
+        """Count a failure; returns the lockout it triggered in seconds, or 0"""
+        raise NotImplementedError
+
+    async def reset(self, key: str):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+def count_failure(state: list, now: float, rule: LockoutRule) -> float:
+    """Add a failure to state (see InMemoryStore) in place; returns the lockout it triggered, or 0"""
+    if now - state[5] > rule.reset_after:
+        state[4] = 0
+    elapsed = now - state[2]
+    if elapsed >= 2 * rule.window:
+        state[0], state[1], state[2], elapsed = 0, 0, now, 0.0
+    elif elapsed >= rule.window:
+        state[0], state[1], state[2] = state[1], 0, state[2] + rule.window
+        elapsed -= rule.window
+    state[1] += 1
+    state[5] = now
+
+    # Sliding window estimate: the previous window weighted by its overlap
+    if state[0] * (1 - elapsed / rule.window) + state[1] < rule.threshold:
+        return 0.0
+    lockout = rule.lockout_for(state[4])
+    state[0], state[1], state[2] = 0, 0, now
+    state[3] = now + lockout
+    state[4] += 1
+    return lockout
+
+
+class InMemoryStore(LockoutStore):
+    """Per-process counters in an LRU bounded by max_keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [previous window count, current window count, window start,
+        #         locked until, lockouts, last failure]
+        self._state: "OrderedDict[str, list]" = OrderedDict()
+
+    async def locked_for(self, keys: List[str]) -> float:
+        now = time.monotonic()
+        remaining = 0.0
+        for key in keys:
+            state = self._state.get(key)
+            if state is not None:
+                remaining = max(remaining, state[3] - now)
+        return remaining
+
+    async def fail(self, key: str, rule: LockoutRule) -> float:
+        now = time.monotonic()
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = [0, 0, now, 0.0, 0, now]
+            if len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+        return count_failure(state, now, rule)
+
+    async def reset(self, key: str):
+        self._state.pop(key, None)
+
+
+class SharedMemoryStore(LockoutStore):
+    """Counters shared by the workers of one prefork launch through a shared-memory table"""
+
+    def __init__(self, table: SharedTable):
+        self.table = table
+
+    async def locked_for(self, keys: List[str]) -> float:
+        now = time.monotonic()
+        remaining = 0.0
+        for key in keys:
+            state = self.table.get(key)
+            if state is not None:
+                remaining = max(remaining, state[3] - now)
+        return remaining
+
+    async def fail(self, key: str, rule: LockoutRule) -> float:
+        def fail(values, now):
+            state = list(values) if values is not None else [0, 0, now, 0.0, 0, now]
+            lockout = count_failure(state, now, rule)
+            return state, lockout
+
+        return self.table.update(key, fail)
+
+    async def reset(self, key: str):
+        self.table.delete(key)
+
+    async def aclose(self):
+        self.table.close()
+
+
+# Count, decide and lock in one round trip; Redis' own clock keeps workers consistent
+FAIL_SCRIPT = """
+local window = tonumber(ARGV[1])
+local threshold = tonumber(ARGV[2])
+local base = tonumber(ARGV[3])
+local max_lockout = tonumber(ARGV[4])
+local reset_after = tonumber(ARGV[5])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'prev', 'curr', 'start', 'lockouts')
+local prev = tonumber(state[1]) or 0
+local curr = tonumber(state[2]) or 0
+local start = tonumber(state[3]) or now
+local lockouts = tonumber(state[4]) or 0
+local elapsed = now - start
+if elapsed >= 2 * window then
+    prev = 0
+    curr = 0
+    start = now
+    elapsed = 0
+elseif elapsed >= window then
+    prev = curr
+    curr = 0
+    start = start + window
+    elapsed = elapsed - window
+end
+curr = curr + 1
+local lockout = 0
+if prev * (1 - elapsed / window) + curr >= threshold then
+    lockout = math.min(base * 2 ^ lockouts, max_lockout)
+    lockouts = lockouts + 1
+    prev = 0
+    curr = 0
+    start = now
+    redis.call('SET', KEYS[2], '1', 'PX', math.ceil(lockout * 1000))
+end
+redis.call('HSET', KEYS[1], 'prev', prev, 'curr', curr, 'start', tostring(start), 'lockouts', lockouts)
+redis.call('EXPIRE', KEYS[1], math.ceil(math.max(2 * window, reset_after)))
+return tostring(lockout)
+"""
+
+
+class RedisStore(LockoutStore):
+    """Counters shared by all auth service workers through Redis"""
+
+    def __init__(self, url: str, key_prefix: str = "auth:login-guard:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The 'redis' package is required for LOGIN_LOCKOUT_BACKEND=redis")
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(FAIL_SCRIPT)
+        self.key_prefix = key_prefix
+
+    async def locked_for(self, keys: List[str]) -> float:
+        pipeline = self._redis.pipeline(transaction=False)
+        for key in keys:
+            pipeline.pttl(f"{self.key_prefix}lock:{key}")
+        return max([ttl / 1000 for ttl in await pipeline.execute() if ttl > 0], default=0.0)
+
+    async def fail(self, key: str, rule: LockoutRule) -> float:
+        lockout = await self._script(
+            keys=[self.key_prefix + key, f"{self.key_prefix}lock:{key}"],
+            args=[rule.window, rule.threshold, rule.base_lockout, rule.max_lockout, rule.reset_after]
+        )
+        return float(lockout)
+
+    async def reset(self, key: str):
+        await self._redis.delete(self.key_prefix + key, f"{self.key_prefix}lock:{key}")
+
+    async def aclose(self):
+        await self._redis.close()
+
+
+def parse_networks(spec: str) -> list:
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(",") if item.strip()]
+
+
+class LoginGuard:
+    """Per-account and per-IP failed-login lockouts in front of the login query"""
+
+    def __init__(self, store: LockoutStore, account_rule: LockoutRule, ip_rule: LockoutRule,
+                 trusted_proxies: list):
+        self.store = store
+        self.account_rule = account_rule
+        self.ip_rule = ip_rule
+        self.trusted_proxies = trusted_proxies
+        self.rejected = 0
+        self.failures = 0
+        self.lockouts = 0
+        self.store_errors = 0
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_ip(self, peer: Optional[str], forwarded_for: Optional[str]) -> str:
+        """The nearest address in the forwarding chain that is not a trusted proxy"""
+        if not peer:
+            return "unknown"
+        if not forwarded_for or not self._trusted(peer):
+            return peer
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not self._trusted(hop):
+                return hop
+        return hops[0] if hops else peer
+
+    @staticmethod
+    def account_key(user_id=None, email: Optional[str] = None, phone: Optional[str] = None) -> str:
+        """One key per account whichever identifier was typed: the user id once resolved,
+        else the normalised email or phone, so probes for unknown accounts are counted too"""
+        if user_id is not None:
+            identifier = f"user:{user_id}"
+        elif email and email.strip():
+            identifier = email.strip().lower()
+        else:
+            identifier = "".join(character for character in phone or "" if character.isdigit() or character == "+")
+        return "account:" + hashlib.sha256(identifier.encode("utf-8")).hexdigest()[:32]
+
+    def keys(self, client_ip: str, account: Optional[str]) -> List[Tuple[str, LockoutRule]]:
+        keys = [("ip:" + client_ip, self.ip_rule)]
+        if account is not None:
+            keys.append((account, self.account_rule))
+        return keys
+
+    async def retry_after(self, client_ip: str, account: Optional[str] = None) -> int:
+        """Seconds the caller must wait before trying again, 0 when allowed"""
+        try:
+            remaining = await self.store.locked_for([key for key, _ in self.keys(client_ip, account)])
+        except Exception as e:
+            # Fail open: a store outage must not lock every user out
+            self.store_errors += 1
+            logger.warning(f"Login lockout store unavailable: {e}")
+            return 0
+        if remaining <= 0:
+            return 0
+        self.rejected += 1
+        return max(1, math.ceil(remaining))
+
+    async def record_failure(self, client_ip: str, account: str):
+        self.failures += 1
+        for key, rule in self.keys(client_ip, account):
+            try:
+                lockout = await self.store.fail(key, rule)
+            except Exception as e:
+                self.store_errors += 1
+                logger.warning(f"Login lockout store unavailable: {e}")
+                return
+            if lockout:
+                self.lockouts += 1
+                logger.warning(f"Login locked out for {lockout:.0f}s after repeated failures: {key.split(':')[0]}")
+
+    async def record_success(self, account: str):
+        """A successful login clears the account's failures; the IP's remain"""
+        try:
+            await self.store.reset(account)
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning(f"Login lockout store unavailable: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.store).__name__,
+            "account_rule": f"{self.account_rule.threshold}/{self.account_rule.window:.0f}s",
+            "ip_rule": f"{self.ip_rule.threshold}/{self.ip_rule.window:.0f}s",
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "lockouts": self.lockouts,
+            "store_errors": self.store_errors,
+        }
+
+
+def build_login_guard() -> Optional[LoginGuard]:
+    """Create the guard from LOGIN_LOCKOUT_* variables, or None when disabled"""
+    if os.getenv("LOGIN_LOCKOUT_ENABLED", "true").lower() != "true":
+        return None
+
+    max_keys = int(os.getenv("LOGIN_LOCKOUT_MAX_KEYS", "100000"))
+    # Under the prefork launcher counters default to a table its workers share
+    backend = os.getenv("LOGIN_LOCKOUT_BACKEND", "shared" if state_dir() else "memory").lower()
+    if backend == "redis":
+        store = RedisStore(os.getenv("LOGIN_LOCKOUT_REDIS_URL", "redis://localhost:6379/0"))
+    elif backend == "shared" and state_dir():
+        store = SharedMemoryStore(shared_table("auth-login-guard", max_keys, 6))
+    else:
+        store = InMemoryStore(max_keys)
+
+    return LoginGuard(
+        store,
+        account_rule=LockoutRule.from_env("account", threshold=5, window=900),
+        ip_rule=LockoutRule.from_env("ip", threshold=20, window=900),
+        trusted_proxies=parse_networks(f"{DEFAULT_TRUSTED_PROXIES},{os.getenv('LOGIN_TRUSTED_PROXIES', '')}"),
+    )
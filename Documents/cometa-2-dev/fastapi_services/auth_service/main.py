@@ -2,14 +2,20 @@
 Authentication Microservice for COMETA
 Handles user authentication, authorization, and token management
 """
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Request
 from fastapi.security import HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import Optional
+from typing import Dict, List, Optional
 import os
 import sys
+import base64
+import csv
+import hashlib
+import io
+import json
 import secrets
 import logging
 from datetime import datetime, timedelta
@@ -44,6 +50,16 @@ from schemas import (
 )
 from auth_microservice import AuthManager, create_user_token, validate_pin_code, log_auth_activity
 from utils import DatabaseUtils, ResponseUtils, ValidationUtils, LoggingUtils
+from db_executor import db_pool_stats, run_db
+from pagination import InvalidCursor, approximate_count, keyset_page
+from user_cache import build_user_cache, snapshot_user
+from bulk_users import bulk_create, bulk_deactivate, bulk_update
+from activity_log import build_activity_log
+from login_guard import build_login_guard
+from tracing import TracingMiddleware, build_tracer
+from fast_json import FastJSONResponse, StaticJSON, row_dicts
+from worker_state import snapshot_board, sum_counts, worker_id
+from health_monitor import HealthMonitor
 
 # Setup logging
 LoggingUtils.setup_service_logging("auth-service")
@@ -51,6 +67,11 @@ logger = logging.getLogger(__name__)
 
 # Database dependency is now imported above
 
+# Token signing configuration shared with the API Gateway for local verification
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY") or getattr(AuthManager, "SECRET_KEY", None)
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM") or getattr(AuthManager, "ALGORITHM", "HS256")
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
 # Helper function for database connection check
 def check_database_connection() -> bool:
     """Check if database connection is working"""
@@ -63,13 +84,122 @@ def check_database_connection() -> bool:
         logger.error(f"Database connection check failed: {e}")
         return False
 
+async def database_check():
+    """Background health check for the database, run in the DB thread pool"""
+    return await run_db(check_database_connection), {}
+
+# Health endpoints answer from the monitor's cached results
+health_monitor = HealthMonitor()
+health_monitor.register("database", database_check)
+
+# Users are listed in name order; id makes the keyset unique
+USER_SORT_KEY = (User.first_name, User.last_name, User.id)
+MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("USERS_EXPORT_BATCH_SIZE", "1000"))
+BULK_MAX_ROWS = int(os.getenv("USERS_BULK_MAX_ROWS", "10000"))
+
+def user_list_query(db: Session, role: Optional[str], active_only: bool, columns=None):
+    """Users matching the list filters, as entities or only the given columns"""
+    query = db.query(*columns) if columns else db.query(User)
+
+    if active_only:
+        query = query.filter(User.is_active == True)
+
+    if role:
+        query = query.filter(User.role == role)
+
+    return query
+
+def export_fields() -> list:
+    """Public user fields (those of UserResponse) that are columns of User"""
+    return [field for field in UserResponse.__fields__ if hasattr(User, field)]
+
+# List responses are encoded straight from the selected columns when every
+# UserResponse field is a column; otherwise each row goes through the model
+LIST_FIELDS = export_fields()
+ROW_SERIALIZATION = len(LIST_FIELDS) == len(UserResponse.__fields__)
+# The keyset cursor needs the sort columns even if they are not public fields
+LIST_COLUMNS = [getattr(User, field) for field in LIST_FIELDS] + [
+    column for column in USER_SORT_KEY if column.key not in LIST_FIELDS
+]
+
+def csv_lines(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+def find_active_user(db: Session, email: Optional[str], phone: Optional[str]):
+    """Find an active user by email, or by phone when no email is given"""
+    user_query = db.query(User).filter(User.is_active == True)
+
+    if email:
+        return user_query.filter(User.email == email).first()
+    return user_query.filter(User.phone == phone).first()
+
+# Active users cached by id, email and phone; writes invalidate through the bus
+user_cache, user_cache_bus = build_user_cache()
+
+def cache_user(user, generation: int):
+    """Snapshot a loaded user into the cache, returning the snapshot"""
+    if user is None or user_cache is None:
+        return user
+    snapshot = snapshot_user(user)
+    user_cache.store(snapshot, generation)
+    return snapshot
+
+def load_active_user(db: Session, email: Optional[str], phone: Optional[str]):
+    """find_active_user that fills the user cache"""
+    generation = user_cache.generation if user_cache else 0
+    return cache_user(find_active_user(db, email, phone), generation)
+
+def load_user(db: Session, user_id: str):
+    """get_or_404 for a user that fills the user cache"""
+    generation = user_cache.generation if user_cache else 0
+    return cache_user(DatabaseUtils.get_or_404(db, User, user_id, "User"), generation)
+
+def cached_active_user(email: Optional[str] = None, phone: Optional[str] = None, user_id: Optional[str] = None):
+    if user_cache is None:
+        return None
+    if user_id:
+        return user_cache.get(user_id)
+    if email:
+        return user_cache.get_by_email(email)
+    return user_cache.get_by_phone(phone)
+
+def write_auth_activity(events):
+    """Write a batch of queued auth activity events"""
+    for event in events:
+        log_auth_activity(*event)
+
+# Auth activity is queued and written in batches off the request path
+activity_log = build_activity_log(write_auth_activity)
+
+async def record_auth_activity(*event):
+    if activity_log:
+        await activity_log.log(*event)
+    else:
+        await run_db(log_auth_activity, *event)
+
+# Failed-login lockouts per account and per source IP
+login_guard = build_login_guard()
+
+# Under the prefork launcher each worker publishes its /stats figures so any worker can total them
+stats_board = snapshot_board("auth-stats")
+
+async def invalidate_cached_user(user_id=None, email: Optional[str] = None, phone: Optional[str] = None):
+    """Drop a user from this process's cache and from every other process's"""
+    if user_cache_bus:
+        await user_cache_bus.publish(user_id, email, phone)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="COMETA Authentication Service",
     description="Microservice for user authentication and authorization",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # orjson encoding for every handler that returns plain data
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware - Production-ready configuration
@@ -92,6 +222,10 @@ app.add_middleware(
     allow_headers=["Content-Type", "Authorization", "X-Token"],
 )
 
+# Request IDs, W3C trace context (continued from the gateway) and Server-Timing
+tracer = build_tracer("auth-service", "auth")
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
@@ -99,31 +233,85 @@ async def startup_event():
     logger.info("Starting Authentication Service...")
 
     # Check database connection
-    if not check_database_connection():
+    if not await run_db(check_database_connection):
         logger.error("Failed to connect to database")
         raise RuntimeError("Database connection failed")
 
-    # Database connection verified successfully
+    # Database connection verified successfully; keep health status fresh in the background
+    health_monitor.start()
+
+    if user_cache_bus:
+        await user_cache_bus.start()
+
+    if activity_log:
+        activity_log.start()
+
+    if stats_board:
+        stats_board.start(component_stats)
 
     logger.info("Authentication Service started successfully")
 
-# Health check endpoint
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work on shutdown"""
+    if stats_board:
+        await stats_board.stop()
+    await health_monitor.stop()
+    await tracer.aclose()
+    if activity_log:
+        await activity_log.stop()
+    if login_guard:
+        await login_guard.store.aclose()
+    if user_cache_bus:
+        await user_cache_bus.aclose()
+
+# Health check endpoints
 @app.get("/health")
 async def health_check():
-    """Service health check"""
-    db_status = check_database_connection()
+    """Service health check (cached, refreshed in the background)"""
+    db_status = health_monitor.is_healthy("database")
     return {
         "status": "healthy" if db_status else "unhealthy",
         "service": "auth-service",
         "database": db_status,
-        "dependencies": ["database"],
+        "dependencies": health_monitor.snapshot(),
+        "monitor": health_monitor.summary(),
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive", "service": "auth-service"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: all critical dependencies passed their last check"""
+    ready = health_monitor.ready()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "service": "auth-service",
+            "dependencies": health_monitor.snapshot(include_history=False)
+        }
+    )
+
+async def check_login_lockout(client_ip: str, account: Optional[str] = None):
+    """Turn the caller away with 429 while its address or the account is locked out"""
+    retry_after = await login_guard.retry_after(client_ip, account)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(retry_after)}
+        )
+
 # Authentication endpoints
 @app.post("/login", response_model=TokenResponse)
 async def login(
     login_data: LoginRequest,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """
@@ -149,16 +337,28 @@ async def login(
                 detail="Invalid PIN code format"
             )
 
-        # Find user by email or phone
-        user_query = db.query(User).filter(User.is_active == True)
+        # Locked-out addresses are turned away before any database work
+        if login_guard:
+            client_ip = login_guard.client_ip(
+                request.client.host if request.client else None,
+                request.headers.get("x-forwarded-for")
+            )
+            await check_login_lockout(client_ip)
 
-        if login_data.email:
-            user = user_query.filter(User.email == login_data.email).first()
-        else:
-            user = user_query.filter(User.phone == login_data.phone).first()
+        # Find user by email or phone, from the user cache when possible
+        user = cached_active_user(login_data.email, login_data.phone)
+        if user is None:
+            user = await run_db(load_active_user, db, login_data.email, login_data.phone)
+
+        # Failures count against the account whether it was named by email or phone
+        if login_guard:
+            account = login_guard.account_key(user.id if user else None, login_data.email, login_data.phone)
+            await check_login_lockout(client_ip, account)
 
         if not user:
-            log_auth_activity("unknown", "login_failed", "User not found")
+            if login_guard:
+                await login_guard.record_failure(client_ip, account)
+            await record_auth_activity("unknown", "login_failed", "User not found")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
@@ -171,7 +371,9 @@ async def login(
         )
 
         if not pin_valid:
-            log_auth_activity(str(user.id), "login_failed", "Invalid PIN")
+            if login_guard:
+                await login_guard.record_failure(client_ip, account)
+            await record_auth_activity(str(user.id), "login_failed", "Invalid PIN")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
@@ -185,7 +387,9 @@ async def login(
         )
 
         # Log successful login
-        log_auth_activity(str(user.id), "login_success")
+        if login_guard:
+            await login_guard.record_success(account)
+        await record_auth_activity(str(user.id), "login_success")
 
         return TokenResponse(
             access_token=token,
@@ -215,6 +419,196 @@ async def verify_token(
         message="Token is valid"
     )
 
+@app.get("/internal/signing-keys")
+async def signing_keys(x_internal_token: Optional[str] = Header(None)):
+    """
+    Token signing keys for gateway-side verification (internal callers only)
+    """
+    if not INTERNAL_API_TOKEN or not x_internal_token or not secrets.compare_digest(
+        x_internal_token.encode("utf-8"), INTERNAL_API_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Forbidden"
+        )
+
+    if not JWT_SECRET_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No signing keys configured"
+        )
+
+    secret = JWT_SECRET_KEY.encode("utf-8")
+    return {
+        "keys": [{
+            "kty": "oct",
+            "kid": hashlib.sha256(secret).hexdigest()[:16],
+            "alg": JWT_ALGORITHM,
+            "k": base64.urlsafe_b64encode(secret).rstrip(b"=").decode("ascii")
+        }]
+    }
+
+@app.get("/users/export")
+async def export_users(
+    format: str = "ndjson",
+    role: Optional[str] = None,
+    active_only: bool = True
+):
+    """
+    Stream all matching users as NDJSON or CSV, read in keyset batches
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be one of: ndjson, csv"
+        )
+
+    fields = export_fields()
+    columns = [getattr(User, field) for field in fields]
+
+    async def rows():
+        # The export outlives the request's dependencies, so it owns its session
+        session = await run_db(get_session)
+        try:
+            next_cursor = None
+            if format == "csv":
+                yield csv_lines([fields])
+            while True:
+                batch, next_cursor = await run_db(
+                    keyset_page,
+                    user_list_query(session, role, active_only, columns),
+                    USER_SORT_KEY, next_cursor, EXPORT_BATCH_SIZE
+                )
+                if batch:
+                    if format == "csv":
+                        yield csv_lines(batch)
+                    else:
+                        yield "".join(
+                            json.dumps(dict(zip(fields, row)), default=str) + "\n" for row in batch
+                        )
+                if next_cursor is None:
+                    break
+        except Exception as e:
+            logger.error(f"User export error: {e}")
+            raise
+        finally:
+            await run_db(session.close)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+
+def check_bulk_size(rows):
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one row required"
+        )
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BULK_MAX_ROWS} rows per request"
+        )
+
+def bulk_summary(results: list) -> dict:
+    failed = sum(1 for result in results if result["status"] == "error")
+    return {"succeeded": len(results) - failed, "failed": failed, "results": results}
+
+# Bulk user management: one uniqueness query and one transaction per batch
+@app.post("/users/bulk")
+async def create_users_bulk(
+    users_data: List[UserCreate],
+    db: Session = Depends(get_db)
+):
+    """
+    Create many users; rows that would duplicate an email or phone are reported and skipped
+    """
+    check_bulk_size(users_data)
+
+    def create():
+        results = bulk_create(db, User, [user_data.dict() for user_data in users_data])
+        DatabaseUtils.safe_commit(db, "bulk user creation")
+        return results
+
+    try:
+        results = await run_db(create)
+        logger.info(f"Bulk user creation: {sum(r['status'] == 'created' for r in results)}/{len(results)} created")
+        return bulk_summary(results)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk user creation error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Bulk user creation failed"
+        )
+
+@app.put("/users/bulk")
+async def update_users_bulk(
+    updates: Dict[str, UserUpdate],
+    db: Session = Depends(get_db)
+):
+    """
+    Update many users, given as a map of user id to fields to change
+    """
+    check_bulk_size(updates)
+
+    def update():
+        results = bulk_update(
+            db, User, {user_id: data.dict(exclude_unset=True) for user_id, data in updates.items()}
+        )
+        DatabaseUtils.safe_commit(db, "bulk user update")
+        return results
+
+    try:
+        results = await run_db(update)
+        if user_cache_bus:
+            await user_cache_bus.publish_many([r["id"] for r in results if r["status"] == "updated"])
+        return bulk_summary(results)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk user update error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Bulk user update failed"
+        )
+
+@app.post("/users/bulk/deactivate")
+async def deactivate_users_bulk(
+    user_ids: List[str],
+    db: Session = Depends(get_db)
+):
+    """
+    Soft delete many users (set inactive)
+    """
+    check_bulk_size(user_ids)
+
+    def deactivate():
+        results = bulk_deactivate(db, User, user_ids)
+        DatabaseUtils.safe_commit(db, "bulk user deactivation")
+        return results
+
+    try:
+        results = await run_db(deactivate)
+        if user_cache_bus:
+            await user_cache_bus.publish_many([r["id"] for r in results if r["status"] == "deactivated"])
+        return bulk_summary(results)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk user deactivation error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Bulk user deactivation failed"
+        )
+
 # User management endpoints
 @app.get("/users/{user_id}", response_model=UserResponse)
 async def get_user(
@@ -224,7 +618,9 @@ async def get_user(
     """
     Get user by ID
     """
-    user = DatabaseUtils.get_or_404(db, User, user_id, "User")
+    user = cached_active_user(user_id=user_id)
+    if user is None:
+        user = await run_db(load_user, db, user_id)
     return UserResponse.from_orm(user)
 
 @app.post("/users", response_model=UserResponse)
@@ -235,7 +631,7 @@ async def create_user(
     """
     Create new user
     """
-    try:
+    def create():
         # Validate unique constraints
         if user_data.email:
             existing = db.query(User).filter(User.email == user_data.email).first()
@@ -261,6 +657,11 @@ async def create_user(
         logger.info(f"User created: {user.id}")
         return UserResponse.from_orm(user)
 
+    try:
+        user = await run_db(create)
+        await invalidate_cached_user(user.id, user_data.email, user_data.phone)
+        return user
+
     except HTTPException:
         raise
     except Exception as e:
@@ -279,7 +680,7 @@ async def update_user(
     """
     Update user
     """
-    try:
+    def update():
         user = DatabaseUtils.get_or_404(db, User, user_id, "User")
 
         # Update fields
@@ -292,6 +693,13 @@ async def update_user(
         logger.info(f"User updated: {user.id}")
         return UserResponse.from_orm(user)
 
+    try:
+        user = await run_db(update)
+        await invalidate_cached_user(
+            user_id, getattr(user_data, "email", None), getattr(user_data, "phone", None)
+        )
+        return user
+
     except HTTPException:
         raise
     except Exception as e:
@@ -309,13 +717,17 @@ async def delete_user(
     """
     Soft delete user (set inactive)
     """
-    try:
+    def deactivate():
         user = DatabaseUtils.get_or_404(db, User, user_id, "User")
         user.is_active = False
 
         DatabaseUtils.safe_commit(db, "user deletion")
 
         logger.info(f"User deactivated: {user.id}")
+
+    try:
+        await run_db(deactivate)
+        await invalidate_cached_user(user_id)
         return ResponseUtils.success_response(message="User deactivated")
 
     except HTTPException:
@@ -331,36 +743,72 @@ async def delete_user(
 async def list_users(
     page: int = 1,
     per_page: int = 50,
+    cursor: Optional[str] = None,
+    count: str = "none",
     role: Optional[str] = None,
     active_only: bool = True,
     db: Session = Depends(get_db)
 ):
     """
     List users with pagination and filtering
-    """
-    try:
-        query = db.query(User)
 
-        if active_only:
-            query = query.filter(User.is_active == True)
+    Without cursor the response is the paginated page-number listing. Passing
+    cursor (empty for the first page, then next_cursor of the previous
+    response) selects keyset pagination, where count is "none", "approximate"
+    (planner estimate) or "exact".
+    """
+    if count not in ("none", "approximate", "exact"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="count must be one of: none, approximate, exact"
+        )
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
 
-        if role:
-            query = query.filter(User.role == role)
+    def fetch_page():
+        query = user_list_query(db, role, active_only, LIST_COLUMNS if ROW_SERIALIZATION else None)
 
-        query = query.order_by(User.first_name, User.last_name)
+        if cursor is None:
+            return DatabaseUtils.paginate_query(query.order_by(*USER_SORT_KEY), page, per_page)
 
-        result = DatabaseUtils.paginate_query(query, page, per_page)
+        users, next_cursor = keyset_page(query, USER_SORT_KEY, cursor, per_page)
+        total = None
+        if count == "exact":
+            total = query.count()
+        elif count == "approximate":
+            total = approximate_count(db, query)
+        return {"items": users, "next_cursor": next_cursor, "total": total}
 
-        # Convert to response format
-        users = [UserResponse.from_orm(user) for user in result["items"]]
+    try:
+        result = await run_db(fetch_page)
 
-        return ResponseUtils.paginated_response(
-            items=users,
-            total=result["total"],
-            page=result["page"],
-            per_page=result["per_page"]
+        # Plain dicts encoded once by orjson; no model instance per row
+        if ROW_SERIALIZATION:
+            users = row_dicts(LIST_FIELDS, result["items"])
+        else:
+            users = [UserResponse.from_orm(user).dict() for user in result["items"]]
+
+        if cursor is None:
+            return FastJSONResponse(ResponseUtils.paginated_response(
+                items=users,
+                total=result["total"],
+                page=result["page"],
+                per_page=result["per_page"]
+            ))
+
+        return FastJSONResponse({
+            "items": users,
+            "per_page": per_page,
+            "next_cursor": result["next_cursor"],
+            "has_more": result["next_cursor"] is not None,
+            "total": result["total"],
+            "total_is_estimate": count == "approximate"
+        })
+
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-
     except Exception as e:
         logger.error(f"User listing error: {e}")
         raise HTTPException(
@@ -378,7 +826,7 @@ async def set_user_pin(
     """
     Set or update user PIN code
     """
-    try:
+    def set_pin():
         user = DatabaseUtils.get_or_404(db, User, user_id, "User")
 
         pin_code = pin_data.get("pin_code")
@@ -392,6 +840,10 @@ async def set_user_pin(
         DatabaseUtils.safe_commit(db, "PIN update")
 
         logger.info(f"PIN updated for user: {user.id}")
+
+    try:
+        await run_db(set_pin)
+        await invalidate_cached_user(user_id)
         return ResponseUtils.success_response(message="PIN code updated")
 
     except HTTPException:
@@ -403,37 +855,66 @@ async def set_user_pin(
             detail="PIN update failed"
         )
 
-# Service info endpoint
+def component_stats() -> dict:
+    """This worker's cache, lockout and pool figures"""
+    return {
+        "user_cache": user_cache.stats() if user_cache else {"enabled": False},
+        "cache_invalidation": user_cache_bus.stats() if user_cache_bus else None,
+        "activity_log": activity_log.stats() if activity_log else {"enabled": False},
+        "login_lockout": login_guard.stats() if login_guard else {"enabled": False},
+        "db_pool": db_pool_stats(),
+    }
+
+@app.get("/stats")
+async def service_stats():
+    """
+    Cache and database pool statistics of the answering worker, plus counts
+    totalled over every worker when running under the prefork launcher
+    """
+    stats = {"service": "auth-service", "worker": worker_id(), **component_stats()}
+    if stats_board:
+        stats_board.publish(component_stats())
+        snapshots = [snapshot for snapshot, _ in stats_board.collect(include_retired=False)]
+        stats["workers"] = {"count": len(snapshots), "totals": sum_counts(snapshots)}
+    stats["timestamp"] = datetime.now().isoformat()
+    return stats
+
+# Service info never changes while the process runs, so it is encoded once
+SERVICE_INFO = StaticJSON({
+    "service": "auth-service",
+    "version": "1.0.0",
+    "description": "COMETA Authentication Service",
+    "endpoints": [
+        "POST /login",
+        "POST /verify-token",
+        "GET /users",
+        "GET /users/export",
+        "POST /users",
+        "POST /users/bulk",
+        "PUT /users/bulk",
+        "POST /users/bulk/deactivate",
+        "GET /users/{user_id}",
+        "PUT /users/{user_id}",
+        "DELETE /users/{user_id}",
+        "POST /users/{user_id}/pin"
+    ]
+})
+
 @app.get("/info")
-async def service_info():
+async def service_info(request: Request):
     """
     Service information
     """
-    return {
-        "service": "auth-service",
-        "version": "1.0.0",
-        "description": "COMETA Authentication Service",
-        "endpoints": [
-            "POST /login",
-            "POST /verify-token",
-            "GET /users",
-            "POST /users",
-            "GET /users/{user_id}",
-            "PUT /users/{user_id}",
-            "DELETE /users/{user_id}",
-            "POST /users/{user_id}/pin"
-        ]
-    }
+    return SERVICE_INFO.response(request)
 
 if __name__ == "__main__":
     import uvicorn
 
     port = int(os.getenv("AUTH_SERVICE_PORT", 8001))
 
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=os.getenv("DEBUG", "false").lower() == "true",
-        log_level="info"
-    )
\ No newline at end of file
+    if os.getenv("DEBUG", "false").lower() == "true":
+        uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True, log_level="info")
+    else:
+        # One worker per core by default (AUTH_SERVICE_WORKERS or WEB_CONCURRENCY); SIGHUP reloads them one at a time
+        from prefork import serve, worker_count
+        serve("main:app", host="0.0.0.0", port=port, workers=worker_count("AUTH_SERVICE_WORKERS"), log_level="info")
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Keyset (cursor) pagination helpers for the Authentication Service
+Pages continue after the last row's sort key instead of using OFFSET, so every
+page costs the same index range scan however deep into the table it is
+"""
+import base64
+import json
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.orm import Query, Session
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by this service or does not match the sort key"""
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = json.dumps([None if v is None else str(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Cursor does not match the sort order")
+    return values
+
+
+def keyset_page(query: Query, columns: Sequence, cursor: Optional[str], limit: int):
+    """
+    Rows after the cursor ordered by columns, plus the cursor of the next page
+    (None on the last page). The columns must end with a unique column; the
+    ones before it are text and may be NULL, which sorts as the empty string
+    (a NULL in a row comparison would make it NULL and drop the row).
+    """
+    *leading, unique = columns
+    sort_key = [func.coalesce(column, "") for column in leading] + [unique]
+    if cursor:
+        query = query.filter(tuple_(*sort_key) > tuple_(*decode_cursor(cursor, len(columns))))
+    rows = query.order_by(*sort_key).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) or "" for column in leading] + [getattr(last, unique.key)])
+    return rows, next_cursor
+
+
+def approximate_count(db: Session, query: Query) -> int:
+    """Planner row estimate for the query; exact count on databases without one"""
+    if db.bind.dialect.name != "postgresql":
+        return query.count()
+    statement = query.statement.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,12 @@
+"""
+Test setup for the Authentication Service
+Modules import each other by bare name, as when the service runs from its own directory
+"""
+import os
+import sys
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, SERVICE_DIR)
+sys.path.insert(0, os.path.join(SERVICE_DIR, '..', 'shared'))
+
+os.environ.pop("WORKER_STATE_DIR", None)
@@ -0,0 +1,89 @@
+"""
+Tests for set-based bulk user operations
+"""
+import uuid
+
+import pytest
+from sqlalchemy import Boolean, Column, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from bulk_users import bulk_create, bulk_deactivate, bulk_update
+
+Base = declarative_base()
+
+
+class BulkUser(Base):
+    __tablename__ = "bulk_users"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    email = Column(String(255), unique=True)
+    phone = Column(String(50), unique=True)
+    first_name = Column(String(100), nullable=False)
+    is_active = Column(Boolean, default=True)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            BulkUser(id="existing", email="taken@example.com", phone="+4911", first_name="Eva"),
+            BulkUser(id="other", email="other@example.com", phone="+4922", first_name="Otto"),
+        ])
+        session.commit()
+        yield session
+
+
+def test_bulk_create_reports_one_result_per_row(db):
+    results = bulk_create(db, BulkUser, [
+        {"email": "new@example.com", "first_name": "Ana"},
+        {"email": "taken@example.com", "first_name": "Ben"},
+        {"email": "new@example.com", "first_name": "Cem"},
+        {"phone": "+4911", "first_name": "Dan"},
+        {"phone": "+4933", "first_name": "Ela"},
+    ])
+    db.commit()
+    assert [result["status"] for result in results] == ["created", "error", "error", "error", "created"]
+    assert results[1]["error"] == "Email already registered"
+    assert results[2]["error"] == "Duplicate email in batch"
+    assert results[3]["error"] == "Phone already registered"
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+    assert db.get(BulkUser, results[0]["id"]).first_name == "Ana"
+    assert db.query(BulkUser).count() == 4
+
+
+def test_bulk_update_checks_uniqueness_against_other_users_only(db):
+    results = bulk_update(db, BulkUser, {
+        "existing": {"email": "taken@example.com", "first_name": "Eve"},
+        "other": {"email": "taken@example.com"},
+        "missing": {"first_name": "Nobody"},
+    })
+    db.commit()
+    assert results == [
+        {"id": "existing", "status": "updated"},
+        {"id": "other", "status": "error", "error": "Email already registered"},
+        {"id": "missing", "status": "error", "error": "User not found"},
+    ]
+    assert db.get(BulkUser, "existing").first_name == "Eve"
+    assert db.get(BulkUser, "other").email == "other@example.com"
+
+
+def test_bulk_update_refuses_duplicates_within_the_batch(db):
+    results = bulk_update(db, BulkUser, {
+        "existing": {"phone": "+4999"},
+        "other": {"phone": "+4999"},
+    })
+    assert [result["status"] for result in results] == ["updated", "error"]
+    assert results[1]["error"] == "Duplicate phone in batch"
+
+
+def test_bulk_deactivate(db):
+    results = bulk_deactivate(db, BulkUser, ["other", "missing"])
+    db.commit()
+    assert results == [
+        {"id": "other", "status": "deactivated"},
+        {"id": "missing", "status": "error", "error": "User not found"},
+    ]
+    assert db.get(BulkUser, "other").is_active is False
+    assert db.get(BulkUser, "existing").is_active is True
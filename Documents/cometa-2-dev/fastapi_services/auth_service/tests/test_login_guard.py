@@ -0,0 +1,121 @@
+"""
+Tests for brute-force protection of logins
+"""
+import asyncio
+
+import pytest
+
+from login_guard import (
+    DEFAULT_TRUSTED_PROXIES, InMemoryStore, LockoutRule, LockoutStore, LoginGuard, SharedMemoryStore, parse_networks
+)
+from worker_state import SharedTable
+
+
+def guard(store=None, trusted=f"{DEFAULT_TRUSTED_PROXIES},10.0.0.5/32") -> LoginGuard:
+    return LoginGuard(
+        store or InMemoryStore(),
+        account_rule=LockoutRule(threshold=3, window=900, base_lockout=30, max_lockout=3600, reset_after=86400),
+        ip_rule=LockoutRule(threshold=10, window=900, base_lockout=30, max_lockout=3600, reset_after=86400),
+        trusted_proxies=parse_networks(trusted),
+    )
+
+
+@pytest.mark.parametrize("peer, forwarded_for, client", [
+    ("198.51.100.7", None, "198.51.100.7"),
+    # Only trusted proxies may speak for the client
+    ("198.51.100.7", "203.0.113.1", "198.51.100.7"),
+    ("10.0.0.9", "203.0.113.1", "10.0.0.9"),
+    ("10.0.0.5", "203.0.113.1", "203.0.113.1"),
+    # Hops a client prepended itself are skipped
+    ("10.0.0.5", "1.2.3.4, 203.0.113.1", "203.0.113.1"),
+    ("127.0.0.1", "1.2.3.4, 203.0.113.1, 10.0.0.5", "203.0.113.1"),
+    ("10.0.0.5", "not-an-ip", "not-an-ip"),
+    (None, "203.0.113.1", "unknown"),
+])
+def test_client_ip_trusts_only_configured_proxies(peer, forwarded_for, client):
+    assert guard().client_ip(peer, forwarded_for) == client
+
+
+def test_account_key_is_the_same_whichever_identifier_was_typed():
+    by_id = LoginGuard.account_key(7, "Foreman@Example.com", None)
+    assert LoginGuard.account_key(7, None, "+49 170 1234") == by_id
+    assert LoginGuard.account_key(8, "foreman@example.com") != by_id
+    assert LoginGuard.account_key(None, " Foreman@Example.com ") == LoginGuard.account_key(None, "foreman@example.com")
+    assert LoginGuard.account_key(None, None, "+49 170-1234") == LoginGuard.account_key(None, None, "+491701234")
+
+
+def test_account_locks_after_threshold_and_success_clears_it():
+    async def run():
+        g = guard()
+        account = g.account_key(7)
+        for _ in range(3):
+            assert await g.retry_after("203.0.113.1", account) == 0
+            await g.record_failure("203.0.113.1", account)
+        # Locked from any address
+        assert 25 <= await g.retry_after("198.51.100.7", account) <= 30
+        assert await g.retry_after("198.51.100.7") == 0
+        await g.record_success(account)
+        assert await g.retry_after("203.0.113.1", account) == 0
+        return g.stats()
+
+    stats = asyncio.run(run())
+    assert stats["lockouts"] == 1
+    assert stats["failures"] == 3
+
+
+def test_ip_locks_across_accounts():
+    async def run():
+        g = guard()
+        for user_id in range(10):
+            await g.record_failure("203.0.113.1", g.account_key(user_id))
+        return await g.retry_after("203.0.113.1"), await g.retry_after("198.51.100.7")
+
+    assert asyncio.run(run()) == (30, 0)
+
+
+def test_lockouts_grow_exponentially_up_to_the_maximum():
+    rule = LockoutRule(threshold=3, window=900, base_lockout=30, max_lockout=100, reset_after=86400)
+    assert [rule.lockout_for(lockouts) for lockouts in range(4)] == [30, 60, 100, 100]
+
+
+class BrokenStore(LockoutStore):
+    async def locked_for(self, keys):
+        raise ConnectionError("store down")
+
+    async def fail(self, key, rule):
+        raise ConnectionError("store down")
+
+    async def reset(self, key):
+        raise ConnectionError("store down")
+
+
+def test_store_outage_fails_open():
+    async def run():
+        g = guard(BrokenStore())
+        account = g.account_key(7)
+        await g.record_failure("203.0.113.1", account)
+        await g.record_success(account)
+        return await g.retry_after("203.0.113.1", account), g.stats()["store_errors"]
+
+    assert asyncio.run(run()) == (0, 3)
+
+
+def test_shared_memory_store_counts_across_instances(tmp_path):
+    async def run():
+        path = str(tmp_path / "login-guard")
+        first = guard(SharedMemoryStore(SharedTable(path, 64, 6)))
+        second = guard(SharedMemoryStore(SharedTable(path, 64, 6)))
+        account = first.account_key(7)
+        await first.record_failure("203.0.113.1", account)
+        await second.record_failure("203.0.113.2", account)
+        await first.record_failure("203.0.113.3", account)
+        locked = await second.retry_after("198.51.100.7", account)
+        await second.record_success(account)
+        unlocked = await first.retry_after("198.51.100.7", account)
+        await first.store.aclose()
+        await second.store.aclose()
+        return locked, unlocked
+
+    locked, unlocked = asyncio.run(run())
+    assert locked > 0
+    assert unlocked == 0
@@ -0,0 +1,85 @@
+"""
+Tests for keyset (cursor) pagination
+"""
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from pagination import InvalidCursor, approximate_count, decode_cursor, encode_cursor, keyset_page
+
+Base = declarative_base()
+
+
+class PagedUser(Base):
+    __tablename__ = "paged_users"
+
+    id = Column(String(36), primary_key=True)
+    last_name = Column(String(100))
+    first_name = Column(String(100))
+    age = Column(Integer)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            PagedUser(id="u1", last_name="Meyer", first_name="Anna"),
+            PagedUser(id="u2", last_name=None, first_name="Ben"),
+            PagedUser(id="u3", last_name="Abel", first_name=None),
+            PagedUser(id="u4", last_name=None, first_name=None),
+            PagedUser(id="u5", last_name="Meyer", first_name="Anna"),
+            PagedUser(id="u6", last_name="Zeller", first_name="Eva"),
+            PagedUser(id="u7", last_name="", first_name="Cem"),
+        ])
+        session.commit()
+        yield session
+
+
+def all_pages(db, limit):
+    columns = [PagedUser.last_name, PagedUser.first_name, PagedUser.id]
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(db.query(PagedUser), columns, cursor, limit)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 10])
+def test_every_row_is_listed_once_including_null_names(db, limit):
+    pages = all_pages(db, limit)
+    ids = [user_id for page in pages for user_id in page]
+    assert sorted(ids) == ["u1", "u2", "u3", "u4", "u5", "u6", "u7"]
+    assert len(ids) == len(set(ids))
+    assert all(len(page) <= limit for page in pages)
+
+
+def test_null_names_sort_as_empty_strings(db):
+    (ids,) = all_pages(db, 10)
+    assert ids == ["u4", "u2", "u7", "u3", "u1", "u5", "u6"]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(["Meyer", None, 5])
+    assert decode_cursor(cursor, 3) == ["Meyer", None, "5"]
+
+
+@pytest.mark.parametrize("cursor, size", [
+    ("not base64!", 2),
+    (encode_cursor(["a", "b"]), 3),
+    ("eyJhIjogMX0", 1),  # an object, not a list
+])
+def test_foreign_cursors_are_rejected(cursor, size):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, size)
+
+
+def test_mismatched_cursor_is_rejected_before_querying(db):
+    with pytest.raises(InvalidCursor):
+        keyset_page(db.query(PagedUser), [PagedUser.last_name, PagedUser.id], encode_cursor(["x"]), 10)
+
+
+def test_approximate_count_is_exact_without_a_planner_estimate(db):
+    assert approximate_count(db, db.query(PagedUser).filter(PagedUser.last_name == "Meyer")) == 2
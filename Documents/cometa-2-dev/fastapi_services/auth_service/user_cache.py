@@ -0,0 +1,294 @@
+"""
+In-process cache of active users for the Authentication Service
+Column snapshots of active users are kept in a TTL-bounded LRU indexed by id,
+email and phone so hot login and profile lookups skip the database. Writes
+invalidate locally and, through an optional bus, in every other process
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect
+
+from worker_state import WorkerBroadcast, state_dir, worker_broadcast
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_user(user) -> SimpleNamespace:
+    """Detached copy of a user's column values, safe to share across sessions"""
+    return SimpleNamespace(**{
+        column.key: getattr(user, column.key) for column in inspect(user).mapper.column_attrs
+    })
+
+
+class UserCache:
+    """TTL + LRU cache of active users by id with email and phone indexes"""
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[SimpleNamespace, float]]" = OrderedDict()
+        self._by_email: Dict[str, str] = {}
+        self._by_phone: Dict[str, str] = {}
+        # Lookups start in the event loop and store from DB threads
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_stores_skipped = 0
+        self._served_age_total = 0.0
+        self.max_served_age = 0.0
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation; loads started before one are not stored"""
+        return self._generation
+
+    def _lookup(self, user_id: Optional[str]) -> Optional[SimpleNamespace]:
+        with self._lock:
+            entry = self._entries.get(user_id) if user_id else None
+            if entry is None:
+                self.misses += 1
+                return None
+            user, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age >= self.ttl:
+                self._remove(user_id)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            self._served_age_total += age
+            self.max_served_age = max(self.max_served_age, age)
+            return user
+
+    def get(self, user_id: str) -> Optional[SimpleNamespace]:
+        return self._lookup(str(user_id))
+
+    def get_by_email(self, email: str) -> Optional[SimpleNamespace]:
+        return self._lookup(self._by_email.get(email))
+
+    def get_by_phone(self, phone: str) -> Optional[SimpleNamespace]:
+        return self._lookup(self._by_phone.get(phone))
+
+    def store(self, user: SimpleNamespace, generation: int):
+        """Cache an active user loaded while the cache was at the given generation"""
+        if not getattr(user, "is_active", False):
+            return
+        user_id = str(user.id)
+        with self._lock:
+            if generation != self._generation:
+                self.stale_stores_skipped += 1
+                return
+            self._remove(user_id)
+            self._entries[user_id] = (user, time.monotonic())
+            if getattr(user, "email", None):
+                self._by_email[user.email] = user_id
+            if getattr(user, "phone", None):
+                self._by_phone[user.phone] = user_id
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        user = entry[0]
+        if self._by_email.get(getattr(user, "email", None)) == user_id:
+            del self._by_email[user.email]
+        if self._by_phone.get(getattr(user, "phone", None)) == user_id:
+            del self._by_phone[user.phone]
+
+    def invalidate(self, user_id: Optional[str] = None, email: Optional[str] = None, phone: Optional[str] = None):
+        """Drop a user by id and/or by the email or phone it was indexed under"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            for key in (user_id and str(user_id), self._by_email.get(email), self._by_phone.get(phone)):
+                if key:
+                    self._remove(key)
+
+    def invalidate_many(self, user_ids):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            for user_id in user_ids:
+                self._remove(str(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_email.clear()
+            self._by_phone.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_stores_skipped": self.stale_stores_skipped,
+            "avg_served_age_seconds": round(self._served_age_total / self.hits, 3) if self.hits else 0.0,
+            "max_served_age_seconds": round(self.max_served_age, 3),
+        }
+
+
+class InvalidationBus:
+    """Cross-process invalidation hook; the default only invalidates locally"""
+
+    def __init__(self, cache: UserCache):
+        self.cache = cache
+        self.published = 0
+        self.received = 0
+
+    async def start(self):
+        pass
+
+    async def publish(self, user_id: Optional[str] = None, email: Optional[str] = None, phone: Optional[str] = None):
+        self.cache.invalidate(user_id, email, phone)
+        self.published += 1
+
+    async def publish_many(self, user_ids: List[str]):
+        self.cache.invalidate_many(user_ids)
+        self.published += 1
+
+    async def aclose(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "local", "published": self.published, "received": self.received}
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """Invalidations fanned out to every auth service process over Redis pub/sub"""
+
+    def __init__(self, cache: UserCache, url: str, channel: str = "auth:user-cache:invalidate"):
+        super().__init__(cache)
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The 'redis' package is required for USER_CACHE_INVALIDATION=redis")
+        self._redis = redis.from_url(url)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                data = json.loads(message["data"])
+            except (TypeError, ValueError):
+                continue
+            if data.get("origin") == self.origin:
+                continue
+            if data.get("ids"):
+                self.cache.invalidate_many(data["ids"])
+            else:
+                self.cache.invalidate(data.get("id"), data.get("email"), data.get("phone"))
+            self.received += 1
+
+    async def publish(self, user_id: Optional[str] = None, email: Optional[str] = None, phone: Optional[str] = None):
+        await super().publish(user_id, email, phone)
+        await self._send({"origin": self.origin, "id": user_id and str(user_id), "email": email, "phone": phone})
+
+    async def publish_many(self, user_ids: List[str]):
+        await super().publish_many(user_ids)
+        await self._send({"origin": self.origin, "ids": [str(user_id) for user_id in user_ids]})
+
+    async def _send(self, message: dict):
+        try:
+            await self._redis.publish(self.channel, json.dumps(message))
+        except Exception as e:
+            # Other processes fall back to TTL expiry for these users
+            logger.warning(f"Could not publish user cache invalidation: {e}")
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self._redis.close()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "redis"}
+
+
+class WorkerInvalidationBus(InvalidationBus):
+    """Invalidations fanned out to the other workers of one prefork launch over Unix datagrams"""
+
+    # Ids per datagram, well below the datagram size limit
+    CHUNK = 1000
+
+    def __init__(self, cache: UserCache):
+        super().__init__(cache)
+        self._broadcast: WorkerBroadcast = worker_broadcast("auth-user-cache", self._apply)
+
+    def _apply(self, data: dict):
+        if data.get("ids"):
+            self.cache.invalidate_many(data["ids"])
+        else:
+            self.cache.invalidate(data.get("id"), data.get("email"), data.get("phone"))
+        self.received += 1
+
+    async def start(self):
+        self._broadcast.start()
+
+    async def publish(self, user_id: Optional[str] = None, email: Optional[str] = None, phone: Optional[str] = None):
+        await super().publish(user_id, email, phone)
+        self._broadcast.publish({"id": user_id and str(user_id), "email": email, "phone": phone})
+
+    async def publish_many(self, user_ids: List[str]):
+        await super().publish_many(user_ids)
+        ids = [str(user_id) for user_id in user_ids]
+        for start in range(0, len(ids), self.CHUNK):
+            self._broadcast.publish({"ids": ids[start:start + self.CHUNK]})
+
+    async def aclose(self):
+        self._broadcast.close()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "workers", "dropped": self._broadcast.dropped}
+
+
+def build_user_cache() -> Tuple[Optional[UserCache], Optional[InvalidationBus]]:
+    """User cache and invalidation bus from USER_CACHE_* settings"""
+    if os.getenv("USER_CACHE_ENABLED", "true").lower() != "true":
+        return None, None
+    cache = UserCache(
+        ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+        max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+    )
+    # Under the prefork launcher invalidations default to reaching the other workers
+    invalidation = os.getenv("USER_CACHE_INVALIDATION", "workers" if state_dir() else "local").lower()
+    if invalidation == "redis":
+        bus = RedisInvalidationBus(cache, os.getenv("USER_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    elif invalidation == "workers" and state_dir():
+        bus = WorkerInvalidationBus(cache)
+    else:
+        bus = InvalidationBus(cache)
+    return cache, bus
@@ -0,0 +1,107 @@
+"""
+Auth service bulk import benchmark: importing a crew of users row by row vs in batches
+"per-row" mirrors POST /users (email query, phone query, insert, commit per
+user); "bulk" runs bulk_create from the bulk endpoints with one commit per batch.
+A stand-in users table is used because the shared models are not importable
+here; point --database-url at PostgreSQL to measure real round trips.
+
+Usage:
+    python auth_bulk_import_bench.py [--users 10000] [--batches 500,10000]
+    python auth_bulk_import_bench.py --database-url postgresql://cometa@localhost/bench
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import Boolean, Column, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'auth_service'))
+
+from bulk_users import bulk_create  # noqa: E402
+
+Base = declarative_base()
+
+
+class BenchUser(Base):
+    __tablename__ = "bench_users"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    email = Column(String(255), unique=True, index=True)
+    phone = Column(String(50), unique=True, index=True)
+    first_name = Column(String(100), nullable=False)
+    last_name = Column(String(100), nullable=False)
+    role = Column(String(50), nullable=False)
+    pin_code = Column(String(10))
+    is_active = Column(Boolean, default=True)
+
+
+def crew(count: int, offset: int = 0) -> list:
+    return [
+        {
+            "email": f"worker{offset + i}@example.com",
+            "phone": f"+49150{offset + i:08d}",
+            "first_name": f"Worker{offset + i}",
+            "last_name": "Crew",
+            "role": "worker",
+            "pin_code": "1234",
+        }
+        for i in range(count)
+    ]
+
+
+def import_per_row(engine, rows: list):
+    with Session(engine) as db:
+        for row in rows:
+            if db.query(BenchUser).filter(BenchUser.email == row["email"]).first():
+                continue
+            if db.query(BenchUser).filter(BenchUser.phone == row["phone"]).first():
+                continue
+            db.add(BenchUser(**row))
+            db.commit()
+
+
+def import_bulk(engine, rows: list, batch: int):
+    with Session(engine) as db:
+        for start in range(0, len(rows), batch):
+            bulk_create(db, BenchUser, rows[start:start + batch])
+            db.commit()
+
+
+def run(engine, label: str, importer, rows: list):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    started = time.perf_counter()
+    importer(rows)
+    elapsed = time.perf_counter() - started
+    with Session(engine) as db:
+        imported = db.query(BenchUser).count()
+    print(f"{label:>16} {imported:>9} {elapsed:>9.2f} {imported / elapsed:>11.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--batches", default="500,10000", help="Comma separated bulk request sizes")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        url = args.database_url
+    else:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bulk_import.db')}"
+    engine = create_engine(url)
+    rows = crew(args.users)
+
+    print(f"{'mode':>16} {'users':>9} {'seconds':>9} {'users/s':>11}")
+    run(engine, "per-row", lambda r: import_per_row(engine, r), rows)
+    for batch in (int(b) for b in args.batches.split(",")):
+        run(engine, f"bulk x{batch}", lambda r: import_bulk(engine, r, batch), rows)
+    Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
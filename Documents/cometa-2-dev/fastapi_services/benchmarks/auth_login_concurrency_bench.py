@@ -0,0 +1,108 @@
+"""
+Auth service login concurrency benchmark: p99 latency under parallel load
+Logins arrive on a fixed schedule (open loop) and latency is measured from the
+scheduled arrival, so time spent queued behind a blocked event loop counts.
+
+Without --url an in-process login endpoint is used whose "query" sleeps either
+in the event loop (before) or in the bounded DB thread pool (after). With --url
+a running auth service is measured, so the same command can be pointed at a
+build before and after the change.
+
+Usage:
+    python auth_login_concurrency_bench.py [--query-ms 5] [--rates 50,150,500]
+    python auth_login_concurrency_bench.py --url http://localhost:8001 --email foreman@example.com --pin 1234
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'auth_service'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from db_executor import run_db  # noqa: E402
+
+
+def simulated_app(query_seconds: float) -> FastAPI:
+    """Login endpoints with a blocking query run inline or through run_db"""
+    app = FastAPI()
+
+    def find_user():
+        time.sleep(query_seconds)
+        return {"id": "7f0c2a52", "role": "foreman"}
+
+    @app.post("/login-blocking")
+    async def login_blocking():
+        return {"user": find_user()}
+
+    @app.post("/login")
+    async def login():
+        return {"user": await run_db(find_user)}
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, payload: dict, rate: float, requests: int) -> dict:
+    """Issue requests at a fixed arrival rate and collect latencies from their scheduled start"""
+    latencies = []
+    started = time.perf_counter()
+
+    async def one(index: int):
+        scheduled = started + index / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await client.post(path, json=payload)
+        await response.aread()
+        latencies.append(time.perf_counter() - scheduled)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def report(label: str, rate: float, result: dict):
+    print(f"{label:>10} {rate:>11.0f} {result['rps']:>9.0f} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running auth service")
+    parser.add_argument("--email")
+    parser.add_argument("--phone")
+    parser.add_argument("--pin", default="1234")
+    parser.add_argument("--query-ms", type=float, default=5.0)
+    parser.add_argument("--rates", default="50,150,500", help="Comma separated arrival rates (logins/s)")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    rates = [float(r) for r in args.rates.split(",")]
+    print(f"{'mode':>10} {'offered/s':>11} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+
+    if args.url:
+        payload = {"email": args.email, "phone": args.phone, "pin_code": args.pin}
+        async with httpx.AsyncClient(base_url=args.url, timeout=60.0) as client:
+            for rate in rates:
+                report("live", rate, await measure(client, "/login", payload, rate, args.requests))
+        return
+
+    app = simulated_app(args.query_ms / 1000)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://auth") as client:
+        for rate in rates:
+            report("blocking", rate, await measure(client, "/login-blocking", {}, rate, args.requests))
+            report("run_db", rate, await measure(client, "/login", {}, rate, args.requests))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
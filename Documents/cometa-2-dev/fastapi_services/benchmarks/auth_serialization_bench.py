@@ -0,0 +1,170 @@
+"""
+Auth service serialization benchmark: listing users as JSON
+"models" is the former GET /users path: entities loaded, one UserResponse per
+row via from_orm, then FastAPI's jsonable_encoder and json. "rows+json" loads
+only the public columns and encodes plain dicts with the json module;
+"rows+orjson" is the current path (fast_json). A stand-in users table is used
+because the shared models are not importable here. The precomputed /info body
+is compared with building and encoding it per request.
+
+Usage: python auth_serialization_bench.py [--users 1000,10000] [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+import warnings
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import Boolean, Column, DateTime, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+from starlette.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from fast_json import FastJSONResponse, StaticJSON, orjson, row_dicts  # noqa: E402
+
+# from_orm and orm_mode are the auth service's pydantic v1 style
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", message="Valid config keys have changed")
+
+Base = declarative_base()
+
+
+class BenchUser(Base):
+    __tablename__ = "bench_users"
+
+    id = Column(String(36), primary_key=True)
+    email = Column(String(255), unique=True, index=True)
+    phone = Column(String(50))
+    first_name = Column(String(100), nullable=False)
+    last_name = Column(String(100), nullable=False)
+    role = Column(String(50), nullable=False)
+    lang_pref = Column(String(5))
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime)
+    pin_code = Column(String(10))
+
+
+class UserResponse(BaseModel):
+    id: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    first_name: str
+    last_name: str
+    role: str
+    lang_pref: Optional[str] = None
+    is_active: bool
+    created_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
+
+FIELDS = [field for field in UserResponse.__fields__ if hasattr(BenchUser, field)]
+COLUMNS = [getattr(BenchUser, field) for field in FIELDS]
+SORT_KEY = (BenchUser.first_name, BenchUser.last_name, BenchUser.id)
+
+INFO = {
+    "service": "auth-service",
+    "version": "1.0.0",
+    "description": "COMETA Authentication Service",
+    "endpoints": ["POST /login", "POST /verify-token", "GET /users", "GET /users/export", "POST /users",
+                  "POST /users/bulk", "PUT /users/bulk", "POST /users/bulk/deactivate", "GET /users/{user_id}",
+                  "PUT /users/{user_id}", "DELETE /users/{user_id}", "POST /users/{user_id}/pin"],
+}
+
+
+def seed(engine, count: int):
+    started = datetime(2024, 1, 1, 8, 0, 0)
+    with Session(engine) as db:
+        db.bulk_insert_mappings(BenchUser, [
+            {
+                "id": str(uuid.UUID(int=i)),
+                "email": f"worker{i}@example.com",
+                "phone": f"+49150{i:08d}",
+                "first_name": f"Worker{i}",
+                "last_name": "Crew",
+                "role": ("worker", "foreman", "pm")[i % 3],
+                "lang_pref": ("de", "en", "ru")[i % 3],
+                "is_active": True,
+                "created_at": started + timedelta(minutes=i),
+                "pin_code": "1234",
+            }
+            for i in range(count)
+        ])
+        db.commit()
+
+
+def envelope(items: list, count: int) -> dict:
+    return {"items": items, "per_page": count, "next_cursor": None, "has_more": False, "total": None,
+            "total_is_estimate": False}
+
+
+def models(db: Session, count: int) -> bytes:
+    users = db.query(BenchUser).order_by(*SORT_KEY).limit(count).all()
+    items = [UserResponse.from_orm(user) for user in users]
+    # What FastAPI does with a dict returned from a handler
+    return JSONResponse(jsonable_encoder(envelope(items, count))).body
+
+
+def rows_json(db: Session, count: int) -> bytes:
+    rows = db.query(*COLUMNS).order_by(*SORT_KEY).limit(count).all()
+    return JSONResponse(jsonable_encoder(envelope(row_dicts(FIELDS, rows), count))).body
+
+
+def rows_orjson(db: Session, count: int) -> bytes:
+    rows = db.query(*COLUMNS).order_by(*SORT_KEY).limit(count).all()
+    return FastJSONResponse(envelope(row_dicts(FIELDS, rows), count)).body
+
+
+def measure(function, rounds: int) -> tuple:
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1000,10000", help="Comma separated user counts")
+    parser.add_argument("--rounds", type=int, default=5, help="Best of this many runs per measurement")
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("(orjson not installed: rows+orjson falls back to the json module)")
+    print(f"{'users':>6} {'path':>12} {'ms':>9} {'users/s':>10} {'KB':>8} {'speedup':>8}")
+    for count in (int(value) for value in args.users.split(",")):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        seed(engine, count)
+        baseline = None
+        with Session(engine) as db:
+            for label, function in (("models", models), ("rows+json", rows_json), ("rows+orjson", rows_orjson)):
+                elapsed, body = measure(lambda: function(db, count), args.rounds)
+                baseline = baseline or elapsed
+                print(f"{count:>6} {label:>12} {elapsed * 1000:>9.1f} {count / elapsed:>10.0f} "
+                      f"{len(body) / 1024:>8.0f} {baseline / elapsed:>7.1f}x")
+        engine.dispose()
+
+    static = StaticJSON(INFO)
+    calls = 20000
+    print(f"\n/info, {calls} calls")
+    for label, function in (("per request", lambda: JSONResponse(jsonable_encoder(INFO))),
+                            ("precomputed", static.response)):
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        print(f"{label:>12} {(time.perf_counter() - started) / calls * 1e6:>8.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
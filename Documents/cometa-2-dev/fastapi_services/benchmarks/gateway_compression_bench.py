@@ -0,0 +1,141 @@
+"""
+Gateway compression benchmark: bytes saved against CPU spent
+Compresses work-entry JSON payloads of several sizes with every available
+encoder at a range of levels, then serves large responses concurrently through
+the compression middleware while a ticker measures how long the event loop
+stalls, with large chunks compressed inline and in worker threads
+
+Usage: python gateway_compression_bench.py [--sizes 10,100,1000] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+
+from compression import CompressionMiddleware, ResponseCompressor, available_encoders  # noqa: E402
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 8, 11], "zstd": [1, 3, 9, 19]}
+CHUNK_BYTES = 64 * 1024
+
+
+def work_entries_payload(size_kb: int) -> bytes:
+    """Work-entry list JSON of roughly size_kb kilobytes"""
+    rng = random.Random(size_kb)
+    entries = []
+    payload = b"[]"
+    while len(payload) < size_kb * 1024:
+        for _ in range(50):
+            index = len(entries)
+            entries.append({
+                "id": f"9f1c2a7e-{index:04x}-4c1b-8d3e-{rng.getrandbits(48):012x}",
+                "project_id": f"project-{rng.randint(1, 40)}",
+                "user_id": f"user-{rng.randint(1, 300)}",
+                "stage_code": rng.choice(["stage_1_marking", "stage_2_excavation", "stage_3_conduit", "stage_9_splice"]),
+                "meters_done_m": round(rng.uniform(0, 250), 2),
+                "method": rng.choice(["mole", "hand", "excavator", "trencher"]),
+                "gps_lat": round(rng.uniform(52.3, 52.7), 6),
+                "gps_lon": round(rng.uniform(13.1, 13.7), 6),
+                "approved": rng.random() < 0.7,
+                "notes": rng.choice(["", "Cable laid, no issues", "Waiting for asphalt crew", "Photo before/after"]),
+                "created_at": f"2024-0{rng.randint(1, 9)}-{rng.randint(10, 28)}T{rng.randint(10, 23)}:{rng.randint(10, 59)}:00",
+            })
+        payload = json.dumps({"items": entries, "total": len(entries)}).encode()
+    return payload
+
+
+def compressor_for(encodings, offload_bytes: int) -> ResponseCompressor:
+    return ResponseCompressor(encodings, {}, min_bytes=1024, offload_bytes=offload_bytes,
+                              media_types=["application/json"])
+
+
+def level_table(sizes):
+    encoders = available_encoders()
+    print(f"{'payload':>8} {'encoding':>8} {'level':>5} {'out KB':>9} {'saved':>6} {'ms':>8} {'MB/s':>8}")
+    for size_kb in sizes:
+        payload = work_entries_payload(size_kb)
+        for encoding, levels in LEVELS.items():
+            if encoding not in encoders:
+                continue
+            for level in levels:
+                rounds = max(1, min(50, 2_000_000 // len(payload)))
+                started = time.process_time()
+                for _ in range(rounds):
+                    compress, finish = encoders[encoding](level)
+                    output = compress(payload) + finish()
+                elapsed = (time.process_time() - started) / rounds
+                print(f"{len(payload) // 1024:>6}KB {encoding:>8} {level:>5} {len(output) / 1024:>9.1f} "
+                      f"{1 - len(output) / len(payload):>6.1%} {elapsed * 1000:>8.2f} "
+                      f"{len(payload) / elapsed / 1e6:>8.1f}")
+    missing = [encoding for encoding in LEVELS if encoding not in encoders]
+    if missing:
+        print(f"(not installed: {', '.join(missing)})")
+
+
+async def loop_stall(payload: bytes, encoding: str, offload_bytes: int, concurrency: int) -> dict:
+    """Serve concurrent responses through the middleware and record the worst event loop delay"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        for offset in range(0, len(payload), CHUNK_BYTES):
+            await send({"type": "http.response.body", "body": payload[offset:offset + CHUNK_BYTES],
+                        "more_body": offset + CHUNK_BYTES < len(payload)})
+
+    middleware = CompressionMiddleware(app, compressor_for([encoding], offload_bytes))
+    scope = {"type": "http", "method": "GET", "path": "/api/work-entries",
+             "headers": [(b"accept-encoding", encoding.encode())]}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        await asyncio.sleep(0)
+
+    stalls = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - started - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(middleware(scope, receive, send) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick
+    stalls.sort()
+    return {
+        "elapsed_ms": elapsed * 1000,
+        "max_stall_ms": stalls[-1] * 1000 if stalls else 0.0,
+        "p99_stall_ms": stalls[int(len(stalls) * 0.99)] * 1000 if stalls else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma separated payload sizes in KB")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent large responses for the stall test")
+    parser.add_argument("--stall-kb", type=int, default=4000, help="Payload size for the stall test")
+    args = parser.parse_args()
+
+    level_table([int(size) for size in args.sizes.split(",")])
+
+    payload = work_entries_payload(args.stall_kb)
+    print(f"\n{args.concurrency} concurrent {len(payload) // 1024}KB responses in {CHUNK_BYTES // 1024}KB chunks")
+    print(f"{'encoding':>8} {'mode':>8} {'total ms':>9} {'max stall ms':>13} {'p99 stall ms':>13}")
+    for encoding in available_encoders():
+        for label, offload_bytes in (("inline", 1 << 62), ("thread", CHUNK_BYTES)):
+            result = await loop_stall(payload, encoding, offload_bytes, args.concurrency)
+            print(f"{encoding:>8} {label:>8} {result['elapsed_ms']:>9.1f} {result['max_stall_ms']:>13.2f} "
+                  f"{result['p99_stall_ms']:>13.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
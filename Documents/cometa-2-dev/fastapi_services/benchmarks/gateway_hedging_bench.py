@@ -0,0 +1,121 @@
+"""
+Gateway hedging benchmark: tail latency against extra upstream load
+Stub replicas answer in a few milliseconds but now and then stall or return
+503. The same closed-loop GET workload runs with no protection, with retries
+only and with hedging plus retries, reporting latency percentiles, failed
+responses and upstream attempts per request (the cost of the protection)
+
+Usage: python gateway_hedging_bench.py [--requests 2000] [--slow-ratio 0.03] [--error-ratio 0.02]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+# Benchmarks drive the gateway far above per-client limits; every request must reach an upstream
+os.environ.setdefault("GATEWAY_RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("GATEWAY_JWT_MODE", "off")
+os.environ.setdefault("GATEWAY_SINGLE_FLIGHT", "false")
+os.environ.setdefault("GATEWAY_CACHE_ENABLED", "false")
+
+import main as gateway  # noqa: E402
+from hedging import HedgingPolicy, RetryBudget  # noqa: E402
+from load_balancer import ReplicaSet  # noqa: E402
+from pools import build_service_pools  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("api-gateway").setLevel(logging.ERROR)
+
+
+class StubBody(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'{"items": [], "total": 0}'
+
+
+def policy(hedge: bool, max_retries: int) -> HedgingPolicy:
+    return HedgingPolicy(hedge=hedge, percentile=0.95, min_delay=0.005, max_delay=1.0, min_samples=20,
+                         max_retries=max_retries, backoff=0.01, max_backoff=0.1,
+                         budget=RetryBudget(ratio=0.1, min_per_second=1, window=10))
+
+
+async def run(mode: str, requests: int, clients: int, slow_ratio: float, error_ratio: float,
+              service_time: float, stall: float) -> dict:
+    rng = random.Random(42)
+    attempts = 0
+
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        nonlocal attempts
+        attempts += 1
+        roll = rng.random()
+        if roll < error_ratio:
+            await asyncio.sleep(service_time)
+            return httpx.Response(503, stream=StubBody())
+        await asyncio.sleep(stall if roll < error_ratio + slow_ratio else service_time)
+        return httpx.Response(200, stream=StubBody(), headers={"content-type": "application/json"})
+
+    urls = [f"http://team-{i}:8004" for i in range(3)]
+    gateway.SERVICES["team"] = urls
+    gateway.replica_sets["team"] = ReplicaSet("team", urls)
+    gateway.pools = build_service_pools(gateway.SERVICES, transport=httpx.MockTransport(upstream))
+    gateway.hedging = {"none": None, "retry": policy(False, 2), "hedge+retry": policy(True, 2)}[mode]
+
+    latencies = []
+    failed = 0
+    remaining = requests
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway") as caller:
+        async def worker():
+            nonlocal failed, remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await caller.get("/api/teams")
+                await response.aread()
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failed += 1
+
+        await asyncio.gather(*(worker() for _ in range(clients)))
+
+    for pool in gateway.pools.values():
+        await pool.aclose()
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "p50": percentile(0.50),
+        "p99": percentile(0.99),
+        "max": latencies[-1] * 1000,
+        "failed": failed / len(latencies),
+        "attempts": attempts / len(latencies),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--slow-ratio", type=float, default=0.03, help="Share of upstream calls that stall")
+    parser.add_argument("--error-ratio", type=float, default=0.02, help="Share of upstream calls answering 503")
+    parser.add_argument("--service-time-ms", type=float, default=5.0)
+    parser.add_argument("--stall-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7} {'attempts/req':>13}")
+    for mode in ("none", "retry", "hedge+retry"):
+        result = await run(mode, args.requests, args.clients, args.slow_ratio, args.error_ratio,
+                           args.service_time_ms / 1000, args.stall_ms / 1000)
+        print(f"{mode:>12} {result['p50']:>8.1f} {result['p99']:>8.1f} {result['max']:>8.1f} "
+              f"{result['failed']:>7.2%} {result['attempts']:>13.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
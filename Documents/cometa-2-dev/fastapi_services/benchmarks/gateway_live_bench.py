@@ -0,0 +1,222 @@
+"""
+Gateway live feed benchmark: polling against a fanned-out SSE stream
+A stub activity service publishes an activity every few hundred milliseconds.
+The same number of dashboard clients follow it either by polling
+GET /api/activities or by holding one Server-Sent Events connection each,
+which the gateway serves from a single shared upstream subscription. Reports
+gateway and upstream requests, bytes sent to clients and how late clients
+see each activity; a share of deliberately slow SSE clients shows that the
+gateway cuts them off instead of buffering without bound
+
+Usage: python gateway_live_bench.py [--clients 200] [--duration 10] [--poll-interval 2]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+# Benchmarks drive the gateway far above per-client limits; every request must reach an upstream
+os.environ.setdefault("GATEWAY_RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("GATEWAY_JWT_MODE", "off")
+os.environ.setdefault("GATEWAY_SINGLE_FLIGHT", "false")
+os.environ.setdefault("GATEWAY_CACHE_ENABLED", "false")
+os.environ.setdefault("GATEWAY_COMPRESSION_ENABLED", "false")
+# A small per-client buffer so stalled clients are cut off within a short run
+os.environ.setdefault("GATEWAY_LIVE_BUFFER_BYTES", "2048")
+
+import main as gateway  # noqa: E402
+from pools import build_service_pools  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("api-gateway").setLevel(logging.ERROR)
+
+
+class Feed:
+    """The activity service: a growing list of activities and a notification for new ones"""
+
+    def __init__(self):
+        self.activities = []
+        self.changed = asyncio.Condition()
+        self.upstream_requests = 0
+        self.upstream_streams = 0
+
+    async def publish(self, interval: float, duration: float):
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            await asyncio.sleep(interval)
+            async with self.changed:
+                self.activities.append({
+                    "id": len(self.activities),
+                    "type": random.choice(["work_entry_created", "material_issued", "stage_approved"]),
+                    "project_id": f"project-{random.randint(1, 40)}",
+                    "published": time.perf_counter(),
+                })
+                self.changed.notify_all()
+
+    def latest(self, count: int = 20) -> bytes:
+        return json.dumps({"items": self.activities[-count:][::-1], "total": len(self.activities)}).encode()
+
+
+class Body(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        async for chunk in self.chunks:
+            yield chunk
+
+
+async def event_stream(feed: Feed):
+    sent = len(feed.activities)
+    while True:
+        async with feed.changed:
+            await feed.changed.wait_for(lambda: len(feed.activities) > sent)
+        for activity in feed.activities[sent:]:
+            yield f"id: {activity['id']}\nevent: activity\ndata: {json.dumps(activity)}\n\n".encode()
+        sent = len(feed.activities)
+
+
+async def single(body: bytes):
+    yield body
+
+
+def install(feed: Feed):
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        if "text/event-stream" in request.headers.get("accept", ""):
+            feed.upstream_streams += 1
+            return httpx.Response(200, stream=Body(event_stream(feed)), headers={"content-type": "text/event-stream"})
+        feed.upstream_requests += 1
+        return httpx.Response(200, stream=Body(single(feed.latest())), headers={"content-type": "application/json"})
+
+    gateway.pools = build_service_pools(gateway.SERVICES, transport=httpx.MockTransport(upstream))
+
+
+async def poll_clients(feed: Feed, clients: int, duration: float, interval: float) -> dict:
+    delays = []
+    sent_bytes = 0
+    requests = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway") as caller:
+        async def client():
+            nonlocal sent_bytes, requests
+            seen = -1
+            await asyncio.sleep(random.uniform(0, interval))
+            started = time.perf_counter()
+            while time.perf_counter() - started < duration:
+                response = await caller.get("/api/activities")
+                requests += 1
+                sent_bytes += len(response.content)
+                now = time.perf_counter()
+                for activity in response.json()["items"]:
+                    if activity["id"] > seen:
+                        delays.append(now - activity["published"])
+                seen = max([seen] + [activity["id"] for activity in response.json()["items"]])
+                await asyncio.sleep(interval)
+
+        await asyncio.gather(*(client() for _ in range(clients)))
+    return {"requests": requests, "bytes": sent_bytes, "delays": delays}
+
+
+async def sse_client(duration: float, slow: bool, delays: list, totals: dict):
+    """One EventSource-like client driving the gateway's ASGI app directly, so events arrive as they are sent"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/activities", "raw_path": b"/api/activities", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"gateway"), (b"accept", b"text/event-stream")],
+        "client": ("127.0.0.1", random.randint(1024, 65535)), "server": ("gateway", 80),
+    }
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] != "http.response.body" or not message.get("body"):
+            return
+        totals["bytes"] += len(message["body"])
+        now = time.perf_counter()
+        for line in message["body"].split(b"\n"):
+            if line.startswith(b"data:"):
+                delays.append(now - json.loads(line[5:])["published"])
+        if slow:
+            # A client on a stalled connection: the transport stops taking data
+            await asyncio.sleep(duration)
+
+    app = asyncio.ensure_future(gateway.app(scope, receive, send))
+    await asyncio.wait([app], timeout=duration)
+    disconnected.set()
+    try:
+        await asyncio.wait_for(app, 1)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        pass
+
+
+async def sse_clients(clients: int, duration: float, slow_ratio: float) -> dict:
+    delays = []
+    totals = {"bytes": 0}
+    peak = 0
+
+    async def sample():
+        nonlocal peak
+        while True:
+            await asyncio.sleep(0.05)
+            buffered = sum(subscriber.pending_bytes for subscription in gateway.live_hub.subscriptions.values()
+                           for subscriber in subscription.subscribers)
+            peak = max(peak, buffered)
+
+    sampler = asyncio.create_task(sample())
+    slow = int(clients * slow_ratio)
+    await asyncio.gather(*(sse_client(duration, index < slow, delays, totals) for index in range(clients)))
+    sampler.cancel()
+    return {"requests": clients, "bytes": totals["bytes"], "delays": delays, "peak_buffered": peak}
+
+
+def summary(delays: list) -> tuple:
+    if not delays:
+        return 0.0, 0.0
+    delays.sort()
+    return sum(delays) / len(delays) * 1000, delays[int(len(delays) * 0.99)] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between polls")
+    parser.add_argument("--publish-interval", type=float, default=0.25, help="Seconds between activities")
+    parser.add_argument("--slow-ratio", type=float, default=0.05, help="Share of SSE clients that stop reading")
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients for {args.duration:.0f}s, one activity every {args.publish_interval * 1000:.0f} ms")
+    print(f"{'mode':>8} {'gw requests':>12} {'upstream':>9} {'KB to clients':>14} {'mean delay ms':>14} "
+          f"{'p99 delay ms':>13} {'dropped':>8} {'peak buffer KB':>15}")
+    for mode in ("poll", "sse"):
+        random.seed(1)
+        feed = Feed()
+        install(feed)
+        gateway.live_hub.subscriptions.clear()
+        dropped_before = gateway.live_hub.dropped
+        publisher = asyncio.create_task(feed.publish(args.publish_interval, args.duration + 1))
+        if mode == "poll":
+            result = await poll_clients(feed, args.clients, args.duration, args.poll_interval)
+        else:
+            result = await sse_clients(args.clients, args.duration, args.slow_ratio)
+        publisher.cancel()
+        for pool in gateway.pools.values():
+            await pool.aclose()
+        mean, p99 = summary(result["delays"])
+        upstream = feed.upstream_requests if mode == "poll" else feed.upstream_streams
+        print(f"{mode:>8} {result['requests']:>12} {upstream:>9} {result['bytes'] / 1024:>14.0f} {mean:>14.1f} "
+              f"{p99:>13.1f} {gateway.live_hub.dropped - dropped_before:>8} "
+              f"{result.get('peak_buffered', 0) / 1024:>15.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
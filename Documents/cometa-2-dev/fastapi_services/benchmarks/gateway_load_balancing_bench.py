@@ -0,0 +1,109 @@
+"""
+Gateway load balancing benchmark: throughput as replicas are added
+Each stub upstream replica serves a fixed number of concurrent requests with a
+fixed service time, so a single replica caps throughput and extra replicas lift it
+
+Usage: python gateway_load_balancing_bench.py [--replicas 1,2,4,8] [--clients 64] [--duration 3]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+# Benchmarks drive the gateway far above per-client limits
+os.environ.setdefault("GATEWAY_RATE_LIMIT_ENABLED", "false")
+
+import main as gateway  # noqa: E402
+from load_balancer import STRATEGIES, ReplicaSet  # noqa: E402
+from pools import build_service_pools  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class StubBody(httpx.AsyncByteStream):
+    """Response body delivered as a stream, the way a real connection would"""
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+    async def __aiter__(self):
+        yield self.payload
+
+
+class StubReplica:
+    """Upstream instance with bounded concurrency and a fixed service time"""
+
+    def __init__(self, concurrency: int, service_time: float):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.service_time = service_time
+        self.served = 0
+
+    async def handle(self) -> httpx.Response:
+        async with self.slots:
+            await asyncio.sleep(self.service_time)
+            self.served += 1
+        return httpx.Response(200, stream=StubBody(b'{"items": [], "total": 0}'),
+                              headers={"content-type": "application/json"})
+
+
+async def run(replica_count: int, strategy: str, clients: int, duration: float,
+              concurrency: int, service_time: float) -> dict:
+    """Drive the gateway with closed-loop clients and count completed requests"""
+    urls = [f"http://project-{i}:8002" for i in range(replica_count)]
+    stubs = {url: StubReplica(concurrency, service_time) for url in urls}
+
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        return await stubs[f"{request.url.scheme}://{request.url.host}:{request.url.port}"].handle()
+
+    gateway.SERVICES["project"] = urls
+    gateway.replica_sets["project"] = ReplicaSet("project", urls, strategy=strategy)
+    gateway.pools = build_service_pools(gateway.SERVICES, transport=httpx.MockTransport(upstream))
+
+    completed = 0
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway") as caller:
+        async def worker():
+            nonlocal completed
+            while time.perf_counter() < deadline:
+                response = await caller.get("/api/projects")
+                await response.aread()
+                if response.status_code == 200:
+                    completed += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    for pool in gateway.pools.values():
+        await pool.aclose()
+
+    served = [stub.served for stub in stubs.values()]
+    return {"rps": completed / elapsed, "spread": f"{min(served)}-{max(served)}"}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", default="1,2,4,8", help="Comma separated replica counts")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--replica-concurrency", type=int, default=4)
+    parser.add_argument("--service-time-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'replicas':>8} {'strategy':>18} {'req/s':>9} {'per-replica served':>20}")
+    for strategy in args.strategies.split(","):
+        for replica_count in (int(r) for r in args.replicas.split(",")):
+            result = await run(replica_count, strategy, args.clients, args.duration,
+                               args.replica_concurrency, args.service_time_ms / 1000)
+            print(f"{replica_count:>8} {strategy:>18} {result['rps']:>9.0f} {result['spread']:>20}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
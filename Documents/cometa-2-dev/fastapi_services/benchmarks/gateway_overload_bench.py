@@ -0,0 +1,141 @@
+"""
+Gateway overload benchmark: goodput as offered load exceeds capacity
+A stub work service handles a fixed number of requests at a time; the rest
+queue inside it. Open-loop clients send listing GETs, writes and logins at a
+rising rate, and a response only counts as goodput when it succeeds within
+the client deadline. Without admission control the upstream queue grows until
+nearly every answer is late; with adaptive limits the excess is shed early
+with 503 and the work that is admitted still finishes in time, logins and
+writes first
+
+Usage: python gateway_overload_bench.py [--capacity 200] [--loads 0.5,1,1.5,2,3] [--duration 5]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+# Benchmarks drive the gateway far above per-client limits; every request must reach an upstream
+os.environ.setdefault("GATEWAY_RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("GATEWAY_JWT_MODE", "off")
+os.environ.setdefault("GATEWAY_SINGLE_FLIGHT", "false")
+os.environ.setdefault("GATEWAY_CACHE_ENABLED", "false")
+os.environ.setdefault("GATEWAY_HEDGE_ENABLED", "false")
+os.environ.setdefault("GATEWAY_RETRY_MAX", "0")
+# Keep pools and breakers out of the way so only admission control differs between runs
+os.environ.setdefault("GATEWAY_POOL_MAX_CONNECTIONS", "10000")
+os.environ.setdefault("GATEWAY_POOL_POOL_TIMEOUT", "120")
+os.environ.setdefault("GATEWAY_BREAKER_SLOW_CALL_SECONDS", "120")
+
+import main as gateway  # noqa: E402
+from admission import AdmissionController  # noqa: E402
+from pools import build_service_pools  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("api-gateway").setLevel(logging.ERROR)
+
+# Share of offered requests per class: (method, path, label)
+MIX = [
+    (0.05, "POST", "/api/auth/login", "login"),
+    (0.15, "POST", "/api/work-entries", "write"),
+    (0.80, "GET", "/api/work-entries", "list"),
+]
+
+
+class StubBody(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'{"items": [], "total": 0}'
+
+
+def controller(algorithm: str) -> AdmissionController:
+    return AdmissionController(algorithm=algorithm, initial=20, min_limit=4, max_limit=200, max_queue=100,
+                               queue_timeout=0.5, retry_after=1)
+
+
+async def run(mode: str, rate: float, duration: float, workers: int, service_time: float,
+              deadline: float) -> dict:
+    services = {name: asyncio.Semaphore(workers) for name in ("auth", "work")}
+
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        # A service with a fixed worker count: everything beyond it waits its turn
+        async with services["auth" if request.url.port == 8001 else "work"]:
+            await asyncio.sleep(service_time)
+        return httpx.Response(200, stream=StubBody(), headers={"content-type": "application/json"})
+
+    gateway.pools = build_service_pools(gateway.SERVICES, transport=httpx.MockTransport(upstream))
+    gateway.admission = None if mode == "off" else controller(mode)
+
+    rng = random.Random(7)
+    results = {label: {"sent": 0, "good": 0, "shed": 0} for _, _, _, label in MIX}
+    tasks = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway",
+                                 timeout=None) as caller:
+        async def call(method: str, path: str, label: str):
+            started = time.perf_counter()
+            response = await caller.request(method, path, json={} if method == "POST" else None)
+            await response.aread()
+            elapsed = time.perf_counter() - started
+            if response.status_code == 200 and elapsed <= deadline:
+                results[label]["good"] += 1
+            elif response.status_code == 503:
+                results[label]["shed"] += 1
+
+        # Open loop: arrivals follow the clock, not the responses
+        started = time.perf_counter()
+        sent = 0
+        while time.perf_counter() - started < duration:
+            due = int((time.perf_counter() - started) * rate)
+            while sent < due:
+                roll = rng.random()
+                for share, method, path, label in MIX:
+                    roll -= share
+                    if roll < 0:
+                        break
+                results[label]["sent"] += 1
+                tasks.append(asyncio.create_task(call(method, path, label)))
+                sent += 1
+            await asyncio.sleep(0.002)
+        await asyncio.gather(*tasks)
+
+    for pool in gateway.pools.values():
+        await pool.aclose()
+
+    good = sum(result["good"] for result in results.values())
+    return {
+        "goodput": good / duration,
+        "shed": sum(result["shed"] for result in results.values()) / sent,
+        **{label: result["good"] / result["sent"] if result["sent"] else 1.0 for label, result in results.items()},
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=float, default=200, help="Work service capacity in requests/s")
+    parser.add_argument("--loads", default="0.5,1,1.5,2,3", help="Offered load as multiples of capacity")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of offered load per run")
+    parser.add_argument("--service-time-ms", type=float, default=20.0)
+    parser.add_argument("--deadline-ms", type=float, default=1000.0, help="Client deadline for goodput")
+    args = parser.parse_args()
+
+    service_time = args.service_time_ms / 1000
+    workers = max(1, round(args.capacity * service_time))
+    print(f"capacity {workers / service_time:.0f} req/s ({workers} workers x {args.service_time_ms:.0f} ms), "
+          f"deadline {args.deadline_ms:.0f} ms")
+    print(f"{'load':>5} {'mode':>9} {'offered/s':>10} {'goodput/s':>10} {'shed':>7} "
+          f"{'login ok':>9} {'write ok':>9} {'list ok':>8}")
+    for load in (float(value) for value in args.loads.split(",")):
+        rate = load * workers / service_time
+        for mode in ("off", "aimd", "gradient"):
+            result = await run(mode, rate, args.duration, workers, service_time, args.deadline_ms / 1000)
+            print(f"{load:>4.1f}x {mode:>9} {rate:>10.0f} {result['goodput']:>10.1f} {result['shed']:>7.1%} "
+                  f"{result['login']:>9.1%} {result['write']:>9.1%} {result['list']:>8.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Gateway routing microbenchmark: cost of finding the route for a request
+Compares the former one-decorator-pair-per-service layout, where Starlette
+tries every route's regex in turn, with the compiled route table behind the
+catch-all handler. Lookups are measured alone and as a full ASGI dispatch to a
+no-op endpoint, for a growing number of services; paths hit the first, middle
+and last declared service so linear scans show their worst case too
+
+Usage: python gateway_routing_bench.py [--services 7,100,1000] [--iterations 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from starlette.routing import Match
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+
+from routing import HTTP_METHODS, parse_route_config  # noqa: E402
+
+SUB_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH"]
+
+
+def service_names(count: int) -> list:
+    return [f"service-{index}" for index in range(count)]
+
+
+def decorator_app(names: list) -> FastAPI:
+    """One sub-path and one base route per service, as the gateway used to declare them"""
+    app = FastAPI()
+
+    for name in names:
+        async def sub_route(path: str, request: Request):
+            return Response(b"")
+
+        async def base_route(request: Request):
+            return Response(b"")
+
+        app.add_api_route(f"/api/{name}/{{path:path}}", sub_route, methods=SUB_METHODS)
+        app.add_api_route(f"/api/{name}", base_route, methods=["GET", "POST"])
+    return app
+
+
+def table_app(names: list):
+    table = parse_route_config({
+        "services": {name: [f"http://{name}:8000"] for name in names},
+        "routes": [{"prefix": f"/api/{name}", "service": name, "rewrite": f"/{name}"} for name in names],
+    }, docker_mode=False)
+    app = FastAPI()
+
+    @app.api_route("/api/{path:path}", methods=list(HTTP_METHODS))
+    async def routed(path: str, request: Request):
+        route, remainder = table.match(request.url.path)
+        route.upstream_path(remainder)
+        return Response(b"")
+
+    return app, table
+
+
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 50000), "server": ("gateway", 8000),
+    }
+
+
+def starlette_match(app: FastAPI, scope: dict):
+    # The scan Starlette's router performs for every request
+    for route in app.router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return route, child_scope
+    return None
+
+
+def per_op_ns(function, items: list, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        function(items[i % len(items)])
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+async def dispatch_us(app, scopes: list, iterations: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        await app(dict(scopes[i % len(scopes)]), receive, send)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", default="7,100,1000", help="Comma-separated service counts")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'services':>8} {'routes':>7} | {'scan match':>11} {'trie match':>11} | "
+          f"{'decorator req':>14} {'table req':>10}")
+    for count in [int(value) for value in args.services.split(",")]:
+        names = service_names(count)
+        paths = [f"/api/{names[index]}/items/42" for index in (0, count // 2, count - 1)]
+        scopes = [make_scope(path) for path in paths]
+
+        decorators = decorator_app(names)
+        catch_all, table = table_app(names)
+        # Build both middleware stacks before timing
+        await dispatch_us(decorators, scopes, 10)
+        await dispatch_us(catch_all, scopes, 10)
+
+        scan_ns = per_op_ns(lambda scope: starlette_match(decorators, scope), scopes, args.iterations)
+        trie_ns = per_op_ns(table.match, paths, args.iterations)
+        decorator_request = await dispatch_us(decorators, scopes, args.iterations)
+        table_request = await dispatch_us(catch_all, scopes, args.iterations)
+
+        print(f"{count:>8} {len(decorators.router.routes):>7} | {scan_ns / 1000:>9.2f}us {trie_ns / 1000:>9.2f}us | "
+              f"{decorator_request:>12.1f}us {table_request:>8.1f}us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
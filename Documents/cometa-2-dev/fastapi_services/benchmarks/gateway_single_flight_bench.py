@@ -0,0 +1,90 @@
+"""
+Gateway single-flight benchmark: upstream load under a thundering herd
+Bursts of clients request the same dashboard URL at once; with coalescing on,
+each burst should cost one upstream call instead of one per client
+
+Usage: python gateway_single_flight_bench.py [--clients 10,50,200] [--bursts 5] [--upstream-ms 50]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+# Benchmarks drive the gateway far above per-client limits
+os.environ.setdefault("GATEWAY_RATE_LIMIT_ENABLED", "false")
+# The bearer token only separates principals; it is not a real JWT
+os.environ.setdefault("GATEWAY_JWT_MODE", "off")
+
+import main as gateway  # noqa: E402
+from pools import build_service_pools  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+PAYLOAD = b'{"items": [{"id": 1, "type": "work_entry_created"}], "total": 1}'
+
+
+class StubBody(httpx.AsyncByteStream):
+    """Response body delivered as a stream, the way a real connection would"""
+
+    async def __aiter__(self):
+        yield PAYLOAD
+
+
+async def run(enabled: bool, clients: int, bursts: int, upstream_delay: float) -> dict:
+    """Fire bursts of identical GETs and count how many reach the upstream"""
+    upstream_calls = 0
+
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        nonlocal upstream_calls
+        upstream_calls += 1
+        await asyncio.sleep(upstream_delay)
+        return httpx.Response(200, stream=StubBody(), headers={"content-type": "application/json"})
+
+    gateway.SINGLE_FLIGHT_ENABLED = enabled
+    gateway.pools = build_service_pools(gateway.SERVICES, transport=httpx.MockTransport(upstream))
+
+    latencies = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway") as caller:
+        async def one():
+            started = time.perf_counter()
+            response = await caller.get("/api/activities", headers={"authorization": "Bearer dashboard"})
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+
+        for _ in range(bursts):
+            await asyncio.gather(*(one() for _ in range(clients)))
+
+    for pool in gateway.pools.values():
+        await pool.aclose()
+
+    latencies.sort()
+    return {
+        "upstream_calls": upstream_calls,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", default="10,50,200", help="Comma separated burst sizes")
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--upstream-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'single-flight':>14} {'upstream calls':>15} {'p50 ms':>8} {'p99 ms':>8}")
+    for clients in (int(c) for c in args.clients.split(",")):
+        for enabled in (False, True):
+            result = await run(enabled, clients, args.bursts, args.upstream_ms / 1000)
+            print(f"{clients:>8} {'on' if enabled else 'off':>14} {result['upstream_calls']:>15} "
+                  f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
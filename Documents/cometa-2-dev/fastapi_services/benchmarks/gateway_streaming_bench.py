@@ -0,0 +1,107 @@
+"""
+Gateway proxy benchmark: streaming pass-through vs buffered JSON re-encoding
+Runs the gateway in-process against a stub upstream serving multi-MB JSON listings
+
+Usage: python gateway_streaming_bench.py [--sizes 1,5,20] [--iterations 10]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'gateway'))
+# Benchmarks drive the gateway far above per-client limits
+os.environ.setdefault("GATEWAY_RATE_LIMIT_ENABLED", "false")
+
+import main as gateway  # noqa: E402
+from pools import build_service_pools  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def build_payload(size_mb: float) -> bytes:
+    """Build a material listing of roughly size_mb megabytes"""
+    item = {
+        "id": "7f0c2a52-8d1e-4b8a-9a57-3c1e5b2f9d10",
+        "name": "Fiber optic cable 96F single mode",
+        "category": "cable",
+        "unit": "m",
+        "unit_price_eur": 1.85,
+        "stock_qty": 12000,
+        "supplier": "Example Supplier GmbH",
+    }
+    item_size = len(json.dumps(item))
+    count = max(1, int(size_mb * 1024 * 1024 / item_size))
+    return json.dumps({"items": [item] * count, "total": count}).encode()
+
+
+class ChunkedUpstreamBody(httpx.AsyncByteStream):
+    """Upstream body delivered in socket-sized chunks like a real service"""
+
+    def __init__(self, payload: bytes, chunk_size: int = 64 * 1024):
+        self.payload = payload
+        self.chunk_size = chunk_size
+
+    async def __aiter__(self):
+        for offset in range(0, len(self.payload), self.chunk_size):
+            yield self.payload[offset:offset + self.chunk_size]
+
+
+async def run_mode(mode: str, payload: bytes, iterations: int) -> dict:
+    """Fetch the listing through the gateway and record latency and peak memory"""
+
+    def upstream(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, stream=ChunkedUpstreamBody(payload), headers={"content-type": "application/json"})
+
+    gateway.PROXY_MODE = mode
+    gateway.pools = build_service_pools(gateway.SERVICES, transport=httpx.MockTransport(upstream))
+
+    latencies = []
+    peaks = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway") as caller:
+        for _ in range(iterations):
+            tracemalloc.start()
+            started = time.perf_counter()
+            received = 0
+            async with caller.stream("GET", "/api/materials") as response:
+                async for chunk in response.aiter_raw():
+                    received += len(chunk)
+            latencies.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    for pool in gateway.pools.values():
+        await pool.aclose()
+    return {
+        "mode": mode,
+        "bytes": received,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "peak_mb": max(peaks) / (1024 * 1024),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,5,20", help="Comma separated payload sizes in MB")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'mode':>9} {'p50 ms':>9} {'max ms':>9} {'peak MB':>9}")
+    for size in (float(s) for s in args.sizes.split(",")):
+        payload = build_payload(size)
+        for mode in ("buffered", "stream"):
+            result = await run_mode(mode, payload, args.iterations)
+            print(f"{size:>6.1f}MB {result['mode']:>9} {result['p50_ms']:>9.1f} "
+                  f"{result['max_ms']:>9.1f} {result['peak_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,224 @@
+"""
+Gateway worker scaling benchmark: requests/s as preforked workers are added
+Starts the real gateway (python gateway/main.py, i.e. the prefork launcher)
+with 1, 2, 4... workers in front of a stub upstream, and drives proxied GETs
+from separate load processes over keep-alive connections. The rate limiter
+stays on with a limit no client reaches, so every request also takes a token
+from the shared-memory table. After each run the gateway's /metrics is read
+back: its request total must match what the clients sent, whichever worker
+answered the scrape. Load generator, stub and gateway share the host's cores,
+so run it on a machine with cores to spare
+
+Usage: python gateway_workers_bench.py [--workers 1,2,4] [--duration 10] [--connections 64]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+GATEWAY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gateway')
+
+PAYLOAD = json.dumps({
+    "items": [{"id": f"project-{i}", "name": f"Fiber rollout {i}", "status": "active", "progress": i % 100}
+              for i in range(20)],
+    "total": 20,
+}).encode()
+UPSTREAM_RESPONSE = (b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\ncontent-length: "
+                     + str(len(PAYLOAD)).encode() + b"\r\n\r\n" + PAYLOAD)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def run_upstream(port: int):
+    """A minimal keep-alive HTTP server answering every request with the same project list"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(UPSTREAM_RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", port, reuse_port=True, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+async def read_response(reader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = re.search(rb"(?i)\r\ncontent-length: *(\d+)", head)
+    if length:
+        await reader.readexactly(int(length.group(1)))
+        return status
+    # Chunked: read until the zero-length chunk
+    while True:
+        size = int((await reader.readline()).strip(), 16)
+        await reader.readexactly(size + 2)
+        if size == 0:
+            return status
+
+
+def run_load(port: int, path: str, connections: int, warmup: float, duration: float, results):
+    sent = 0
+
+    async def connection(latencies, statuses, start, stop):
+        nonlocal sent
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        request = f"GET {path} HTTP/1.1\r\nHost: gateway\r\n\r\n".encode()
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            writer.write(request)
+            status = await read_response(reader)
+            sent += 1
+            if started >= start:
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+
+    async def main():
+        latencies, statuses = [], {}
+        start = time.perf_counter() + warmup
+        await asyncio.gather(*(connection(latencies, statuses, start, start + duration)
+                               for _ in range(connections)))
+        results.put((latencies, statuses, sent))
+
+    asyncio.run(main())
+
+
+def routes_file(upstream: str) -> str:
+    """The gateway's route table with every service pointed at the stub"""
+    with open(os.path.join(GATEWAY, "routes.json")) as handle:
+        table = json.load(handle)
+    for service in table["services"].values():
+        service["local"] = [upstream]
+    handle, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(handle, "w") as output:
+        json.dump(table, output)
+    return path
+
+
+def scrape(port: int) -> str:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        return response.read().decode()
+
+
+def metric_total(text: str, name: str) -> float:
+    return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+               if line.startswith(name + "{") or line.startswith(name + " "))
+
+
+def start_gateway(workers: int, port: int, routes: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        GATEWAY_WORKERS=str(workers),
+        GATEWAY_PORT=str(port),
+        GATEWAY_ROUTES_FILE=routes,
+        GATEWAY_JWT_MODE="off",
+        GATEWAY_CACHE_ENABLED="false",
+        GATEWAY_SINGLE_FLIGHT="false",
+        GATEWAY_RATE_LIMIT_DEFAULT="1000000:1000000",
+        WORKER_SNAPSHOT_SECONDS="0.5",
+    )
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=GATEWAY, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if metric_total(scrape(port), "gateway_workers") == workers:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.25)
+    process.kill()
+    raise RuntimeError(f"Gateway with {workers} workers did not start")
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, *(2 ** i for i in range(1, 8) if 2 ** i <= cores), cores})
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)),
+                        help="Comma separated worker counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--connections", type=int, default=64, help="Keep-alive connections in total")
+    parser.add_argument("--load-processes", type=int, default=max(1, cores // 2))
+    parser.add_argument("--upstream-processes", type=int, default=max(1, cores // 4))
+    parser.add_argument("--path", default="/api/projects")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstreams = [multiprocessing.Process(target=run_upstream, args=(upstream_port,), daemon=True)
+                 for _ in range(args.upstream_processes)]
+    for process in upstreams:
+        process.start()
+    routes = routes_file(f"http://127.0.0.1:{upstream_port}")
+
+    print(f"{cores} cores, {args.load_processes} load processes, {args.connections} connections, "
+          f"{args.upstream_processes} stub upstream processes, GET {args.path}")
+    print(f"{'workers':>8} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'non-200':>8} "
+          f"{'sent':>8} {'metrics total':>14}")
+    baseline = None
+    try:
+        for workers in (int(value) for value in args.workers.split(",")):
+            port = free_port()
+            gateway = start_gateway(workers, port, routes)
+            try:
+                before = metric_total(scrape(port), "gateway_requests_total")
+                results = multiprocessing.Queue()
+                per_process = max(1, args.connections // args.load_processes)
+                loaders = [multiprocessing.Process(target=run_load, args=(port, args.path, per_process, args.warmup,
+                                                                          args.duration, results))
+                           for _ in range(args.load_processes)]
+                for process in loaders:
+                    process.start()
+                latencies, statuses, sent = [], {}, 0
+                for _ in loaders:
+                    process_latencies, process_statuses, process_sent = results.get()
+                    latencies.extend(process_latencies)
+                    sent += process_sent
+                    for status, count in process_statuses.items():
+                        statuses[status] = statuses.get(status, 0) + count
+                for process in loaders:
+                    process.join()
+                # Let every worker publish its final counts before reading them back
+                time.sleep(1.0)
+                served = metric_total(scrape(port), "gateway_requests_total") - before
+            finally:
+                gateway.send_signal(signal.SIGTERM)
+                gateway.wait(timeout=60)
+
+            latencies.sort()
+            rate = len(latencies) / args.duration
+            baseline = baseline or rate
+            non_ok = sum(count for status, count in statuses.items() if status != 200)
+            print(f"{workers:>8} {rate:>9.0f} {rate / baseline:>7.2f}x "
+                  f"{latencies[len(latencies) // 2] * 1000:>8.2f} {latencies[int(len(latencies) * 0.99)] * 1000:>8.2f} "
+                  f"{non_ok:>8} {sent:>8} {served:>14.0f}")
+    finally:
+        for process in upstreams:
+            process.terminate()
+        os.unlink(routes)
+
+
+if __name__ == "__main__":
+    main()
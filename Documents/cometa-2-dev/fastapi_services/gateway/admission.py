@@ -0,0 +1,239 @@
+"""
+Adaptive concurrency limits and priority load shedding for the API Gateway
+Each service gets a concurrency limit that follows its observed upstream
+latency (gradient: shrink when latency rises above its long-run baseline;
+or AIMD). Requests over the limit wait in a bounded queue ordered by priority
+class, so logins and writes are admitted before listing reads, and requests
+that cannot be admitted soon are shed at once instead of piling up upstream
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+from typing import Dict, List, Optional
+
+from routing import PRIORITIES
+
+logger = logging.getLogger("api-gateway")
+
+GRADIENT = "gradient"
+AIMD = "aimd"
+
+
+class Overloaded(Exception):
+    """The request was shed; the caller should retry after retry_after seconds"""
+
+    def __init__(self, service_name: str, retry_after: int):
+        super().__init__(f"Service '{service_name}' is overloaded")
+        self.retry_after = retry_after
+
+
+def classify(method: str, explicit: Optional[str], listing: bool) -> str:
+    """Priority class of a request: the route's own, else writes over single reads over listings"""
+    if explicit:
+        return explicit
+    if method.upper() not in ("GET", "HEAD", "OPTIONS"):
+        return "high"
+    return "low" if listing else "normal"
+
+
+class AdaptiveLimit:
+    """Concurrency limit driven by latency samples"""
+
+    def __init__(self, algorithm: str, initial: int, min_limit: int, max_limit: int,
+                 smoothing: float = 0.2, tolerance: float = 1.5, backoff: float = 0.9, long_window: int = 600):
+        self.algorithm = algorithm
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self._alpha = 2 / (long_window + 1)
+        self.long_rtt: Optional[float] = None
+        self.short_rtt: Optional[float] = None
+
+    def update(self, rtt: Optional[float], in_flight: int, failed: bool):
+        if failed:
+            # Errors and timeouts say the service is past its capacity; their latency is not a sample
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            return
+        if rtt is None:
+            return
+        rtt = max(rtt, 1e-6)
+        if self.long_rtt is None:
+            self.long_rtt = self.short_rtt = rtt
+        self.long_rtt += (rtt - self.long_rtt) * self._alpha
+        self.short_rtt += (rtt - self.short_rtt) * 0.5
+        # Recover the baseline quickly once a latency spike is over
+        if self.long_rtt > 2 * self.short_rtt:
+            self.long_rtt *= 0.95
+
+        # Only grow while the limit is actually being used
+        app_limited = in_flight * 2 < self.limit
+        if self.algorithm == AIMD:
+            if self.short_rtt > self.tolerance * self.long_rtt:
+                limit = self.limit * self.backoff
+            elif app_limited:
+                return
+            else:
+                limit = self.limit + 1 / self.limit
+        else:
+            gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+            limit = self.limit * gradient + math.sqrt(self.limit)
+            if app_limited and limit > self.limit:
+                return
+            limit = self.limit * (1 - self.smoothing) + limit * self.smoothing
+        self.limit = min(self.max_limit, max(self.min_limit, limit))
+
+
+class ServiceAdmission:
+    """Admission control for one service: adaptive limit plus a bounded priority queue"""
+
+    def __init__(self, service_name: str, limit: AdaptiveLimit, max_queue: int, queue_timeout: float,
+                 retry_after: int):
+        self.service_name = service_name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._queue: List[tuple] = []
+        self._order = itertools.count()
+        self.admitted = 0
+        self.waited = 0
+        self.shed: Dict[str, int] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _shed(self, priority: str) -> Overloaded:
+        self.shed[priority] = self.shed.get(priority, 0) + 1
+        return Overloaded(self.service_name, self.retry_after)
+
+    async def acquire(self, priority: str):
+        """Wait for a slot; raises Overloaded when the request is shed"""
+        rank = PRIORITIES.index(priority)
+        if self.in_flight < int(self.limit.limit) and not self._queue:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if len(self._queue) >= self.max_queue:
+            # A full queue makes room only for a more important request, displacing the newest least important one
+            worst = max(self._queue)
+            if worst[0] <= rank:
+                raise self._shed(priority)
+            self._queue.remove(worst)
+            heapq.heapify(self._queue)
+            if not worst[2].done():
+                worst[2].set_exception(self._shed(PRIORITIES[worst[0]]))
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (rank, next(self._order), waiter)
+        heapq.heappush(self._queue, entry)
+        self.waited += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Granted at the same moment the wait ran out
+                return
+            self._remove(entry)
+            raise self._shed(priority)
+        except asyncio.CancelledError:
+            self._remove(entry)
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self.release(None, failed=False)
+            raise
+
+    def _remove(self, entry: tuple):
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        if not entry[2].done():
+            entry[2].cancel()
+
+    def release(self, rtt: Optional[float], failed: bool):
+        """Free a slot, feed the latency sample to the limit and admit waiters"""
+        self.limit.update(rtt, self.in_flight, failed)
+        self.in_flight -= 1
+        while self._queue and self.in_flight < int(self.limit.limit):
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            self.admitted += 1
+            waiter.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit.limit, 1),
+            "in_flight": self.in_flight,
+            "queued": self.queue_depth,
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "shed": self.shed,
+            "rtt_ms": {
+                "short": round(self.limit.short_rtt * 1000, 2) if self.limit.short_rtt is not None else None,
+                "long": round(self.limit.long_rtt * 1000, 2) if self.limit.long_rtt is not None else None,
+            },
+        }
+
+
+class AdmissionController:
+    """Per-service admission, created on first use from shared settings"""
+
+    def __init__(self, algorithm: str, initial: int, min_limit: int, max_limit: int, max_queue: int,
+                 queue_timeout: float, retry_after: int):
+        if algorithm not in (GRADIENT, AIMD):
+            logger.warning(f"Unknown concurrency limit algorithm '{algorithm}', using {GRADIENT}")
+            algorithm = GRADIENT
+        self.algorithm = algorithm
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.services: Dict[str, ServiceAdmission] = {}
+
+    def service(self, service_name: str) -> ServiceAdmission:
+        admission = self.services.get(service_name)
+        if admission is None:
+            admission = self.services[service_name] = ServiceAdmission(
+                service_name,
+                AdaptiveLimit(self.algorithm, self.initial, self.min_limit, self.max_limit),
+                self.max_queue,
+                self.queue_timeout,
+                self.retry_after,
+            )
+        return admission
+
+    def stats(self) -> dict:
+        return {
+            "algorithm": self.algorithm,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "max_queue": self.max_queue,
+            "queue_timeout_ms": round(self.queue_timeout * 1000),
+            "services": {name: admission.stats() for name, admission in self.services.items()},
+        }
+
+
+def build_admission_controller() -> Optional[AdmissionController]:
+    """Create the controller from GATEWAY_ADMISSION_* variables, or None when disabled"""
+    if os.getenv("GATEWAY_ADMISSION_ENABLED", "true").lower() != "true":
+        return None
+    return AdmissionController(
+        algorithm=os.getenv("GATEWAY_ADMISSION_ALGORITHM", GRADIENT).lower(),
+        initial=int(os.getenv("GATEWAY_ADMISSION_INITIAL_LIMIT", "20")),
+        min_limit=int(os.getenv("GATEWAY_ADMISSION_MIN_LIMIT", "4")),
+        max_limit=int(os.getenv("GATEWAY_ADMISSION_MAX_LIMIT", "200")),
+        max_queue=int(os.getenv("GATEWAY_ADMISSION_MAX_QUEUE", "100")),
+        queue_timeout=float(os.getenv("GATEWAY_ADMISSION_QUEUE_TIMEOUT_MS", "500")) / 1000,
+        retry_after=int(os.getenv("GATEWAY_ADMISSION_RETRY_AFTER", "1")),
+    )
@@ -0,0 +1,196 @@
+"""
+Batch endpoint support for the API Gateway
+A batch carries several sub-requests (typically the dashboard's reads from
+different services). Each one becomes its own request scope with the caller's
+credentials and is handled exactly like a standalone request through the route
+table and forward_request, concurrently up to a bound, so a batch takes about
+as long as its slowest sub-request
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+from fast_json import dumps, loads
+
+logger = logging.getLogger("api-gateway")
+
+# Sub-request headers that describe the caller rather than the batch request
+DROPPED_HEADERS = {"content-length", "content-type", "accept-encoding", "transfer-encoding", "expect"}
+# Upstream headers worth returning per sub-request
+RELAYED_HEADERS = ("content-type", "etag", "cache-control", "last-modified", "location", "retry-after", "x-cache")
+
+
+class SubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    # Gateway path, optionally with a query string, e.g. /api/projects?status=active
+    path: str
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest]
+
+
+def sub_request(parent: Request, item: SubRequest) -> Request:
+    """A request for the sub-request, carrying the parent's credentials and client address"""
+    path, _, query = item.path.partition("?")
+    body = b"" if item.body is None else dumps(item.body)
+
+    headers = [(name, value) for name, value in parent.scope["headers"] if name.decode("latin-1") not in DROPPED_HEADERS]
+    overrides = {name.lower(): value for name, value in item.headers.items() if name.lower() not in DROPPED_HEADERS}
+    headers = [(name, value) for name, value in headers if name.decode("latin-1") not in overrides]
+    headers.extend((name.encode("latin-1"), value.encode("latin-1")) for name, value in overrides.items())
+    # Bodies are embedded in the batch response, which is compressed as a whole
+    headers.append((b"accept-encoding", b"identity"))
+    if body:
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+    scope = {
+        **parent.scope,
+        "method": item.method.upper(),
+        "path": path,
+        "raw_path": quote(path).encode("latin-1"),
+        "query_string": query.encode("latin-1"),
+        "headers": headers,
+        # Live (SSE) routing does not apply inside a batch
+        "state": {"batch_item": True},
+    }
+    for key in ("route", "endpoint", "path_params"):
+        scope.pop(key, None)
+
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request(scope, receive)
+
+
+async def read_response(response: Response) -> Tuple[int, Dict[str, str], bytes]:
+    """Status, relayed headers and complete body of a proxied response"""
+    if isinstance(response, StreamingResponse):
+        try:
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            # Streamed responses hold their pool slot until the background task closes them
+            if response.background is not None:
+                await response.background()
+    else:
+        body = response.body
+    headers = {}
+    for name, value in response.raw_headers:
+        name = name.decode("latin-1").lower()
+        if name in RELAYED_HEADERS:
+            headers[name] = value.decode("latin-1")
+    return response.status_code, headers, body
+
+
+def decode_body(content_type: str, body: bytes):
+    if not body:
+        return None
+    if content_type.startswith("application/json"):
+        try:
+            return loads(body)
+        except ValueError:
+            pass
+    return body.decode("utf-8", errors="replace")
+
+
+class BatchExecutor:
+    """Runs the sub-requests of a batch concurrently through a request handler"""
+
+    def __init__(self, handler: Callable[[Request], Awaitable[Response]], max_requests: int,
+                 concurrency: int, methods: List[str]):
+        self.handler = handler
+        self.max_requests = max_requests
+        self.concurrency = concurrency
+        self.methods = methods
+        self.batches = 0
+        self.sub_requests = 0
+        self.failed = 0
+
+    def validate(self, items: List[SubRequest]):
+        if not items:
+            raise HTTPException(status_code=422, detail="Batch contains no requests")
+        if len(items) > self.max_requests:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {self.max_requests} requests")
+        for index, item in enumerate(items):
+            if item.method.upper() not in self.methods:
+                raise HTTPException(
+                    status_code=422, detail=f"Request {index}: method {item.method.upper()} not allowed in a batch"
+                )
+            if not item.path.startswith("/api/"):
+                raise HTTPException(status_code=422, detail=f"Request {index}: path must start with /api/")
+
+    async def run_one(self, parent: Request, index: int, item: SubRequest, limit: asyncio.Semaphore) -> dict:
+        async with limit:
+            started = time.perf_counter()
+            try:
+                status_code, headers, body = await read_response(await self.handler(sub_request(parent, item)))
+                content = decode_body(headers.get("content-type", ""), body)
+            except HTTPException as e:
+                status_code, headers, content = e.status_code, dict(e.headers or {}), {"detail": e.detail}
+            except Exception as e:
+                logger.error(f"Batch request {item.method} {item.path} failed: {e}")
+                status_code, headers, content = 500, {}, {"detail": "Gateway error"}
+            elapsed = time.perf_counter() - started
+        if status_code >= 500:
+            self.failed += 1
+        return {
+            "id": item.id if item.id is not None else str(index),
+            "status": status_code,
+            "duration_ms": round(elapsed * 1000, 2),
+            "headers": headers,
+            "body": content,
+        }
+
+    async def run(self, parent: Request, items: List[SubRequest]) -> dict:
+        self.validate(items)
+        self.batches += 1
+        self.sub_requests += len(items)
+        limit = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(self.run_one(parent, i, item, limit) for i, item in enumerate(items)))
+        return {
+            "responses": responses,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "max_requests": self.max_requests,
+            "concurrency": self.concurrency,
+            "methods": self.methods,
+            "batches": self.batches,
+            "sub_requests": self.sub_requests,
+            "failed": self.failed,
+        }
+
+
+def build_batch_executor(handler: Callable[[Request], Awaitable[Response]]) -> Optional[BatchExecutor]:
+    """Create the executor from GATEWAY_BATCH_* variables, or None when disabled"""
+    if os.getenv("GATEWAY_BATCH_ENABLED", "true").lower() != "true":
+        return None
+    return BatchExecutor(
+        handler,
+        max_requests=int(os.getenv("GATEWAY_BATCH_MAX_REQUESTS", "20")),
+        concurrency=int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "8")),
+        # Reads by default; writes in a batch would have no transactional meaning
+        methods=[
+            method.strip().upper() for method in os.getenv("GATEWAY_BATCH_METHODS", "GET").split(",") if method.strip()
+        ],
+    )
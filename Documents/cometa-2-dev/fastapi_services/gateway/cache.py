@@ -0,0 +1,264 @@
+"""
+Response cache for idempotent GET routes of the API Gateway
+Entries are keyed by path, query string and auth principal, bounded by total
+size with LRU eviction, honour upstream Cache-Control/ETag and are invalidated
+by writes to the same resource prefix
+"""
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("api-gateway")
+
+# Fixed per-entry overhead added to the body size when accounting memory
+ENTRY_OVERHEAD_BYTES = 512
+
+
+def parse_routes(spec: str) -> Dict[str, float]:
+    """Parse "prefix=ttl,prefix=ttl" into a prefix -> TTL seconds map"""
+    routes = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        prefix, ttl = item.split("=", 1)
+        routes[prefix.strip().rstrip("/")] = float(ttl)
+    return routes
+
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """Split a Cache-Control header into lower-cased directives"""
+    directives = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def principal_for(headers) -> str:
+    """Identify the caller from its credentials without keeping the raw token
+    A session cookie identifies its caller like a bearer token does, so cookies
+    are part of the principal; only callers sending no credentials are anonymous
+    """
+    credentials = [headers.get(name, "") for name in ("authorization", "x-token", "cookie")]
+    if not any(credentials):
+        return "anonymous"
+    return hashlib.sha256("\n".join(credentials).encode("utf-8")).hexdigest()[:32]
+
+
+def request_key(path: str, query: str, headers) -> tuple:
+    """Identity of a GET: path, normalised query, principal and accepted encodings"""
+    query = "&".join(sorted(query.split("&"))) if query else ""
+    return (path.rstrip("/"), query, principal_for(headers), headers.get("accept-encoding", ""))
+
+
+def shareable(headers: List[Tuple[bytes, bytes]]) -> bool:
+    """Whether a response may be replayed to later requests of its key: it sets no
+    cookies, and varies on nothing but Accept-Encoding, which is part of the key"""
+    for name, value in headers:
+        name = name.lower()
+        if name == b"set-cookie":
+            return False
+        if name == b"vary" and any(
+            token.strip() not in (b"", b"accept-encoding") for token in value.lower().split(b",")
+        ):
+            return False
+    return True
+
+
+@dataclass
+class CacheEntry:
+    """A stored upstream response"""
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+    prefix: str
+    stored_at: float
+    expires_at: float
+    size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = len(self.body) + sum(len(k) + len(v) for k, v in self.headers) + ENTRY_OVERHEAD_BYTES
+
+    def fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def age(self, now: float) -> int:
+        return int(now - self.stored_at)
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of GET responses with per-route TTLs"""
+
+    def __init__(self, routes: Dict[str, float], max_bytes: int, max_entry_bytes: int, enabled: bool = True):
+        # Explicitly configured TTLs take precedence over the route table's
+        self.overrides = routes
+        self.routes = dict(routes)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.enabled = enabled
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self._keys_by_prefix: Dict[str, set] = {}
+        # Bumped on every write so responses fetched before the write are not stored
+        self._generations: Dict[str, int] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.not_modified = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def route_for(self, path: str) -> Optional[str]:
+        """Longest configured prefix covering the path, if the path is cacheable"""
+        if not self.enabled:
+            return None
+        path = path.rstrip("/")
+        best = None
+        for prefix in self.routes:
+            if (path == prefix or path.startswith(prefix + "/")) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return best
+
+    def set_route_ttls(self, ttls: Dict[str, float]):
+        """Apply the route table's cache TTLs, dropping entries of routes no longer cached"""
+        routes = {**ttls, **self.overrides}
+        for prefix in set(self.routes).difference(routes):
+            self.invalidate_prefix(prefix)
+        self.routes = routes
+
+    def generation(self, prefix: str) -> int:
+        return self._generations.get(prefix, 0)
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        """Look up an entry (fresh or stale) and mark it recently used"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def ttl_for(self, prefix: str, cache_control: str) -> Optional[float]:
+        """TTL for a response, or None when the upstream forbids storing it"""
+        directives = parse_cache_control(cache_control)
+        if "no-store" in directives:
+            return None
+        ttl = self.routes[prefix]
+        if "no-cache" in directives:
+            return 0.0
+        for directive in ("s-maxage", "max-age"):
+            if directives.get(directive) is not None:
+                try:
+                    return min(ttl, float(directives[directive]))
+                except ValueError:
+                    break
+        return ttl
+
+    def store(self, key: tuple, prefix: str, generation: int, status_code: int,
+              headers: List[Tuple[bytes, bytes]], body: bytes, cache_control: str,
+              etag: Optional[str]) -> Optional[CacheEntry]:
+        """Store a complete 200 response unless it is too large, uncacheable or outdated"""
+        if status_code != 200 or len(body) > self.max_entry_bytes:
+            return None
+        if not shareable(headers):
+            return None
+        if generation != self.generation(prefix):
+            return None
+        ttl = self.ttl_for(prefix, cache_control)
+        if ttl is None:
+            return None
+
+        now = time.monotonic()
+        entry = CacheEntry(
+            status_code=status_code,
+            headers=headers,
+            body=body,
+            etag=etag or f'W/"{hashlib.sha1(body).hexdigest()}"',
+            prefix=prefix,
+            stored_at=now,
+            expires_at=now + ttl,
+        )
+        self._remove(key)
+        self._entries[key] = entry
+        self._keys_by_prefix.setdefault(prefix, set()).add(key)
+        self.bytes += entry.size
+        self.stores += 1
+
+        while self.bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def refresh(self, key: tuple, cache_control: str):
+        """Extend a stale entry after the upstream confirmed it with 304"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        ttl = self.ttl_for(entry.prefix, cache_control)
+        if ttl is None:
+            self._remove(key)
+            return
+        now = time.monotonic()
+        entry.stored_at = now
+        entry.expires_at = now + ttl
+        self.revalidated += 1
+
+    def invalidate(self, path: str):
+        """Drop every entry under the resource prefix written to by path"""
+        prefix = self.route_for(path)
+        if prefix is not None:
+            self.invalidate_prefix(prefix)
+
+    def invalidate_prefix(self, prefix: str):
+        self._generations[prefix] = self.generation(prefix) + 1
+        keys = self._keys_by_prefix.pop(prefix, set())
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry.size
+        if keys:
+            self.invalidations += 1
+            logger.debug(f"Invalidated {len(keys)} cached responses under {prefix}")
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+            self._keys_by_prefix.get(entry.prefix, set()).discard(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "routes": self.routes,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "revalidated": self.revalidated,
+            "not_modified": self.not_modified,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def build_response_cache() -> ResponseCache:
+    """Create the gateway response cache from GATEWAY_CACHE_* variables; per-route TTLs
+    come from the route table, GATEWAY_CACHE_ROUTES ("prefix=ttl,...") overrides them"""
+    return ResponseCache(
+        routes=parse_routes(os.getenv("GATEWAY_CACHE_ROUTES", "")),
+        max_bytes=int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        max_entry_bytes=int(os.getenv("GATEWAY_CACHE_MAX_ENTRY_BYTES", str(2 * 1024 * 1024))),
+        enabled=os.getenv("GATEWAY_CACHE_ENABLED", "true").lower() == "true",
+    )
@@ -0,0 +1,171 @@
+"""
+Circuit breakers for upstream services of the API Gateway
+A breaker opens when a service's error rate, slow-call rate or run of consecutive
+failures crosses its threshold, so calls fail fast instead of waiting on a dead service
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable
+
+from config import service_env
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _env(service_name: str, key: str, default: str) -> str:
+    return service_env("GATEWAY_BREAKER", service_name, key, default)
+
+
+@dataclass
+class BreakerConfig:
+    """Thresholds for one service's circuit breaker"""
+    window_seconds: float = 30.0
+    min_requests: int = 20
+    error_rate_threshold: float = 0.5
+    slow_call_seconds: float = 5.0
+    slow_rate_threshold: float = 0.8
+    consecutive_failures: int = 5
+    open_seconds: float = 15.0
+    half_open_max_calls: int = 3
+
+    @classmethod
+    def from_env(cls, service_name: str) -> "BreakerConfig":
+        """Build the config for a service from GATEWAY_BREAKER_* variables"""
+        return cls(
+            window_seconds=float(_env(service_name, "WINDOW_SECONDS", "30")),
+            min_requests=int(_env(service_name, "MIN_REQUESTS", "20")),
+            error_rate_threshold=float(_env(service_name, "ERROR_RATE", "0.5")),
+            slow_call_seconds=float(_env(service_name, "SLOW_CALL_SECONDS", "5.0")),
+            slow_rate_threshold=float(_env(service_name, "SLOW_RATE", "0.8")),
+            consecutive_failures=int(_env(service_name, "CONSECUTIVE_FAILURES", "5")),
+            open_seconds=float(_env(service_name, "OPEN_SECONDS", "15")),
+            half_open_max_calls=int(_env(service_name, "HALF_OPEN_MAX_CALLS", "3")),
+        )
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding time window of call outcomes"""
+
+    def __init__(self, name: str, config: BreakerConfig):
+        self.name = name
+        self.config = config
+        self._state = CLOSED
+        self._opened_at = 0.0
+        # (timestamp, failed, slow) per completed call inside the window
+        self._calls = deque()
+        self._consecutive_failures = 0
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_failure = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.config.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+            self._half_open_successes = 0
+        return self._state
+
+    def retry_after(self) -> int:
+        """Seconds until an open breaker lets a probe call through"""
+        remaining = self.config.open_seconds - (time.monotonic() - self._opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream; rejected calls are counted"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._half_open_in_flight < self.config.half_open_max_calls:
+            self._half_open_in_flight += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, latency: float):
+        self._record(False, latency)
+
+    def record_failure(self, latency: float, reason: str = ""):
+        self.last_failure = reason or None
+        self._record(True, latency)
+
+    def release(self):
+        """Give back an allowed call's half-open probe slot without recording an outcome,
+        for calls that were abandoned rather than answered (a cancelled hedge)"""
+        if self._state == HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def _record(self, failed: bool, latency: float):
+        now = time.monotonic()
+        slow = latency >= self.config.slow_call_seconds
+
+        if self._state == HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            if failed or slow:
+                self._trip(now)
+                return
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.config.half_open_max_calls:
+                self._reset()
+            return
+
+        self._calls.append((now, failed, slow))
+        self._consecutive_failures = self._consecutive_failures + 1 if failed else 0
+        self._evict(now)
+
+        if self._state == CLOSED and self._should_trip():
+            self._trip(now)
+
+    def _evict(self, now: float):
+        horizon = now - self.config.window_seconds
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def _should_trip(self) -> bool:
+        if self._consecutive_failures >= self.config.consecutive_failures:
+            return True
+        total = len(self._calls)
+        if total < self.config.min_requests:
+            return False
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return (failures / total >= self.config.error_rate_threshold
+                or slow / total >= self.config.slow_rate_threshold)
+
+    def _trip(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.times_opened += 1
+
+    def _reset(self):
+        self._state = CLOSED
+        self._calls.clear()
+        self._consecutive_failures = 0
+
+    def stats(self) -> dict:
+        """Current state and window figures for health and stats endpoints"""
+        self._evict(time.monotonic())
+        total = len(self._calls)
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return {
+            "state": self.state,
+            "window_requests": total,
+            "error_rate": round(failures / total, 3) if total else 0.0,
+            "slow_rate": round(slow / total, 3) if total else 0.0,
+            "consecutive_failures": self._consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "last_failure": self.last_failure,
+        }
+
+
+def build_breakers(service_names: Iterable[str]) -> Dict[str, CircuitBreaker]:
+    """Create one breaker per registered service, configured from the environment"""
+    return {name: CircuitBreaker(name, BreakerConfig.from_env(name)) for name in service_names}
@@ -0,0 +1,299 @@
+"""
+Response compression for the API Gateway
+Negotiates zstd, brotli or gzip from the client's Accept-Encoding for
+compressible responses above a size threshold. Responses the upstream already
+encoded pass through untouched, bodies are compressed chunk by chunk as they
+stream, and large chunks are compressed in a worker thread so the event loop
+keeps serving other requests
+"""
+import asyncio
+import logging
+import os
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("api-gateway")
+
+DEFAULT_ENCODINGS = "zstd,br,gzip"
+DEFAULT_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+# Media type prefixes worth compressing; event streams must reach clients unbuffered
+DEFAULT_TYPES = "application/json,text/,application/javascript,application/xml,image/svg+xml"
+EXCLUDED_TYPES = ("text/event-stream",)
+
+# (compress chunk, finish) for one response body
+Stream = Tuple[Callable[[bytes], bytes], Callable[[], bytes]]
+
+
+def gzip_stream(level: int) -> Stream:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def brotli_stream(level: int) -> Stream:
+    import brotli
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.finish
+
+
+def zstd_stream(level: int) -> Stream:
+    import zstandard
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+def available_encoders() -> Dict[str, Callable[[int], Stream]]:
+    """Encoders usable in this process; brotli and zstd need their optional packages"""
+    encoders = {"gzip": gzip_stream}
+    try:
+        import brotli  # noqa: F401
+        encoders["br"] = brotli_stream
+    except ImportError:
+        pass
+    try:
+        import zstandard  # noqa: F401
+        encoders["zstd"] = zstd_stream
+    except ImportError:
+        pass
+    return encoders
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Coding -> q-value from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted["gzip" if coding == "x-gzip" else coding] = q
+    return accepted
+
+
+def negotiate(header: str, encodings: List[str]) -> Optional[str]:
+    """The client's highest-q encoding among ours, ties going to our preference order"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class ResponseCompressor:
+    """Compression settings and counters shared by every response"""
+
+    def __init__(self, encodings: List[str], levels: Dict[str, int], min_bytes: int,
+                 offload_bytes: int, media_types: List[str]):
+        encoders = available_encoders()
+        missing = [encoding for encoding in encodings if encoding not in encoders]
+        if missing:
+            logger.info(f"Response compression without {', '.join(missing)}: optional package not installed")
+        self.encodings = [encoding for encoding in encodings if encoding in encoders]
+        self._encoders = encoders
+        self.levels = levels
+        self.min_bytes = min_bytes
+        self.offload_bytes = offload_bytes
+        self.media_types = media_types
+        self.responses: Dict[str, int] = {}
+        self.bytes_in: Dict[str, int] = {}
+        self.bytes_out: Dict[str, int] = {}
+        self.compress_seconds = 0.0
+        self.offloaded_chunks = 0
+        self.passed_through = 0
+        self.too_small = 0
+
+    def compressible(self, content_type: str) -> bool:
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        if not media_type or media_type in EXCLUDED_TYPES:
+            return False
+        return any(media_type.startswith(prefix) for prefix in self.media_types)
+
+    def open(self, encoding: str) -> Stream:
+        return self._encoders[encoding](self.levels.get(encoding, DEFAULT_LEVELS[encoding]))
+
+    async def compress(self, function: Callable, *args, size: int) -> bytes:
+        """Run a compression step over size input bytes, in a worker thread when that is large"""
+        started = time.perf_counter()
+        if size >= self.offload_bytes:
+            self.offloaded_chunks += 1
+            output = await asyncio.to_thread(function, *args)
+        else:
+            output = function(*args)
+        self.compress_seconds += time.perf_counter() - started
+        return output
+
+    def record(self, encoding: str, size_in: int, size_out: int):
+        self.responses[encoding] = self.responses.get(encoding, 0) + 1
+        self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + size_in
+        self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + size_out
+
+    def stats(self) -> dict:
+        total_in = sum(self.bytes_in.values())
+        total_out = sum(self.bytes_out.values())
+        return {
+            "encodings": self.encodings,
+            "levels": {encoding: self.levels.get(encoding, DEFAULT_LEVELS[encoding]) for encoding in self.encodings},
+            "min_bytes": self.min_bytes,
+            "responses": self.responses,
+            "bytes_in": total_in,
+            "bytes_out": total_out,
+            "bytes_saved": total_in - total_out,
+            "ratio": round(total_out / total_in, 3) if total_in else None,
+            "compress_seconds": round(self.compress_seconds, 3),
+            "offloaded_chunks": self.offloaded_chunks,
+            "passed_through": self.passed_through,
+            "too_small": self.too_small,
+        }
+
+
+def header_value(headers: list, name: bytes) -> str:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return ""
+
+
+class CompressingSender:
+    """Wraps send for one response, compressing its body once it proves large enough"""
+
+    def __init__(self, send, compressor: ResponseCompressor, encoding: str):
+        self.send = send
+        self.compressor = compressor
+        self.encoding = encoding
+        self.start: Optional[dict] = None
+        self.passthrough = False
+        self.stream: Optional[Stream] = None
+        self.pending = b""
+        self.size_in = 0
+        self.size_out = 0
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            headers = message.get("headers", [])
+            length = header_value(headers, b"content-length")
+            if header_value(headers, b"content-encoding"):
+                self.compressor.passed_through += 1
+                self.passthrough = True
+            elif (message["status"] in (204, 206, 304) or header_value(headers, b"content-range")
+                  or not self.compressor.compressible(header_value(headers, b"content-type"))):
+                self.passthrough = True
+            elif length.isdigit() and int(length) < self.compressor.min_bytes:
+                self.compressor.too_small += 1
+                self.passthrough = True
+            if self.passthrough:
+                await self.send(message)
+            else:
+                # Held back until the body shows whether compression is worth it
+                self.start = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is None:
+            self.pending += body
+            if more_body and len(self.pending) < self.compressor.min_bytes:
+                return
+            if len(self.pending) < self.compressor.min_bytes:
+                self.compressor.too_small += 1
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": self.pending, "more_body": False})
+                return
+            body, self.pending = self.pending, b""
+            await self.begin()
+
+        compress, finish = self.stream
+        self.size_in += len(body)
+        output = await self.compressor.compress(compress, body, size=len(body)) if body else b""
+        if not more_body:
+            # Encoders may hold back a block of input until the stream is finished
+            output += await self.compressor.compress(finish, size=min(self.size_in, self.compressor.offload_bytes))
+            self.compressor.record(self.encoding, self.size_in, self.size_out + len(output))
+        self.size_out += len(output)
+        if output or not more_body:
+            await self.send({"type": "http.response.body", "body": output, "more_body": more_body})
+
+    async def begin(self):
+        self.stream = self.compressor.open(self.encoding)
+        headers = []
+        vary = []
+        for name, value in self.start.get("headers", []):
+            lower = name.lower()
+            if lower == b"content-length":
+                continue
+            if lower == b"vary":
+                vary.append(value)
+                continue
+            if lower == b"etag" and not value.startswith(b"W/"):
+                # The encoded body is a different byte sequence than the strong tag named
+                value = b"W/" + value
+            headers.append((name, value))
+        if not any(b"accept-encoding" in value.lower() for value in vary):
+            vary.append(b"Accept-Encoding")
+        headers.append((b"vary", b", ".join(vary)))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        await self.send({**self.start, "headers": headers})
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses for clients that accept it"""
+
+    def __init__(self, app, compressor: ResponseCompressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate(accept_encoding, self.compressor.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressingSender(send, self.compressor, encoding))
+
+
+def build_compressor() -> Optional[ResponseCompressor]:
+    """Create the compressor from GATEWAY_COMPRESSION_* variables, or None when disabled"""
+    if os.getenv("GATEWAY_COMPRESSION_ENABLED", "true").lower() != "true":
+        return None
+    encodings = [
+        encoding.strip().lower()
+        for encoding in os.getenv("GATEWAY_COMPRESSION_ENCODINGS", DEFAULT_ENCODINGS).split(",")
+        if encoding.strip().lower() in DEFAULT_LEVELS
+    ]
+    return ResponseCompressor(
+        encodings=encodings,
+        levels={
+            encoding: int(os.getenv(f"GATEWAY_COMPRESSION_{encoding.upper()}_LEVEL", str(level)))
+            for encoding, level in DEFAULT_LEVELS.items()
+        },
+        min_bytes=int(os.getenv("GATEWAY_COMPRESSION_MIN_BYTES", "1024")),
+        offload_bytes=int(os.getenv("GATEWAY_COMPRESSION_OFFLOAD_BYTES", str(64 * 1024))),
+        media_types=[
+            media_type.strip().lower()
+            for media_type in os.getenv("GATEWAY_COMPRESSION_TYPES", DEFAULT_TYPES).split(",") if media_type.strip()
+        ],
+    )
@@ -0,0 +1,10 @@
+"""
+Environment configuration helpers for the API Gateway
+"""
+import os
+
+
+def service_env(prefix: str, service_name: str, key: str, default: str) -> str:
+    """Read <PREFIX>_<SERVICE>_<KEY>, falling back to <PREFIX>_<KEY> and then the default"""
+    service_key = f"{prefix}_{service_name.upper().replace('-', '_')}_{key}"
+    return os.getenv(service_key, os.getenv(f"{prefix}_{key}", default))
@@ -0,0 +1,242 @@
+"""
+Hedged requests and budgeted retries for idempotent upstream calls
+A GET or HEAD that has not answered within a high percentile of the service's
+recent latency gets a second attempt (usually on another replica) and the
+first good answer wins. Failed attempts are retried after a jittered backoff.
+Hedges and retries both draw from one gateway-wide budget, a share of recent
+requests, so extra attempts cannot multiply the load on a service in trouble
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger("api-gateway")
+
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+# Responses that say "try again elsewhere" rather than "this request is wrong"
+RETRYABLE_STATUSES = (502, 503, 504)
+
+
+class RetryBudget:
+    """Extra attempts allowed per window: ratio of the requests seen plus a small floor"""
+
+    def __init__(self, ratio: float, min_per_second: float, window: int):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        # [second, requests, extra attempts] per second of the window
+        self._buckets: deque = deque()
+
+    def _current(self) -> list:
+        now = int(time.monotonic())
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+        return self._buckets[-1]
+
+    def record_request(self):
+        self._current()[1] += 1
+
+    def try_spend(self) -> bool:
+        current = self._current()
+        requests = sum(bucket[1] for bucket in self._buckets)
+        spent = sum(bucket[2] for bucket in self._buckets)
+        if spent >= self.min_per_second * self.window + self.ratio * requests:
+            return False
+        current[2] += 1
+        return True
+
+    def stats(self) -> dict:
+        self._current()
+        return {
+            "ratio": self.ratio,
+            "min_per_second": self.min_per_second,
+            "window_seconds": self.window,
+            "requests": sum(bucket[1] for bucket in self._buckets),
+            "spent": sum(bucket[2] for bucket in self._buckets),
+        }
+
+
+class LatencyWindow:
+    """Recent successful attempt latencies of one service"""
+
+    def __init__(self, size: int):
+        self.samples: deque = deque(maxlen=size)
+        self._sorted: Optional[list] = None
+        self._fresh = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self._fresh += 1
+
+    def percentile(self, p: float) -> float:
+        # Re-sorting on every request would cost more than the lookup saves
+        if self._sorted is None or self._fresh >= 50:
+            self._sorted = sorted(self.samples)
+            self._fresh = 0
+        return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * p))]
+
+
+class HedgingPolicy:
+    """Hedge and retry settings, the shared budget and per-service counters"""
+
+    def __init__(self, hedge: bool, percentile: float, min_delay: float, max_delay: float, min_samples: int,
+                 max_retries: int, backoff: float, max_backoff: float, budget: RetryBudget, window_size: int = 500):
+        self.hedge = hedge
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.window_size = window_size
+        self.windows: Dict[str, LatencyWindow] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def count(self, service_name: str, counter: str):
+        counters = self.counters.setdefault(
+            service_name, {"hedges": 0, "hedge_wins": 0, "retries": 0, "budget_exhausted": 0}
+        )
+        counters[counter] += 1
+
+    def hedge_delay(self, service_name: str) -> Optional[float]:
+        """Delay before hedging, or None until the service has enough latency samples"""
+        window = self.windows.get(service_name)
+        if not self.hedge or window is None or len(window.samples) < self.min_samples:
+            return None
+        return min(self.max_delay, max(self.min_delay, window.percentile(self.percentile)))
+
+    def retry_delay(self, retry: int) -> float:
+        # Full jitter: a random wait up to the exponential backoff
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** (retry - 1))))
+
+    def _spend(self, service_name: str) -> bool:
+        if self.budget.try_spend():
+            return True
+        self.count(service_name, "budget_exhausted")
+        return False
+
+    async def _timed(self, service_name: str, attempt: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        started = time.perf_counter()
+        response = await attempt()
+        if response.status_code < 500:
+            self.windows.setdefault(service_name, LatencyWindow(self.window_size)).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    @staticmethod
+    async def _discard(task: asyncio.Future, discard: Callable[[httpx.Response], Awaitable[None]]):
+        """Stop an attempt that lost and release whatever it produced"""
+        if not task.done():
+            task.cancel()
+        try:
+            response = await task
+        except (asyncio.CancelledError, Exception):
+            return
+        await discard(response)
+
+    @staticmethod
+    def _good(task: asyncio.Future) -> bool:
+        return not task.cancelled() and task.exception() is None and task.result().status_code < 500
+
+    async def _hedged(self, service_name: str, attempt, discard) -> httpx.Response:
+        tasks = [asyncio.ensure_future(self._timed(service_name, attempt))]
+        winner = None
+        try:
+            delay = self.hedge_delay(service_name)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._spend(service_name):
+                    self.count(service_name, "hedges")
+                    tasks.append(asyncio.ensure_future(self._timed(service_name, attempt)))
+
+            pending = set(tasks)
+            last = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    last = task
+                    if self._good(task):
+                        winner = task
+                        break
+            if winner is None:
+                # Every attempt failed: surface the last failure
+                winner = last
+            elif winner is not tasks[0]:
+                self.count(service_name, "hedge_wins")
+            return winner.result()
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    await self._discard(task, discard)
+
+    async def call(self, service_name: str, attempt: Callable[[], Awaitable[httpx.Response]],
+                   discard: Callable[[httpx.Response], Awaitable[None]]) -> httpx.Response:
+        """Run an idempotent upstream call with hedging and retries; discard closes unused responses"""
+        self.budget.record_request()
+        retries = 0
+        while True:
+            try:
+                response = await self._hedged(service_name, attempt, discard)
+            except httpx.PoolTimeout:
+                # The gateway itself is out of connections; another attempt would only queue
+                raise
+            except httpx.RequestError as e:
+                if retries >= self.max_retries or not self._spend(service_name):
+                    raise
+                logger.info(f"Retrying {service_name} after {type(e).__name__}")
+            else:
+                if (response.status_code not in RETRYABLE_STATUSES or retries >= self.max_retries
+                        or not self._spend(service_name)):
+                    return response
+                await discard(response)
+                logger.info(f"Retrying {service_name} after HTTP {response.status_code}")
+            retries += 1
+            self.count(service_name, "retries")
+            await asyncio.sleep(self.retry_delay(retries))
+
+    def stats(self) -> dict:
+        return {
+            "hedging": self.hedge,
+            "hedge_percentile": self.percentile,
+            "max_retries": self.max_retries,
+            "budget": self.budget.stats(),
+            "hedge_delay_ms": {
+                name: round(self.hedge_delay(name) * 1000, 2) for name in self.windows
+                if self.hedge_delay(name) is not None
+            },
+            "services": self.counters,
+        }
+
+
+def build_hedging_policy() -> Optional[HedgingPolicy]:
+    """Create the policy from GATEWAY_HEDGE_* and GATEWAY_RETRY_* variables, or None when both are off"""
+    hedge = os.getenv("GATEWAY_HEDGE_ENABLED", "true").lower() == "true"
+    max_retries = int(os.getenv("GATEWAY_RETRY_MAX", "2"))
+    if not hedge and max_retries <= 0:
+        return None
+    return HedgingPolicy(
+        hedge=hedge,
+        percentile=float(os.getenv("GATEWAY_HEDGE_PERCENTILE", "0.95")),
+        min_delay=float(os.getenv("GATEWAY_HEDGE_MIN_DELAY_MS", "10")) / 1000,
+        max_delay=float(os.getenv("GATEWAY_HEDGE_MAX_DELAY_MS", "2000")) / 1000,
+        min_samples=int(os.getenv("GATEWAY_HEDGE_MIN_SAMPLES", "20")),
+        max_retries=max_retries,
+        backoff=float(os.getenv("GATEWAY_RETRY_BACKOFF_MS", "50")) / 1000,
+        max_backoff=float(os.getenv("GATEWAY_RETRY_MAX_BACKOFF_MS", "1000")) / 1000,
+        budget=RetryBudget(
+            ratio=float(os.getenv("GATEWAY_RETRY_BUDGET_RATIO", "0.1")),
+            min_per_second=float(os.getenv("GATEWAY_RETRY_BUDGET_MIN_PER_SECOND", "1")),
+            window=int(os.getenv("GATEWAY_RETRY_BUDGET_WINDOW", "10")),
+        ),
+    )
@@ -0,0 +1,216 @@
+"""
+Gateway-side JWT verification for the API Gateway
+Bearer tokens are checked locally against signing keys fetched from the auth
+service (or configured directly) and verified claims are cached by token hash,
+so proxied requests no longer need a /verify-token round trip
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("api-gateway")
+
+HMAC_ALGORITHMS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+# Identity headers the gateway sets for upstreams; never accepted from clients
+IDENTITY_HEADERS = ("x-user-id", "x-user-email", "x-user-role", "x-auth-verified")
+
+
+class TokenError(Exception):
+    """The bearer token is malformed, badly signed or expired"""
+
+
+class KeysUnavailable(TokenError):
+    """No signing keys could be loaded, so the token cannot be judged locally"""
+
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def numeric_date(claims: dict, name: str) -> Optional[float]:
+    """A time claim (RFC 7519 NumericDate) as seconds, None when absent"""
+    if name not in claims:
+        return None
+    value = claims[name]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise TokenError("Malformed token")
+    return float(value)
+
+
+class SigningKeys:
+    """Signing keys by key id, refreshed from the auth service on a TTL"""
+
+    def __init__(self, fetch: Callable[[], Awaitable[List[dict]]], ttl: float,
+                 static_secret: Optional[str] = None, static_algorithm: str = "HS256"):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._keys: Dict[str, dict] = {}
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+        if static_secret:
+            self._add({"kid": "static", "alg": static_algorithm, "k": static_secret.encode("utf-8")})
+            self._fetched_at = float("inf")
+
+    def _add(self, key: dict):
+        self._keys[key.get("kid") or "default"] = key
+
+    async def refresh(self, force: bool = False):
+        """Reload keys when stale; forced reloads are limited to one per second"""
+        now = time.monotonic()
+        if self._fetched_at == float("inf"):
+            return
+        if not force and now - self._fetched_at < self.ttl:
+            return
+        if now - self._last_attempt < 1.0:
+            return
+        self._last_attempt = now
+        try:
+            keys = await self._fetch()
+        except Exception as e:
+            logger.warning(f"Could not fetch JWT signing keys from auth service: {e}")
+            return
+        self._keys = {}
+        for key in keys:
+            self._add({"kid": key.get("kid"), "alg": key.get("alg", "HS256"), "k": b64url_decode(key["k"])})
+        self._fetched_at = now
+
+    def get(self, kid: Optional[str]) -> Optional[dict]:
+        if kid:
+            return self._keys.get(kid)
+        # Tokens without a key id can only be matched when there is a single key
+        return next(iter(self._keys.values())) if len(self._keys) == 1 else None
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._keys)
+
+
+class TokenVerifier:
+    """Verifies HMAC-signed JWTs and caches their claims in a short-TTL LRU"""
+
+    def __init__(self, keys: SigningKeys, cache_ttl: float = 30.0, cache_size: int = 10_000, leeway: float = 5.0):
+        self.keys = keys
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.leeway = leeway
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.cache_hits = 0
+        self.verified = 0
+        self.rejected = 0
+
+    async def verify(self, token: str) -> dict:
+        """Claims of a valid token; raises TokenError otherwise"""
+        digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        now = time.time()
+        cached = self._cache.get(digest)
+        if cached is not None:
+            claims, expires_at = cached
+            if now < expires_at:
+                self._cache.move_to_end(digest)
+                self.cache_hits += 1
+                return claims
+            del self._cache[digest]
+
+        try:
+            claims = await self._verify_signature(token)
+            self._check_times(claims, now)
+        except TokenError:
+            self.rejected += 1
+            raise
+
+        self.verified += 1
+        expires_at = now + self.cache_ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, numeric_date(claims, "exp"))
+        self._cache[digest] = (claims, expires_at)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return claims
+
+    async def _verify_signature(self, token: str) -> dict:
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(b64url_decode(header_b64))
+            signature = b64url_decode(signature_b64)
+            signing_input = f"{header_b64}.{payload_b64}".encode("ascii")
+        except (ValueError, TypeError):
+            raise TokenError("Malformed token")
+        if not isinstance(header, dict) or not isinstance(header.get("kid", ""), str):
+            raise TokenError("Malformed token")
+
+        algorithm = header.get("alg")
+        if not isinstance(algorithm, str) or algorithm not in HMAC_ALGORITHMS:
+            raise TokenError(f"Unsupported token algorithm '{algorithm}'")
+
+        await self.keys.refresh()
+        if not self.keys.loaded:
+            raise KeysUnavailable("No signing keys available")
+        key = self.keys.get(header.get("kid"))
+        if key is None:
+            # Unknown key id: the auth service may have rotated keys
+            await self.keys.refresh(force=True)
+            key = self.keys.get(header.get("kid"))
+        if key is None or key["alg"] != algorithm:
+            raise TokenError("Unknown signing key")
+
+        expected = hmac.new(key["k"], signing_input, HMAC_ALGORITHMS[algorithm]).digest()
+        if not hmac.compare_digest(expected, signature):
+            raise TokenError("Invalid token signature")
+
+        try:
+            claims = json.loads(b64url_decode(payload_b64))
+        except ValueError:
+            raise TokenError("Malformed token")
+        if not isinstance(claims, dict):
+            raise TokenError("Malformed token")
+        return claims
+
+    def _check_times(self, claims: dict, now: float):
+        expires = numeric_date(claims, "exp")
+        if expires is not None and now > expires + self.leeway:
+            raise TokenError("Token expired")
+        not_before = numeric_date(claims, "nbf")
+        if not_before is not None and now + self.leeway < not_before:
+            raise TokenError("Token not yet valid")
+
+    def stats(self) -> dict:
+        lookups = self.cache_hits + self.verified
+        return {
+            "keys_loaded": self.keys.loaded,
+            "cached_tokens": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_hit_ratio": round(self.cache_hits / lookups, 3) if lookups else 0.0,
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
+
+
+def identity_headers(claims: dict) -> Dict[str, str]:
+    """Trusted identity headers passed to upstream services"""
+    headers = {"x-auth-verified": "gateway"}
+    user_id = claims.get("sub") or claims.get("user_id")
+    if user_id is not None:
+        headers["x-user-id"] = str(user_id)
+    if claims.get("email"):
+        headers["x-user-email"] = str(claims["email"])
+    if claims.get("role"):
+        headers["x-user-role"] = str(claims["role"])
+    return headers
+
+
+def bearer_token(authorization: str) -> Optional[str]:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
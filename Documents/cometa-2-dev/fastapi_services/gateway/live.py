@@ -0,0 +1,402 @@
+"""
+Live connections for the API Gateway: Server-Sent Events and WebSockets
+SSE streams on routes marked "live" are relayed without read timeouts. In
+"direct" mode each client has its own upstream stream and reads pace the
+upstream (backpressure). In fan-out modes one upstream subscription is parsed
+into events and copied to every subscriber; each subscriber has a bounded
+buffer and is disconnected when it falls behind, so one slow client cannot
+hold up the feed or grow gateway memory. Recent events are kept for replay
+to clients reconnecting with Last-Event-ID. WebSockets are relayed message by
+message in both directions with an idle timeout and a message size limit
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple, Union
+
+import httpx
+
+logger = logging.getLogger("api-gateway")
+
+try:
+    from websockets.asyncio.client import connect as websocket_connect
+    from websockets.exceptions import ConnectionClosed
+except ImportError:  # optional dependency; WebSocket routes are refused without it
+    websocket_connect = None
+    ConnectionClosed = None
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# A comment line: ignored by EventSource, keeps proxies and idle clients from dropping the connection
+HEARTBEAT = b": ping\n\n"
+EVENT_END = re.compile(rb"\r\n\r\n|\n\n|\r\r")
+
+# Handshake headers belong to the client connection, not the upstream one
+WEBSOCKET_HANDSHAKE_HEADERS = {
+    "host", "connection", "upgrade", "content-length", "sec-websocket-key", "sec-websocket-version",
+    "sec-websocket-extensions", "sec-websocket-protocol", "sec-websocket-accept",
+}
+
+
+def wants_event_stream(accept: str) -> bool:
+    return SSE_MEDIA_TYPE in accept.lower()
+
+
+def is_event_stream(response: httpx.Response) -> bool:
+    return response.status_code == 200 and response.headers.get("content-type", "").startswith(SSE_MEDIA_TYPE)
+
+
+def websocket_close_code(code: Optional[int]) -> int:
+    """A close code that may be sent in a close frame (1005 and 1006 are reserved for reporting)"""
+    if code is None or code in (1005, 1006) or not 1000 <= code < 5000:
+        return 1011 if code == 1006 else 1000
+    return code
+
+
+class EventTooLarge(Exception):
+    """An upstream event exceeded the configured size"""
+
+
+class EventParser:
+    """Splits an SSE byte stream into complete events"""
+
+    def __init__(self, max_event_bytes: int):
+        self.max_event_bytes = max_event_bytes
+        self._buffer = b""
+
+    def feed(self, data: bytes) -> list:
+        self._buffer += data
+        events = []
+        while True:
+            match = EVENT_END.search(self._buffer)
+            if match is None:
+                break
+            events.append(self._buffer[:match.end()])
+            self._buffer = self._buffer[match.end():]
+        if len(self._buffer) > self.max_event_bytes:
+            raise EventTooLarge(f"event exceeds {self.max_event_bytes} bytes")
+        return events
+
+
+def event_id(event: bytes) -> Optional[bytes]:
+    for line in event.splitlines():
+        if line.startswith(b"id:"):
+            return line[3:].strip()
+    return None
+
+
+class Subscriber:
+    """One client of a fanned-out stream, with a bounded buffer of pending events"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.pending: Deque[bytes] = deque()
+        self.pending_bytes = 0
+        self.closed: Optional[str] = None
+        self._ready = asyncio.Event()
+
+    def offer(self, event: bytes) -> bool:
+        """Queue an event; a subscriber that lets too much pile up is cut off"""
+        if self.closed:
+            return False
+        if self.pending_bytes + len(event) > self.max_bytes:
+            self.close("slow consumer")
+            return False
+        self.pending.append(event)
+        self.pending_bytes += len(event)
+        self._ready.set()
+        return True
+
+    def close(self, reason: str):
+        if self.closed is None:
+            self.closed = reason
+        self._ready.set()
+
+    async def next(self, timeout: float) -> Optional[bytes]:
+        """The next event, or None when nothing arrived within timeout"""
+        if not self.pending and self.closed is None:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.pending:
+            event = self.pending.popleft()
+            self.pending_bytes -= len(event)
+            return event
+        return None
+
+
+class Subscription:
+    """One upstream event stream shared by its subscribers"""
+
+    def __init__(self, hub: "LiveHub", key: tuple, service_name: str, response: httpx.Response,
+                 close: Callable[[str, httpx.Response], Awaitable[None]]):
+        self.hub = hub
+        self.key = key
+        self.service_name = service_name
+        self.response = response
+        self.subscribers: Set[Subscriber] = set()
+        self.replay: Deque[Tuple[Optional[bytes], bytes]] = deque(maxlen=hub.replay_events)
+        self.events = 0
+        self._task = asyncio.create_task(self._pump(close))
+
+    def join(self, last_event_id: Optional[str]) -> Subscriber:
+        subscriber = Subscriber(self.hub.buffer_bytes)
+        if last_event_id:
+            wanted = last_event_id.encode("utf-8")
+            ids = [identifier for identifier, _ in self.replay]
+            if wanted in ids:
+                for _, event in list(self.replay)[ids.index(wanted) + 1:]:
+                    subscriber.offer(event)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def leave(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            self.hub.remove(self)
+            self._task.cancel()
+
+    async def _pump(self, close):
+        parser = EventParser(self.hub.max_event_bytes)
+        reason = "upstream closed"
+        chunks = self.response.aiter_raw().__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.hub.idle_timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.hub.idle_closed += 1
+                    reason = "idle timeout"
+                    break
+                for event in parser.feed(chunk):
+                    self.events += 1
+                    self.hub.events += 1
+                    self.replay.append((event_id(event), event))
+                    for subscriber in list(self.subscribers):
+                        if not subscriber.offer(event):
+                            self.hub.dropped += 1
+                            self.subscribers.discard(subscriber)
+        except asyncio.CancelledError:
+            reason = "no subscribers"
+        except (httpx.HTTPError, EventTooLarge) as e:
+            reason = f"upstream error: {type(e).__name__}"
+            logger.warning(f"Live stream from {self.service_name} ended: {e}")
+        finally:
+            self.hub.remove(self)
+            for subscriber in self.subscribers:
+                subscriber.close(reason)
+            await close(self.service_name, self.response)
+
+
+class LiveHub:
+    """Live connection settings, fanned-out subscriptions and counters"""
+
+    def __init__(self, heartbeat: float, idle_timeout: float, buffer_bytes: int, max_event_bytes: int,
+                 max_connections: int, replay_events: int, open_timeout: float = 10.0):
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.buffer_bytes = buffer_bytes
+        self.max_event_bytes = max_event_bytes
+        self.max_connections = max_connections
+        self.replay_events = replay_events
+        self.open_timeout = open_timeout
+        self.subscriptions: Dict[tuple, Subscription] = {}
+        self._opening: Dict[tuple, asyncio.Future] = {}
+        self.connections = {"sse": 0, "websocket": 0}
+        self.events = 0
+        self.dropped = 0
+        self.idle_closed = 0
+        self.oversize_closed = 0
+
+    def full(self) -> bool:
+        return sum(self.connections.values()) >= self.max_connections
+
+    def remove(self, subscription: Subscription):
+        if self.subscriptions.get(subscription.key) is subscription:
+            del self.subscriptions[subscription.key]
+
+    async def subscription(self, key: tuple, service_name: str, open_stream: Callable[[], Awaitable[httpx.Response]],
+                           close: Callable[[str, httpx.Response], Awaitable[None]]
+                           ) -> Union[Subscription, httpx.Response]:
+        """The subscription for key, opening the upstream stream once for clients arriving together.
+        An upstream answer that is not an event stream is returned for the caller to relay"""
+        while True:
+            subscription = self.subscriptions.get(key)
+            if subscription is not None:
+                return subscription
+            opening = self._opening.get(key)
+            if opening is None:
+                break
+            # Wait for the client opening it; if that fails, the next one tries
+            await asyncio.wait([opening])
+
+        opening = self._opening[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await open_stream()
+            if not is_event_stream(response):
+                return response
+            subscription = self.subscriptions[key] = Subscription(self, key, service_name, response, close)
+            return subscription
+        finally:
+            del self._opening[key]
+            opening.set_result(None)
+
+    async def fanned_out(self, subscription: Subscription, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """Body of one client's response on a shared subscription"""
+        self.connections["sse"] += 1
+        try:
+            while True:
+                event = await subscriber.next(self.heartbeat)
+                if event is not None:
+                    yield event
+                elif subscriber.closed is not None:
+                    return
+                else:
+                    yield HEARTBEAT
+        finally:
+            self.connections["sse"] -= 1
+            subscription.leave(subscriber)
+
+    async def relayed(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Body of a direct SSE response: one upstream chunk at a time, with heartbeats between events"""
+        self.connections["sse"] += 1
+        iterator = chunks.__aiter__()
+        pending = None
+        boundary = True
+        last_chunk = time.monotonic()
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                done, _ = await asyncio.wait({pending}, timeout=self.heartbeat)
+                if not done:
+                    if time.monotonic() - last_chunk >= self.idle_timeout:
+                        self.idle_closed += 1
+                        return
+                    # Never split an event in two
+                    if boundary:
+                        yield HEARTBEAT
+                    continue
+                try:
+                    chunk = pending.result()
+                except StopAsyncIteration:
+                    return
+                except httpx.ReadTimeout:
+                    # The upstream read timeout is set to the idle timeout as well
+                    self.idle_closed += 1
+                    return
+                except httpx.HTTPError as e:
+                    logger.warning(f"Live stream relay ended: {e}")
+                    return
+                pending = None
+                last_chunk = time.monotonic()
+                boundary = chunk.endswith((b"\n\n", b"\r\r", b"\r\n\r\n"))
+                yield chunk
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+            self.connections["sse"] -= 1
+
+    async def relay_websocket(self, client, upstream) -> None:
+        """Relay messages between a client WebSocket and its upstream until either side closes or goes idle"""
+        self.connections["websocket"] += 1
+        last_activity = time.monotonic()
+
+        async def to_client():
+            nonlocal last_activity
+            try:
+                async for message in upstream:
+                    last_activity = time.monotonic()
+                    if isinstance(message, str):
+                        await client.send_text(message)
+                    else:
+                        await client.send_bytes(message)
+            except ConnectionClosed:
+                pass
+            return "upstream", websocket_close_code(upstream.close_code), upstream.close_reason or ""
+
+        async def to_upstream():
+            nonlocal last_activity
+            while True:
+                message = await client.receive()
+                if message["type"] == "websocket.disconnect":
+                    return "client", websocket_close_code(message.get("code")), ""
+                data = message.get("text")
+                if data is None:
+                    data = message.get("bytes") or b""
+                if len(data) > self.max_event_bytes:
+                    self.oversize_closed += 1
+                    return "limit", 1009, "Message too big"
+                last_activity = time.monotonic()
+                # Waits until the upstream connection can take more
+                await upstream.send(data)
+
+        async def idle():
+            while True:
+                remaining = last_activity + self.idle_timeout - time.monotonic()
+                if remaining <= 0:
+                    self.idle_closed += 1
+                    return "idle", 1001, "Idle timeout"
+                await asyncio.sleep(remaining)
+
+        tasks = [asyncio.ensure_future(task()) for task in (to_client, to_upstream, idle)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finished = done.pop()
+            try:
+                side, code, reason = finished.result()
+            except Exception as e:
+                logger.warning(f"WebSocket relay failed: {e}")
+                side, code, reason = "error", 1011, ""
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connections["websocket"] -= 1
+
+        if side != "upstream":
+            await upstream.close(code=1000 if side == "client" else 1001, reason=reason)
+        if side != "client":
+            try:
+                await client.close(code=code, reason=reason)
+            except RuntimeError:
+                # The client went away in the meantime
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "connections": dict(self.connections),
+            "max_connections": self.max_connections,
+            "subscriptions": len(self.subscriptions),
+            "subscribers": sum(len(subscription.subscribers) for subscription in self.subscriptions.values()),
+            "events": self.events,
+            "dropped_slow_consumers": self.dropped,
+            "idle_closed": self.idle_closed,
+            "oversize_closed": self.oversize_closed,
+            "heartbeat_seconds": self.heartbeat,
+            "idle_timeout_seconds": self.idle_timeout,
+            "buffer_bytes": self.buffer_bytes,
+            "websockets": websocket_connect is not None,
+        }
+
+
+def build_live_hub() -> Optional[LiveHub]:
+    """Create the hub from GATEWAY_LIVE_* variables, or None when disabled"""
+    if os.getenv("GATEWAY_LIVE_ENABLED", "true").lower() != "true":
+        return None
+    if websocket_connect is None:
+        logger.info("WebSocket proxying unavailable: optional package websockets not installed")
+    return LiveHub(
+        heartbeat=float(os.getenv("GATEWAY_LIVE_HEARTBEAT_SECONDS", "15")),
+        idle_timeout=float(os.getenv("GATEWAY_LIVE_IDLE_TIMEOUT_SECONDS", "120")),
+        buffer_bytes=int(os.getenv("GATEWAY_LIVE_BUFFER_BYTES", str(256 * 1024))),
+        max_event_bytes=int(os.getenv("GATEWAY_LIVE_MAX_EVENT_BYTES", str(64 * 1024))),
+        max_connections=int(os.getenv("GATEWAY_LIVE_MAX_CONNECTIONS", "2000")),
+        replay_events=int(os.getenv("GATEWAY_LIVE_REPLAY_EVENTS", "100")),
+        open_timeout=float(os.getenv("GATEWAY_LIVE_OPEN_TIMEOUT_SECONDS", "10")),
+    )
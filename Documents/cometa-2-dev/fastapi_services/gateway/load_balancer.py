@@ -0,0 +1,130 @@
+"""
+Replica load balancing for the API Gateway
+Spreads calls for one service across its replicas with round-robin,
+least-outstanding-requests or power-of-two-choices, skipping replicas that
+failed health checks or were ejected after consecutive errors
+"""
+import itertools
+import logging
+import random
+import time
+from typing import Dict, List
+
+from config import service_env
+
+logger = logging.getLogger("api-gateway")
+
+ROUND_ROBIN = "round_robin"
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "p2c"
+STRATEGIES = (ROUND_ROBIN, LEAST_OUTSTANDING, POWER_OF_TWO)
+
+
+def _env(service_name: str, key: str, default: str) -> str:
+    return service_env("GATEWAY_LB", service_name, key, default)
+
+
+class Replica:
+    """One upstream instance of a service"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "ejected": time.monotonic() < self.ejected_until,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class ReplicaSet:
+    """Balances calls for one service across its replicas"""
+
+    def __init__(self, service_name: str, urls: List[str], strategy: str = ROUND_ROBIN,
+                 eject_after_failures: int = 3, eject_seconds: float = 30.0):
+        if strategy not in STRATEGIES:
+            logger.warning(f"Unknown load balancing strategy '{strategy}' for {service_name}, using {ROUND_ROBIN}")
+            strategy = ROUND_ROBIN
+        self.service_name = service_name
+        self.replicas = [Replica(url) for url in urls]
+        self.strategy = strategy
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self._cycle = itertools.count()
+
+    def pick(self) -> Replica:
+        """Choose a replica for the next call"""
+        now = time.monotonic()
+        candidates = [replica for replica in self.replicas if replica.available(now)]
+        if not candidates:
+            # Every replica looks down: keep trying all of them rather than failing outright
+            candidates = self.replicas
+
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == LEAST_OUTSTANDING:
+            fewest = min(replica.outstanding for replica in candidates)
+            return random.choice([replica for replica in candidates if replica.outstanding == fewest])
+        if self.strategy == POWER_OF_TWO:
+            first, second = random.sample(candidates, 2)
+            return first if first.outstanding <= second.outstanding else second
+        return candidates[next(self._cycle) % len(candidates)]
+
+    def acquire(self, replica: Replica):
+        replica.outstanding += 1
+        replica.requests += 1
+
+    def release(self, replica: Replica, failed: bool = False):
+        """Finish a call; consecutive failures eject the replica for a while"""
+        replica.outstanding -= 1
+        if not failed:
+            replica.consecutive_failures = 0
+            return
+        replica.failures += 1
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.eject_after_failures:
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+            replica.consecutive_failures = 0
+            logger.warning(f"Ejected replica {replica.url} of {self.service_name} for {self.eject_seconds}s")
+
+    def mark_health(self, url: str, healthy: bool):
+        """Apply an active health check result to a replica"""
+        for replica in self.replicas:
+            if replica.url == url:
+                replica.healthy = healthy
+
+    @property
+    def urls(self) -> List[str]:
+        return [replica.url for replica in self.replicas]
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "replicas": {replica.url: replica.stats() for replica in self.replicas},
+        }
+
+
+def build_replica_sets(services: Dict[str, List[str]]) -> Dict[str, ReplicaSet]:
+    """Create one replica set per service, configured from GATEWAY_LB_* variables"""
+    return {
+        name: ReplicaSet(
+            name,
+            urls,
+            strategy=_env(name, "STRATEGY", ROUND_ROBIN).lower(),
+            eject_after_failures=int(_env(name, "EJECT_AFTER_FAILURES", "3")),
+            eject_seconds=float(_env(name, "EJECT_SECONDS", "30")),
+        )
+        for name, urls in services.items()
+    }
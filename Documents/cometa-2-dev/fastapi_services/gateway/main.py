@@ -2,17 +2,49 @@
 API Gateway for COMETA Microservices
 Central entry point for all microservice communication with routing, authentication, and rate limiting
 """
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
+from starlette.datastructures import Headers
 import httpx
 import os
 import sys
 import logging
-from typing import Optional
+import math
+from typing import Callable, Optional, Tuple
+from urllib.parse import urlencode
 import asyncio
+import time
+import weakref
 from datetime import datetime
 
+# Add shared modules to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from pools import build_service_pools
+from circuit_breaker import build_breakers
+from load_balancer import build_replica_sets
+from cache import build_response_cache, request_key, shareable
+from single_flight import SingleFlight, UpstreamResult
+from rate_limit import RateLimitMiddleware, build_rate_limiter
+from jwt_auth import (
+    IDENTITY_HEADERS, KeysUnavailable, SigningKeys, TokenError, TokenVerifier, bearer_token, identity_headers
+)
+from health_monitor import HealthMonitor
+from metrics import GatewayMetrics, error_class, snapshot_family
+from fast_json import FastJSONResponse, loads
+from tracing import TracingMiddleware, build_tracer, current_trace, span
+from batch import BatchRequest, build_batch_executor
+from hedging import IDEMPOTENT_METHODS, build_hedging_policy
+from compression import CompressionMiddleware, build_compressor
+from admission import Overloaded, build_admission_controller, classify
+from live import (
+    SSE_MEDIA_TYPE, WEBSOCKET_HANDSHAKE_HEADERS, build_live_hub, is_event_stream, wants_event_stream, websocket_connect
+)
+from routing import HTTP_METHODS, Route, RouteConfigError, RouteTable, build_route_config
+from worker_state import snapshot_board, worker_broadcast, worker_id
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("api-gateway")
@@ -23,9 +55,18 @@ app = FastAPI(
     description="Central API Gateway for COMETA microservices",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # orjson encoding for the gateway's own JSON endpoints
+    default_response_class=FastJSONResponse
 )
 
+# Token-bucket rate limiting per client and per route; registered before CORS so
+# that 429 responses still carry CORS headers. Clients are told apart by verified
+# token (verified_caller below) or by address, never by unverified headers
+rate_limiter = build_rate_limiter()
+if rate_limiter:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # CORS middleware - Production-ready configuration
 allowed_origins = [
     "http://localhost:3000",  # Next.js development
@@ -43,46 +84,208 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization", "X-Token"],
+    expose_headers=["Retry-After", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "X-Request-ID"],
 )
 
-# Service registry with Docker service names and localhost fallback
-import os
+# zstd/brotli/gzip negotiated per request for large compressible responses; bodies
+# the upstream already encoded are relayed as they are
+compressor = build_compressor()
+if compressor:
+    app.add_middleware(CompressionMiddleware, compressor=compressor)
+
+# Request IDs, W3C trace context and Server-Timing; outermost so spans cover every layer
+tracer = build_tracer("api-gateway", "gw")
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
+# Services and routes from the declarative route table (gateway/routes.json);
+# DOCKER_MODE picks the Docker service names over the localhost URLs
 DOCKER_MODE = os.getenv('DOCKER_MODE', 'false').lower() == 'true'
+route_config = build_route_config(DOCKER_MODE)
+SERVICES = dict(route_config.table.services)
 
-if DOCKER_MODE:
-    # Docker container service names
-    SERVICES = {
-        "auth": "http://auth-service:8001",
-        "project": "http://project-service:8002",
-        "team": "http://team-service:8004",
-        "work": "http://work-service:8003",
-        "material": "http://material-service:8005",
-        "equipment": "http://equipment-service:8006",
-        "activity": "http://activity-service:8011"
-    }
-else:
-    # Local development service URLs
-    SERVICES = {
-        "auth": "http://localhost:8001",
-        "project": "http://localhost:8002",
-        "team": "http://localhost:8004",
-        "work": "http://localhost:8003",
-        "material": "http://localhost:8005",
-        "equipment": "http://localhost:8006",
-        "activity": "http://localhost:8007"
-    }
+# Load balancing across the replicas of each service
+replica_sets = build_replica_sets(SERVICES)
+
+# HTTP clients for service communication, one connection pool per service
+pools = build_service_pools(SERVICES)
 
-# HTTP client for service communication
+# Circuit breakers fail fast for services that are erroring or too slow
+breakers = build_breakers(SERVICES)
+
+# Response cache for idempotent GET routes, with TTLs from the route table
+response_cache = build_response_cache()
+response_cache.set_route_ttls(route_config.table.cache_ttls())
+
+# Under the prefork launcher a write handled by one worker also drops the other workers' cached copies
+cache_broadcast = worker_broadcast("gateway-cache", lambda message: response_cache.invalidate(message["path"]))
+
+# Hedged and retried idempotent calls, within a gateway-wide retry budget
+hedging = build_hedging_policy()
+
+# Adaptive per-service concurrency limits; requests over the limit queue by
+# priority (logins, then writes, then reads) and are shed with 503 when the wait is too long
+admission = build_admission_controller()
+
+# Server-Sent Events and WebSocket relaying for routes marked "live", with fan-out
+# of one upstream event stream to many clients
+live_hub = build_live_hub()
+
+# Concurrent identical GETs share one upstream call; the body is buffered for
+# the callers that joined only up to GATEWAY_SINGLE_FLIGHT_MAX_BYTES
+SINGLE_FLIGHT_ENABLED = os.getenv("GATEWAY_SINGLE_FLIGHT", "true").lower() == "true"
+single_flight = SingleFlight(int(os.getenv("GATEWAY_SINGLE_FLIGHT_MAX_BYTES", str(2 * 1024 * 1024))))
+
+# Request counts, latency histograms and error classes for /metrics and /api/stats,
+# merged across workers when running under the prefork launcher
+metrics = GatewayMetrics(snapshot_board("gateway-metrics"))
+
+# Shared client for gateway housekeeping such as health checks
 client = httpx.AsyncClient(timeout=30.0)
 
+# Local JWT verification: "off", "optional" (verify when a bearer token is sent)
+# or "required" (every route except the public ones needs a valid token); routes
+# may set their own policy with "auth" in the route table
+JWT_MODE = os.getenv("GATEWAY_JWT_MODE", "optional").lower()
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+async def fetch_signing_keys():
+    """Load token signing keys from the auth service's internal endpoint"""
+    replica = replica_sets["auth"].pick()
+    response = await client.get(
+        f"{replica.url}/internal/signing-keys",
+        headers={"X-Internal-Token": INTERNAL_API_TOKEN},
+        timeout=5.0
+    )
+    response.raise_for_status()
+    return response.json()["keys"]
+
+token_verifier = TokenVerifier(
+    SigningKeys(
+        fetch_signing_keys,
+        ttl=float(os.getenv("GATEWAY_JWT_KEYS_TTL", "300")),
+        static_secret=os.getenv("GATEWAY_JWT_SECRET"),
+        static_algorithm=os.getenv("GATEWAY_JWT_ALGORITHM", "HS256")
+    ),
+    cache_ttl=float(os.getenv("GATEWAY_JWT_CACHE_TTL", "30")),
+    cache_size=int(os.getenv("GATEWAY_JWT_CACHE_SIZE", "10000"))
+)
+
+async def verified_caller(scope) -> Optional[str]:
+    """User id behind a request whose bearer token verifies, the rate limiter's client identity"""
+    if JWT_MODE == "off":
+        return None
+    token = bearer_token(Headers(scope=scope).get("authorization", ""))
+    if token is None:
+        return None
+    try:
+        claims = await token_verifier.verify(token)
+    except TokenError:
+        return None
+    user_id = claims.get("sub") or claims.get("user_id")
+    return str(user_id) if user_id is not None else None
+
+if rate_limiter:
+    rate_limiter.identify = verified_caller
+
+# Proxy mode: "stream" relays upstream bytes as they arrive without parsing,
+# "buffered" reads and re-encodes the whole JSON body (legacy behaviour)
+PROXY_MODE = os.getenv("GATEWAY_PROXY_MODE", "stream").lower()
+
+# Hop-by-hop headers must not be relayed between connections (RFC 7230 6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# Background health checks of every replica; health endpoints serve the cached results
+health_monitor = HealthMonitor()
+
+# Services that must have a healthy replica for the gateway to report ready
+READY_SERVICES = [
+    name.strip() for name in os.getenv("GATEWAY_READY_SERVICES", "auth").split(",") if name.strip()
+]
+
+def replica_check(service_name: str, replica_url: str):
+    """Health check for one replica that also feeds its result to load balancing"""
+    async def check():
+        healthy = False
+        try:
+            response = await client.get(f"{replica_url}/health", timeout=health_monitor.timeout)
+            healthy = response.status_code == 200
+            return healthy, {"status_code": response.status_code}
+        finally:
+            # Failed checks take the replica out of load balancing until it recovers
+            replica_sets[service_name].mark_health(replica_url, healthy)
+    return check
+
+for service_name, replica_urls in SERVICES.items():
+    for replica_url in replica_urls:
+        health_monitor.register(
+            f"{service_name}@{replica_url}", replica_check(service_name, replica_url), critical=False
+        )
+
+def apply_route_table(table: RouteTable):
+    """Bring the per-service components in line with a reloaded route table"""
+    for service_name in [name for name in SERVICES if name not in table.services]:
+        # Pools and breakers stay for requests still in flight; the service just stops being routed to
+        for replica_url in SERVICES.pop(service_name):
+            health_monitor.unregister(f"{service_name}@{replica_url}")
+
+    for service_name, replica_urls in table.services.items():
+        previous = SERVICES.get(service_name, [])
+        if replica_urls == previous:
+            continue
+        SERVICES[service_name] = replica_urls
+        replica_sets.update(build_replica_sets({service_name: replica_urls}))
+        if service_name not in pools:
+            pools.update(build_service_pools([service_name]))
+        if service_name not in breakers:
+            breakers.update(build_breakers([service_name]))
+        for replica_url in previous:
+            if replica_url not in replica_urls:
+                health_monitor.unregister(f"{service_name}@{replica_url}")
+        for replica_url in replica_urls:
+            if replica_url not in previous:
+                health_monitor.register(
+                    f"{service_name}@{replica_url}", replica_check(service_name, replica_url), critical=False
+                )
+        logger.info(f"Service '{service_name}' now routed to {', '.join(replica_urls)}")
+
+    response_cache.set_route_ttls(table.cache_ttls())
+
+route_config.add_listener(apply_route_table)
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting API Gateway...")
+    if JWT_MODE != "off":
+        await token_verifier.keys.refresh()
+    health_monitor.start()
+    route_config.start()
+    metrics.start_publishing()
+    if cache_broadcast:
+        cache_broadcast.start()
     logger.info("API Gateway started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await metrics.stop_publishing()
+    if cache_broadcast:
+        cache_broadcast.close()
+    await health_monitor.stop()
+    await route_config.stop()
+    await tracer.aclose()
     await client.aclose()
+    await asyncio.gather(*(pool.aclose() for pool in pools.values()))
+    if rate_limiter:
+        await rate_limiter.backend.aclose()
 
 @app.get("/health")
 async def health_check():
@@ -93,29 +296,58 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """Gateway liveness probe"""
+    return {"status": "alive", "service": "api-gateway"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Gateway readiness probe: every required service has a healthy replica"""
+    not_ready = [
+        name for name in READY_SERVICES
+        if not any(health_monitor.is_healthy(f"{name}@{url}") for url in SERVICES.get(name, []))
+    ]
+    ready = health_monitor.rounds > 0 and not not_ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "service": "api-gateway",
+            "required_services": READY_SERVICES,
+            "unavailable": not_ready
+        }
+    )
+
 @app.get("/health/services")
-async def check_services_health():
-    """Check health of all registered services"""
+async def check_services_health(history: bool = False):
+    """Health of all registered services from the background monitor"""
     service_status = {}
+    checks = health_monitor.snapshot(include_history=history)
 
-    async def check_service(service_name: str, service_url: str):
-        try:
-            response = await client.get(f"{service_url}/health", timeout=5.0)
-            service_status[service_name] = {
-                "status": "healthy" if response.status_code == 200 else "unhealthy",
-                "url": service_url,
-                "response_time": response.elapsed.total_seconds() if hasattr(response, 'elapsed') else None
-            }
-        except Exception as e:
-            service_status[service_name] = {
-                "status": "unreachable",
-                "url": service_url,
-                "error": str(e)
-            }
-
-    # Check all services concurrently
-    tasks = [check_service(name, url) for name, url in SERVICES.items()]
-    await asyncio.gather(*tasks)
+    for service_name, urls in SERVICES.items():
+        replicas = {}
+        for url in urls:
+            replica = checks[f"{service_name}@{url}"]
+            if "error" in replica:
+                replica["status"] = "unreachable"
+            replicas[url] = replica
+        statuses = [replica["status"] for replica in replicas.values()]
+        if "healthy" in statuses:
+            overall = "healthy"
+        elif all(status == "unknown" for status in statuses):
+            overall = "unknown"
+        elif all(status == "unreachable" for status in statuses):
+            overall = "unreachable"
+        else:
+            overall = "unhealthy"
+        service_status[service_name] = {
+            "status": overall,
+            "urls": urls,
+            "healthy_replicas": statuses.count("healthy"),
+            "replicas": replicas,
+            "circuit": breakers[service_name].state
+        }
 
     healthy_services = sum(1 for s in service_status.values() if s["status"] == "healthy")
     total_services = len(service_status)
@@ -128,22 +360,288 @@ async def check_services_health():
             "total": total_services,
             "health_percentage": (healthy_services / total_services * 100) if total_services > 0 else 0
         },
+        "monitor": health_monitor.summary(),
         "timestamp": datetime.now().isoformat()
     }
 
+async def send_upstream(service_name: str, method: str, path: str, headers: dict,
+                        params=None, content=None, stream: bool = False,
+                        timeout: Optional[float] = None, hedge: bool = True) -> httpx.Response:
+    """Send a request to the service; idempotent ones are hedged and retried within the retry budget
+    unless hedge is False. timeout replaces the pool's read timeout for each attempt"""
+    def attempt():
+        return send_attempt(service_name, method, path, headers, params, content, stream, timeout)
+
+    if hedging is None or not hedge or method.upper() not in IDEMPOTENT_METHODS:
+        return await attempt()
+
+    async def discard(response: httpx.Response):
+        if stream:
+            await close_upstream(service_name, response)
+
+    return await hedging.call(service_name, attempt, discard)
+
+async def send_attempt(service_name: str, method: str, path: str, headers: dict,
+                       params=None, content=None, stream: bool = False,
+                       timeout: Optional[float] = None) -> httpx.Response:
+    """Send one attempt to one of the service's replicas through its breaker and pool"""
+    breaker = breakers[service_name]
+    if not breaker.allow_request():
+        metrics.error(service_name, "circuit_open")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service '{service_name}' temporarily unavailable",
+            headers={"Retry-After": str(breaker.retry_after())}
+        )
+
+    pool = pools[service_name]
+    replica_set = replica_sets[service_name]
+    replica = replica_set.pick()
+
+    with span("upstream", service=service_name, replica=replica.url) as upstream_span:
+        trace = current_trace.get()
+        if trace is not None:
+            # The upstream continues this trace as a child of the upstream span
+            headers = {**headers, "traceparent": trace.traceparent(upstream_span), "x-request-id": trace.request_id}
+        upstream_request = pool.client.build_request(
+            method=method,
+            url=f"{replica.url}{path}",
+            headers=headers,
+            params=params,
+            content=content
+        )
+        if timeout is not None:
+            upstream_request.extensions["timeout"] = {**upstream_request.extensions["timeout"], "read": timeout}
+
+        replica_set.acquire(replica)
+        started = time.perf_counter()
+        try:
+            response = await pool.send(upstream_request, stream=stream)
+        except asyncio.CancelledError:
+            # A hedged attempt that lost the race; not a failure of the replica or the service
+            replica_set.release(replica)
+            breaker.release()
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            replica_set.release(replica, failed=True)
+            breaker.record_failure(elapsed, type(e).__name__)
+            metrics.add_upstream(service_name, elapsed)
+            metrics.error(service_name, error_class(e))
+            raise
+        if upstream_span is not None:
+            upstream_span.attributes["status_code"] = response.status_code
+
+    elapsed = time.perf_counter() - started
+    metrics.add_upstream(service_name, elapsed)
+    failed = response.status_code >= 500
+    if failed:
+        breaker.record_failure(elapsed, f"HTTP {response.status_code}")
+        metrics.error(service_name, "upstream_5xx")
+    else:
+        breaker.record_success(elapsed)
+
+    if stream:
+        # Streamed responses keep their replica busy until close_upstream()
+        response.extensions["gateway_replica"] = (replica, failed)
+    else:
+        replica_set.release(replica, failed=failed)
+    return response
+
+async def close_upstream(service_name: str, response: httpx.Response):
+    """Close a streamed upstream response and free its pool slot and replica"""
+    try:
+        await pools[service_name].close(response)
+    finally:
+        replica, failed = response.extensions.pop("gateway_replica")
+        replica_sets[service_name].release(replica, failed=failed)
+
 async def forward_request(service_name: str, path: str, method: str, request: Request):
     """Forward request to appropriate microservice"""
     if service_name not in SERVICES:
         raise HTTPException(status_code=404, detail=f"Service '{service_name}' not found")
 
-    service_url = SERVICES[service_name]
-    target_url = f"{service_url}{path}"
+    headers = proxy_headers(request)
+    timer = metrics.start(service_name, route_label(request), method.upper())
+    status_code = 500
+    try:
+        await admit(service_name, method, request)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await dispatch_request(service_name, path, method, headers, request)
+            status_code = response.status_code
+            return response
+        except HTTPException as e:
+            status_code = e.status_code
+            raise
+        finally:
+            if admission:
+                rtt, failed = admission_sample(status_code, timer, started)
+                release = once(admission.service(service_name).release, rtt, failed=failed)
+                if isinstance(response, StreamingResponse):
+                    # The upstream is still sending the body; the slot is held until it is relayed
+                    release_after_body(response, release)
+                else:
+                    release()
+    except HTTPException as e:
+        status_code = e.status_code
+        if e.status_code == 401:
+            metrics.error(service_name, "unauthorized")
+        raise
+    finally:
+        metrics.finish(timer, status_code)
+
+def admission_sample(status_code: int, timer, started: float) -> Tuple[Optional[float], bool]:
+    """Latency sample and overload verdict a request gives its service's concurrency limit"""
+    if timer.upstream <= 0:
+        # Cache hits, open-circuit fast fails and requests refused before the upstream
+        # say nothing about its capacity
+        return None, False
+    if 400 <= status_code < 500:
+        # Neither do client errors, however quickly they were answered
+        return None, False
+    # Time to the response headers; a long body is the client's pace, not the service's
+    return time.perf_counter() - started, status_code in (502, 503, 504)
 
-    # Prepare headers (exclude host and content-length)
+def once(function: Callable, *args, **kwargs) -> Callable[[], None]:
+    """function(*args, **kwargs) on the first call, nothing on later ones"""
+    called = False
+
+    def call():
+        nonlocal called
+        if not called:
+            called = True
+            function(*args, **kwargs)
+    return call
+
+def release_after_body(response: StreamingResponse, release: Callable[[], None]):
+    """Run release once the body has been relayed or abandoned, at the latest when the response is discarded"""
+    body = response.body_iterator
+
+    async def releasing_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            release()
+
+    response.body_iterator = releasing_body()
+    tasks = BackgroundTasks([response.background] if response.background is not None else [])
+    tasks.add_task(release)
+    response.background = tasks
+    # A client gone before the body started skips both of the above
+    weakref.finalize(response, release)
+
+def proxy_headers(request) -> dict:
+    """Request headers to send upstream: without host and content-length, with X-Forwarded-For"""
     headers = dict(request.headers)
     headers.pop("host", None)
     headers.pop("content-length", None)
 
+    # Let upstreams see the client address behind the gateway
+    if request.client:
+        forwarded_for = headers.get("x-forwarded-for")
+        headers["x-forwarded-for"] = f"{forwarded_for}, {request.client.host}" if forwarded_for else request.client.host
+    return headers
+
+async def admit(service_name: str, method: str, request: Request):
+    """Take a concurrency slot for the service, or shed the request with 503"""
+    if not admission:
+        return
+    priority = getattr(request.state, "priority", None) or classify(method, None, False)
+    try:
+        with span("admission", priority=priority):
+            await admission.service(service_name).acquire(priority)
+    except Overloaded as e:
+        metrics.error(service_name, "shed")
+        logger.debug(f"Shed {method.upper()} {request.url.path} ({priority}): {e}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service '{service_name}' is overloaded",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+async def dispatch_request(service_name: str, path: str, method: str, headers: dict, request: Request):
+    """Authenticate and send the request through the cache, single-flight or proxy path"""
+    with span("auth"):
+        await authenticate(request, headers)
+
+    if method.upper() == "GET":
+        cache_prefix = response_cache.route_for(request.url.path)
+        if cache_prefix:
+            return await cached_request(service_name, path, cache_prefix, headers, request)
+        if SINGLE_FLIGHT_ENABLED:
+            return await coalesced_request(service_name, path, headers, request)
+
+    try:
+        if PROXY_MODE == "stream":
+            return await stream_request(service_name, path, method, headers, request)
+        return await buffered_request(service_name, path, method, headers, request)
+    finally:
+        # Writes make cached reads of the same resource stale
+        if method.upper() not in ("GET", "HEAD", "OPTIONS"):
+            response_cache.invalidate(request.url.path)
+            if cache_broadcast:
+                cache_broadcast.publish({"path": request.url.path})
+
+def route_label(request: Request) -> str:
+    """Matched route template, so metric labels stay bounded"""
+    label = getattr(request.state, "route_label", None)
+    if label:
+        return label
+    route = request.scope.get("route")
+    if getattr(route, "path", None):
+        return route.path
+    return "/" + "/".join(request.url.path.strip("/").split("/")[:2])
+
+def upstream_timeout(request: Request) -> Optional[float]:
+    """Read timeout of the matched route, if it sets one"""
+    route = getattr(request.state, "route", None)
+    return route.timeout if route is not None else None
+
+async def authenticate(request: Request, headers: dict):
+    """Verify the bearer token locally and pass the caller's identity upstream"""
+    # Identity and internal headers are only trusted when the gateway itself set them
+    for name in IDENTITY_HEADERS:
+        headers.pop(name, None)
+    headers.pop("x-internal-token", None)
+
+    route = getattr(request.state, "route", None)
+    mode = JWT_MODE
+    if route is not None and route.auth is not None and JWT_MODE != "off":
+        mode = "off" if route.auth == "public" else route.auth
+    if mode == "off":
+        return
+
+    token = bearer_token(headers.get("authorization", ""))
+    if token is None:
+        if mode == "required":
+            raise HTTPException(
+                status_code=401,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        return
+
+    try:
+        claims = await token_verifier.verify(token)
+    except KeysUnavailable:
+        if mode == "required":
+            raise HTTPException(status_code=503, detail="Token verification unavailable")
+        # Leave verification to the upstream service as before
+        return
+    except TokenError as e:
+        raise HTTPException(
+            status_code=401,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    headers.update(identity_headers(claims))
+
+async def buffered_request(service_name: str, path: str, method: str, headers: dict, request: Request):
+    """Read the whole upstream response and re-encode JSON bodies"""
     try:
         # Get request body if present
         body = None
@@ -151,21 +649,52 @@ async def forward_request(service_name: str, path: str, method: str, request: Re
             body = await request.body()
 
         # Forward request to service
-        response = await client.request(
-            method=method,
-            url=target_url,
-            headers=headers,
+        response = await send_upstream(
+            service_name,
+            method,
+            path,
+            headers,
             params=request.query_params,
-            content=body
+            content=body,
+            timeout=upstream_timeout(request)
         )
 
         # Return response
-        return JSONResponse(
-            content=response.json() if response.headers.get("content-type", "").startswith("application/json") else response.text,
+        return FastJSONResponse(
+            content=loads(response.content) if response.headers.get("content-type", "").startswith("application/json") else response.text,
             status_code=response.status_code,
             headers={"X-Forwarded-From": service_name}
         )
 
+    except HTTPException:
+        raise
+    except httpx.RequestError as e:
+        logger.error(f"Request error forwarding to {service_name}: {e}")
+        raise HTTPException(status_code=502, detail=f"Service '{service_name}' unavailable")
+    except Exception as e:
+        logger.error(f"Unexpected error forwarding to {service_name}: {e}")
+        raise HTTPException(status_code=500, detail="Gateway error")
+
+async def open_upstream(service_name: str, method: str, path: str, headers: dict, request: Request, content=None,
+                        timeout: Optional[float] = None, hedge: bool = True):
+    """Start a streamed upstream call, mapping transport errors to gateway errors"""
+    for name in HOP_BY_HOP_HEADERS:
+        headers.pop(name, None)
+
+    try:
+        return await send_upstream(
+            service_name,
+            method,
+            path,
+            headers,
+            params=request.query_params,
+            content=content,
+            stream=True,
+            timeout=timeout or upstream_timeout(request),
+            hedge=hedge
+        )
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         logger.error(f"Request error forwarding to {service_name}: {e}")
         raise HTTPException(status_code=502, detail=f"Service '{service_name}' unavailable")
@@ -173,77 +702,261 @@ async def forward_request(service_name: str, path: str, method: str, request: Re
         logger.error(f"Unexpected error forwarding to {service_name}: {e}")
         raise HTTPException(status_code=500, detail="Gateway error")
 
-# Authentication service routes
-@app.api_route("/api/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def auth_routes(path: str, request: Request):
-    """Route authentication requests"""
-    return await forward_request("auth", f"/{path}", request.method, request)
-
-# Project service routes
-@app.api_route("/api/projects/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def project_routes(path: str, request: Request):
-    """Route project management requests"""
-    return await forward_request("project", f"/projects/{path}", request.method, request)
-
-@app.api_route("/api/projects", methods=["GET", "POST"])
-async def project_base_routes(request: Request):
-    """Route base project requests"""
-    return await forward_request("project", "/projects", request.method, request)
-
-# Team service routes
-@app.api_route("/api/teams/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def team_routes(path: str, request: Request):
-    """Route team management requests"""
-    return await forward_request("team", f"/teams/{path}", request.method, request)
-
-@app.api_route("/api/teams", methods=["GET", "POST"])
-async def team_base_routes(request: Request):
-    """Route base team requests"""
-    return await forward_request("team", "/teams", request.method, request)
-
-# Work service routes
-@app.api_route("/api/work-entries/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def work_routes(path: str, request: Request):
-    """Route work entry requests"""
-    return await forward_request("work", f"/work-entries/{path}", request.method, request)
-
-@app.api_route("/api/work-entries", methods=["GET", "POST"])
-async def work_base_routes(request: Request):
-    """Route base work entry requests"""
-    return await forward_request("work", "/work-entries", request.method, request)
-
-# Material service routes
-@app.api_route("/api/materials/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def material_routes(path: str, request: Request):
-    """Route material management requests"""
-    return await forward_request("material", f"/materials/{path}", request.method, request)
-
-@app.api_route("/api/materials", methods=["GET", "POST"])
-async def material_base_routes(request: Request):
-    """Route base material requests"""
-    return await forward_request("material", "/materials", request.method, request)
-
-# Equipment service routes
-@app.api_route("/api/equipment/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def equipment_routes(path: str, request: Request):
-    """Route equipment management requests"""
-    return await forward_request("equipment", f"/equipment/{path}", request.method, request)
-
-@app.api_route("/api/equipment", methods=["GET", "POST"])
-async def equipment_base_routes(request: Request):
-    """Route base equipment requests"""
-    return await forward_request("equipment", "/equipment", request.method, request)
-
-# Activity service routes
-@app.api_route("/api/activities/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def activity_routes(path: str, request: Request):
-    """Route activity logging requests"""
-    return await forward_request("activity", f"/activities/{path}", request.method, request)
-
-@app.api_route("/api/activities", methods=["GET", "POST"])
-async def activity_base_routes(request: Request):
-    """Route base activity requests"""
-    return await forward_request("activity", "/activities", request.method, request)
+def relay_headers(response: httpx.Response) -> list:
+    """Upstream headers as raw pairs, so repeated ones (Set-Cookie) survive, minus hop-by-hop"""
+    return [
+        (name, value) for name, value in response.headers.raw
+        if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+    ]
+
+def streaming_proxy_response(service_name: str, response: httpx.Response, body=None) -> StreamingResponse:
+    """Relay an upstream response; raw bytes keep any content-encoding intact"""
+    proxy_response = StreamingResponse(
+        body if body is not None else response.aiter_raw(),
+        status_code=response.status_code,
+        background=BackgroundTask(close_upstream, service_name, response)
+    )
+    proxy_response.raw_headers.extend(relay_headers(response))
+    proxy_response.raw_headers.append((b"x-forwarded-from", service_name.encode("latin-1")))
+    return proxy_response
+
+async def stream_request(service_name: str, path: str, method: str, headers: dict, request: Request):
+    """Relay request and response bodies chunk by chunk without parsing them"""
+    # Request bodies are streamed upstream instead of being read into memory
+    body = request.stream() if method.upper() in ["POST", "PUT", "PATCH"] else None
+
+    response = await open_upstream(service_name, method, path, headers, request, content=body)
+    return streaming_proxy_response(service_name, response)
+
+# Caller credentials and identity withheld from the upstream of a "shared" live stream;
+# x-auth-verified stays so the service knows the gateway vetted every subscriber
+SHARED_STREAM_DROPPED_HEADERS = (
+    "authorization", "cookie", "x-token", "x-user-id", "x-user-email", "x-user-role", "x-forwarded-for"
+)
+
+def shares_stream(route: Route, headers: dict) -> bool:
+    """Whether the caller joins the one upstream event stream of every verified caller"""
+    return route.live == "shared" and headers.get("x-auth-verified") == "gateway"
+
+def live_key(route: Route, path: str, request: Request, headers: dict) -> tuple:
+    """Which clients may share an upstream event stream"""
+    query = tuple(sorted(request.query_params.multi_items()))
+    if shares_stream(route, headers):
+        return (route.service, path, query)
+    # Per caller: the verified user, else whatever credentials were sent
+    caller = headers.get("x-user-id") or request.headers.get("authorization") or request.headers.get("cookie", "")
+    return (route.service, path, query, caller)
+
+async def live_request(route: Route, path: str, request: Request):
+    """Relay a Server-Sent Events stream, sharing one upstream subscription where the route allows"""
+    if live_hub.full():
+        raise HTTPException(status_code=503, detail="Too many live connections", headers={"Retry-After": "5"})
+
+    headers = proxy_headers(request)
+    with span("auth"):
+        await authenticate(request, headers)
+    # Events are parsed and interleaved with heartbeats, so the stream must arrive unencoded
+    headers["accept-encoding"] = "identity"
+
+    live_headers = {"cache-control": "no-cache", "x-accel-buffering": "no"}
+    if route.live == "direct":
+        # A hedge would open a second long-lived stream only to drop it
+        response = await open_upstream(route.service, "GET", path, headers, request, timeout=live_hub.idle_timeout,
+                                       hedge=False)
+        if not is_event_stream(response):
+            return streaming_proxy_response(route.service, response)
+        proxy_response = streaming_proxy_response(route.service, response, body=live_hub.relayed(response.aiter_raw()))
+        proxy_response.raw_headers.extend((name.encode("latin-1"), value.encode("latin-1"))
+                                          for name, value in live_headers.items())
+        return proxy_response
+
+    # The gateway replays missed events itself; a new upstream stream starts from now
+    headers.pop("last-event-id", None)
+
+    upstream_headers = headers
+    if shares_stream(route, headers):
+        # A stream every verified caller shares is opened as nobody in particular, so no
+        # subscriber receives events chosen by the first subscriber's identity
+        upstream_headers = {name: value for name, value in headers.items()
+                            if name not in SHARED_STREAM_DROPPED_HEADERS}
+
+    def open_stream():
+        return open_upstream(route.service, "GET", path, upstream_headers, request, timeout=live_hub.idle_timeout,
+                             hedge=False)
+
+    subscription = await live_hub.subscription(live_key(route, path, request, headers), route.service, open_stream,
+                                               close_upstream)
+    if isinstance(subscription, httpx.Response):
+        return streaming_proxy_response(route.service, subscription)
+    subscriber = subscription.join(request.headers.get("last-event-id"))
+    return StreamingResponse(
+        live_hub.fanned_out(subscription, subscriber),
+        media_type=SSE_MEDIA_TYPE,
+        headers={**live_headers, "x-forwarded-from": route.service, "x-live-subscribers": str(len(subscription.subscribers))}
+    )
+
+def replayed_response(service_name: str, result: UpstreamResult) -> Response:
+    """Answer a follower from the body its leader buffered"""
+    proxy_response = Response(content=result.body, status_code=result.status_code)
+    proxy_response.raw_headers.extend(result.headers)
+    proxy_response.raw_headers.append((b"x-forwarded-from", service_name.encode("latin-1")))
+    proxy_response.raw_headers.append((b"x-coalesced", b"true"))
+    return proxy_response
+
+async def coalesced_request(service_name: str, path: str, headers: dict, request: Request):
+    """Share one upstream call between concurrent identical GETs of the same principal"""
+    key = (service_name,) + request_key(request.url.path, request.url.query, request.headers)
+
+    flight = single_flight.join(key)
+    if flight is not None:
+        # Shielded so a follower that disconnects does not cancel the others; bounded
+        # because a leader whose client vanished before its body was read never finishes
+        wait = upstream_timeout(request) or pools[service_name].config.read_timeout
+        try:
+            result = await asyncio.wait_for(asyncio.shield(flight.result), wait)
+        except asyncio.TimeoutError:
+            result = None
+        if result is not None:
+            return replayed_response(service_name, result)
+        # The leader's body was too large to hold or did not complete in time
+        return await stream_request(service_name, path, "GET", headers, request)
+
+    flight = single_flight.lead(key)
+    try:
+        response = await open_upstream(service_name, "GET", path, headers, request)
+    except Exception as e:
+        single_flight.finish(key, flight, e)
+        raise
+    except BaseException:
+        single_flight.finish(key, flight)
+        raise
+
+    declared = response.headers.get("content-length")
+    if not flight.followers or (declared and declared.isdigit() and int(declared) > single_flight.max_body_bytes):
+        # Nobody to share with, or too large to hold: relay the body as it arrives; later callers start their own call
+        single_flight.finish(key, flight)
+        return streaming_proxy_response(service_name, response)
+
+    replay_headers = [(name, value) for name, value in relay_headers(response) if name.lower() != b"content-length"]
+
+    async def relay_and_share():
+        # Tee the body to this client and into a buffer for the followers unless it grows too large
+        chunks = []
+        size = 0
+        completed = False
+        try:
+            async for chunk in response.aiter_raw():
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > single_flight.max_body_bytes:
+                        chunks = None
+                        single_flight.finish(key, flight)
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if completed and chunks is not None:
+                single_flight.finish(key, flight, UpstreamResult(response.status_code, replay_headers, b"".join(chunks)))
+            else:
+                single_flight.finish(key, flight)
+
+    return streaming_proxy_response(service_name, response, relay_and_share())
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an entity tag (RFC 7232 2.3.2)"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+def cached_response(service_name: str, entry, request: Request, cache_status: str) -> Response:
+    """Answer from a cache entry, with 304 when the client already holds it"""
+    extra_headers = [
+        (b"etag", entry.etag.encode("latin-1")),
+        (b"age", str(entry.age(time.monotonic())).encode("latin-1")),
+        (b"x-cache", cache_status.encode("latin-1")),
+        (b"x-forwarded-from", service_name.encode("latin-1")),
+    ]
+    if etag_matches(request.headers.get("if-none-match", ""), entry.etag):
+        response_cache.not_modified += 1
+        response = Response(status_code=304)
+        response.raw_headers.extend(extra_headers)
+        return response
+
+    response = Response(content=entry.body, status_code=entry.status_code)
+    response.raw_headers.extend(entry.headers)
+    response.raw_headers.extend(extra_headers)
+    return response
+
+async def cached_request(service_name: str, path: str, cache_prefix: str, headers: dict, request: Request):
+    """Serve a cacheable GET from the response cache, filling it from upstream on a miss"""
+    key = request_key(request.url.path, request.url.query, request.headers)
+    bypass = "no-cache" in request.headers.get("cache-control", "").lower()
+    entry = None if bypass else response_cache.get(key)
+
+    if entry is not None and entry.fresh(time.monotonic()):
+        response_cache.hits += 1
+        return cached_response(service_name, entry, request, "HIT")
+    response_cache.misses += 1
+
+    # The gateway answers conditional requests itself, so ask upstream for a full
+    # body unless a stale entry can be revalidated
+    headers.pop("if-none-match", None)
+    headers.pop("if-modified-since", None)
+    if entry is not None:
+        headers["if-none-match"] = entry.etag
+
+    generation = response_cache.generation(cache_prefix)
+    response = await open_upstream(service_name, "GET", path, headers, request)
+
+    if response.status_code == 304 and entry is not None:
+        await close_upstream(service_name, response)
+        response_cache.refresh(key, response.headers.get("cache-control", ""))
+        return cached_response(service_name, entry, request, "REVALIDATED")
+
+    if response.status_code != 200:
+        return streaming_proxy_response(service_name, response)
+
+    stored_headers = [
+        (name, value) for name, value in relay_headers(response)
+        if name.lower() not in (
+            b"content-length", b"etag", b"age", b"x-cache", b"x-forwarded-from", b"server-timing", b"x-request-id"
+        )
+    ]
+
+    async def relay_and_store():
+        # Tee the body to the client and into the cache unless it grows too large
+        # or is specific to this one request (cookies, Vary)
+        chunks = [] if shareable(stored_headers) else None
+        size = 0
+        async for chunk in response.aiter_raw():
+            if chunks is not None:
+                size += len(chunk)
+                if size > response_cache.max_entry_bytes:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if chunks is not None:
+            response_cache.store(
+                key,
+                cache_prefix,
+                generation,
+                response.status_code,
+                stored_headers,
+                b"".join(chunks),
+                response.headers.get("cache-control", ""),
+                response.headers.get("etag")
+            )
+
+    proxy_response = streaming_proxy_response(service_name, response, relay_and_store())
+    proxy_response.raw_headers.append((b"x-cache", b"MISS"))
+    return proxy_response
 
 # Service discovery endpoint
 @app.get("/api/services")
@@ -255,18 +968,264 @@ async def get_services():
         "total_services": len(SERVICES)
     }
 
-# Load balancing and circuit breaker could be added here
 @app.get("/api/stats")
 async def get_gateway_stats():
     """Get gateway statistics"""
-    # In a real implementation, this would track request counts, response times, etc.
+    traffic = metrics.summary()
     return {
         "total_services": len(SERVICES),
-        "active_services": len(SERVICES),  # This should be dynamic based on health checks
-        "gateway_uptime": "running",
-        "version": "1.0.0"
+        "active_services": sum(1 for breaker in breakers.values() if breaker.state != "open"),
+        "gateway_uptime": traffic.pop("uptime_seconds"),
+        "worker": worker_id(),
+        "version": "1.0.0",
+        "traffic": traffic,
+        "pools": {name: pool.stats() for name, pool in pools.items()},
+        "circuit_breakers": {name: breaker.stats() for name, breaker in breakers.items()},
+        "load_balancing": {name: replica_set.stats() for name, replica_set in replica_sets.items()},
+        "cache": response_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "compression": compressor.stats() if compressor else {"enabled": False},
+        "batch": batch_executor.stats() if batch_executor else {"enabled": False},
+        "hedging": hedging.stats() if hedging else {"enabled": False},
+        "admission": admission.stats() if admission else {"enabled": False},
+        "live": live_hub.stats() if live_hub else {"enabled": False},
+        "rate_limit": rate_limiter.stats() if rate_limiter else {"enabled": False},
+        "jwt": {"mode": JWT_MODE, **token_verifier.stats()}
     }
 
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def component_metrics():
+    """Pool, breaker, replica, cache, hedging, admission, live, compression and limiter figures read at scrape time"""
+    pool_stats = {name: pool.stats() for name, pool in pools.items()}
+    yield snapshot_family("gateway_pool_in_flight", "gauge", "Upstream requests holding a pool slot",
+                          {name: stats["in_flight"] for name, stats in pool_stats.items()}, ("service",))
+    yield snapshot_family("gateway_pool_waiting", "gauge", "Requests waiting for a pool slot",
+                          {name: stats["waiting"] for name, stats in pool_stats.items()}, ("service",))
+    yield snapshot_family("gateway_pool_saturation", "gauge", "Share of pool slots in use",
+                          {name: stats["saturation"] for name, stats in pool_stats.items()}, ("service",), merge="max")
+    yield snapshot_family("gateway_pool_timeouts_total", "counter", "Requests that found no free pool slot",
+                          {name: stats["pool_timeouts"] for name, stats in pool_stats.items()}, ("service",))
+    yield snapshot_family("gateway_circuit_state", "gauge", "Circuit breaker state (0 closed, 1 half open, 2 open)",
+                          {name: BREAKER_STATES.get(breaker.state, 0) for name, breaker in breakers.items()},
+                          ("service",), merge="max")
+    yield snapshot_family("gateway_replica_healthy", "gauge", "Replica passed its last health check",
+                          {(name, url): int(health_monitor.is_healthy(f"{name}@{url}"))
+                           for name, urls in SERVICES.items() for url in urls},
+                          ("service", "replica"), merge="min")
+    cache_stats = response_cache.stats()
+    for key in ("hits", "misses", "revalidated", "evictions", "invalidations"):
+        yield snapshot_family(f"gateway_cache_{key}_total", "counter", f"Response cache {key}", {(): cache_stats[key]})
+    yield snapshot_family("gateway_cache_bytes", "gauge", "Response cache size in bytes", {(): cache_stats["bytes"]})
+    yield snapshot_family("gateway_single_flight_coalesced_total", "counter", "GETs served from a shared upstream call",
+                          {(): single_flight.followers})
+    if hedging:
+        for counter, help_text in (("hedges", "Hedged second attempts sent"),
+                                   ("hedge_wins", "Hedged attempts that answered first"),
+                                   ("retries", "Retried idempotent upstream calls"),
+                                   ("budget_exhausted", "Hedges and retries refused by the retry budget")):
+            yield snapshot_family(f"gateway_{counter}_total", "counter", help_text,
+                                  {name: counters[counter] for name, counters in hedging.counters.items()},
+                                  ("service",))
+        yield snapshot_family("gateway_hedge_delay_seconds", "gauge", "Current delay before a hedged attempt",
+                              {name: hedging.hedge_delay(name) for name in hedging.windows
+                               if hedging.hedge_delay(name) is not None}, ("service",), merge="max")
+    if admission:
+        services = admission.services
+        yield snapshot_family("gateway_concurrency_limit", "gauge", "Adaptive concurrency limit per service",
+                              {name: service.limit.limit for name, service in services.items()}, ("service",))
+        yield snapshot_family("gateway_admission_in_flight", "gauge", "Requests holding an admission slot",
+                              {name: service.in_flight for name, service in services.items()}, ("service",))
+        yield snapshot_family("gateway_admission_queued", "gauge", "Requests waiting for an admission slot",
+                              {name: service.queue_depth for name, service in services.items()}, ("service",))
+        yield snapshot_family("gateway_shed_total", "counter", "Requests shed by admission control",
+                              {(name, priority): count for name, service in services.items()
+                               for priority, count in service.shed.items()}, ("service", "priority"))
+    if live_hub:
+        yield snapshot_family("gateway_live_connections", "gauge", "Open live connections by kind",
+                              live_hub.connections, ("kind",))
+        yield snapshot_family("gateway_live_subscriptions", "gauge", "Upstream event streams shared by live clients",
+                              {(): len(live_hub.subscriptions)})
+        yield snapshot_family("gateway_live_events_total", "counter", "Events received on shared upstream streams",
+                              {(): live_hub.events})
+        yield snapshot_family("gateway_live_dropped_total", "counter", "Live clients disconnected for falling behind",
+                              {(): live_hub.dropped})
+    if compressor:
+        yield snapshot_family("gateway_compressed_responses_total", "counter", "Responses compressed by encoding",
+                              compressor.responses, ("encoding",))
+        yield snapshot_family("gateway_compression_input_bytes_total", "counter",
+                              "Response bytes before compression by encoding", compressor.bytes_in, ("encoding",))
+        yield snapshot_family("gateway_compression_output_bytes_total", "counter",
+                              "Response bytes after compression by encoding", compressor.bytes_out, ("encoding",))
+        yield snapshot_family("gateway_compression_seconds_total", "counter", "Time spent compressing responses",
+                              {(): compressor.compress_seconds})
+    if rate_limiter:
+        yield snapshot_family("gateway_rate_limited_total", "counter", "Requests rejected by the rate limiter",
+                              {(): rate_limiter.limited})
+
+metrics.add_collector(component_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache")
+async def get_cache_stats():
+    """Get response cache hit/miss statistics"""
+    return {
+        "cache": response_cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/pools")
+async def get_pool_stats():
+    """Get connection pool usage per service"""
+    return {
+        "pools": {name: pool.stats() for name, pool in pools.items()},
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/api/routes")
+async def get_routes():
+    """Get the active route table"""
+    return {
+        **route_config.stats(),
+        "routes": [route.describe() for route in route_config.table.routes],
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/api/routes/reload")
+async def reload_routes(request: Request):
+    """Reload the route table file now (internal)"""
+    if not INTERNAL_API_TOKEN or request.headers.get("x-internal-token") != INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        route_config.reload(force=True)
+    except RouteConfigError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return route_config.stats()
+
+async def route_request(request: Request):
+    """Find the request's route in the route table and forward it to the route's service"""
+    match = route_config.table.match(request.url.path)
+    if match is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    route, remainder = match
+    allowed = route.allowed(remainder)
+    if not allowed:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if request.method not in allowed:
+        raise HTTPException(status_code=405, detail="Method Not Allowed", headers={"Allow": ", ".join(sorted(allowed))})
+
+    request.state.route = route
+    request.state.route_label = route.label(remainder)
+    if (route.live and live_hub and request.method == "GET" and not getattr(request.state, "batch_item", False)
+            and wants_event_stream(request.headers.get("accept", ""))):
+        return await live_request(route, route.upstream_path(remainder), request)
+    request.state.priority = classify(request.method, route.priority, listing=not remainder.strip("/"))
+    return await forward_request(route.service, route.upstream_path(remainder), request.method, request)
+
+async def batch_sub_request(request: Request):
+    """One batch sub-request, rate limited and routed as if it had been sent on its own"""
+    if rate_limiter:
+        decisions = [d for d in await rate_limiter.check(request.scope) if d is not None and not d.allowed]
+        if decisions:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(decisions[0].retry_after)))}
+            )
+    return await route_request(request)
+
+# Sub-requests of /api/batch run concurrently through the same routing and proxy path
+batch_executor = build_batch_executor(batch_sub_request)
+
+@app.post("/api/batch")
+async def batch_requests(batch: BatchRequest, request: Request):
+    """Run several service requests concurrently and return their responses together"""
+    if batch_executor is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Sub-response bodies can be large; encode them once without jsonable_encoder
+    return FastJSONResponse(await batch_executor.run(request, batch.requests))
+
+# Every service route goes through the route table; declared last so the
+# gateway's own /api endpoints above take precedence
+@app.api_route("/api/{path:path}", methods=list(HTTP_METHODS))
+async def routed_request(path: str, request: Request):
+    """Route service requests through the route table"""
+    return await route_request(request)
+
+@app.websocket("/api/{path:path}")
+async def routed_websocket(websocket: WebSocket, path: str):
+    """Relay a WebSocket to the service of a live route"""
+    match = route_config.table.match(websocket.url.path)
+    if live_hub is None or websocket_connect is None or match is None or not match[0].live:
+        # Closing before accept rejects the handshake with 403
+        await websocket.close(code=1008)
+        return
+    route, remainder = match
+    service_name = route.service
+    breaker = breakers[service_name]
+    if live_hub.full() or breaker.state == "open":
+        await websocket.close(code=1013)
+        return
+
+    websocket.state.route = route
+    headers = {name: value for name, value in proxy_headers(websocket).items() if name not in WEBSOCKET_HANDSHAKE_HEADERS}
+    # Browsers cannot set headers on a WebSocket handshake; accept the token as a query parameter
+    token = websocket.query_params.get("access_token")
+    if token and "authorization" not in headers:
+        headers["authorization"] = f"Bearer {token}"
+    try:
+        await authenticate(websocket, headers)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    # Taken only now, so every allowed call below records an outcome or gives its probe slot back
+    if not breaker.allow_request():
+        await websocket.close(code=1013)
+        return
+    replica_set = replica_sets[service_name]
+    replica = replica_set.pick()
+    query = urlencode([(name, value) for name, value in websocket.query_params.multi_items() if name != "access_token"])
+    url = "ws" + replica.url[len("http"):] + route.upstream_path(remainder) + (f"?{query}" if query else "")
+    subprotocols = [value.strip() for value in websocket.headers.get("sec-websocket-protocol", "").split(",") if value.strip()]
+
+    replica_set.acquire(replica)
+    failed = False
+    started = time.perf_counter()
+    try:
+        try:
+            upstream = await websocket_connect(
+                url,
+                additional_headers=headers,
+                subprotocols=subprotocols or None,
+                open_timeout=live_hub.open_timeout,
+                max_size=live_hub.max_event_bytes,
+                # Bound what the gateway buffers from a fast upstream for a slow client
+                max_queue=max(1, live_hub.buffer_bytes // live_hub.max_event_bytes),
+            )
+        except asyncio.CancelledError:
+            # The client went away during the handshake; says nothing about the service
+            breaker.release()
+            raise
+        except Exception as e:
+            failed = True
+            breaker.record_failure(time.perf_counter() - started, type(e).__name__)
+            metrics.error(service_name, error_class(e))
+            logger.error(f"WebSocket connection to {service_name} failed: {e}")
+            await websocket.close(code=1014)
+            return
+        breaker.record_success(time.perf_counter() - started)
+        await websocket.accept(subprotocol=upstream.subprotocol)
+        await live_hub.relay_websocket(websocket, upstream)
+    finally:
+        replica_set.release(replica, failed=failed)
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # One worker per core by default (GATEWAY_WORKERS or WEB_CONCURRENCY); SIGHUP reloads them one at a time
+    from prefork import serve, worker_count
+    serve("main:app", host="0.0.0.0", port=int(os.getenv("GATEWAY_PORT", "8080")),
+          workers=worker_count("GATEWAY_WORKERS"))
\ No newline at end of file
@@ -0,0 +1,351 @@
+"""
+Request metrics for the API Gateway
+Counters, gauges and fixed-bucket histograms updated inline on the request path
+(plain integer and list updates on the event loop, no locks) and rendered in the
+Prometheus text exposition format; /api/stats summarises the same data. Under
+the prefork launcher every worker publishes its families to a snapshot board
+and scrapes merge them, so figures cover all workers whichever one answers
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from worker_state import SnapshotBoard
+
+# Seconds; covers cache hits (sub-millisecond) up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram; quantiles are interpolated within a bucket"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def dump(self) -> dict:
+        return {"counts": self.counts, "sum": self.sum, "count": self.count}
+
+    def merge(self, other: "Histogram"):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self) -> dict:
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+        return {
+            "count": self.count,
+            "avg_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+        }
+
+
+class Family:
+    """One metric name with a child value per label combination
+
+    merge says how a gauge combines across workers: "sum" for amounts such as
+    in-flight requests, "max" or "min" for states such as breaker positions.
+    Counters and histograms always add up
+    """
+
+    def __init__(self, name: str, kind: str, help_text: str, labels: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, merge: str = "sum"):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.merge = merge
+        self.children: Dict[tuple, object] = {}
+
+    def inc(self, labels: tuple, amount: float = 1):
+        self.children[labels] = self.children.get(labels, 0) + amount
+
+    def set(self, labels: tuple, value: float):
+        self.children[labels] = value
+
+    def observe(self, labels: tuple, value: float):
+        histogram = self.children.get(labels)
+        if histogram is None:
+            histogram = self.children[labels] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def dump(self) -> dict:
+        children = [[list(labels), value.dump() if self.kind == "histogram" else value]
+                    for labels, value in self.children.items()]
+        return {"name": self.name, "kind": self.kind, "help": self.help, "labels": list(self.labels),
+                "buckets": list(self.buckets), "merge": self.merge, "children": children}
+
+    @classmethod
+    def empty_like(cls, dump: dict) -> "Family":
+        return cls(dump["name"], dump["kind"], dump["help"], tuple(dump["labels"]), tuple(dump["buckets"]),
+                   dump["merge"])
+
+    def add_dump(self, dump: dict):
+        """Combine another worker's children into this family"""
+        for labels, value in dump["children"]:
+            labels = tuple(labels)
+            if self.kind == "histogram":
+                histogram = self.children.get(labels)
+                if histogram is None:
+                    histogram = self.children[labels] = Histogram(self.buckets)
+                histogram.counts = [mine + theirs for mine, theirs in zip(histogram.counts, value["counts"])]
+                histogram.sum += value["sum"]
+                histogram.count += value["count"]
+            elif labels not in self.children or self.kind == "counter" or self.merge == "sum":
+                self.children[labels] = self.children.get(labels, 0) + value
+            else:
+                pick = max if self.merge == "max" else min
+                self.children[labels] = pick(self.children[labels], value)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in self.children.items():
+            if self.kind != "histogram":
+                yield f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), value.counts):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                yield f"{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(value.sum)}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {value.count}"
+
+
+def error_class(error: Exception) -> str:
+    """Error class label for a failed upstream call"""
+    if isinstance(error, httpx.PoolTimeout):
+        return "pool_timeout"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.ConnectError):
+        return "connect"
+    if isinstance(error, httpx.RequestError):
+        return "transport"
+    return "other"
+
+
+class RequestTimer:
+    """Timing of one proxied request; upstream time is added by send_upstream"""
+    __slots__ = ("service", "route", "method", "started", "upstream")
+
+    def __init__(self, service: str, route: str, method: str):
+        self.service = service
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.upstream = 0.0
+
+
+current_timer: ContextVar[Optional[RequestTimer]] = ContextVar("gateway_request_timer", default=None)
+
+
+class GatewayMetrics:
+    """Gateway request metrics plus collectors for component stats read at scrape time"""
+
+    def __init__(self, board: Optional[SnapshotBoard] = None):
+        self.board = board
+        self.started_at = time.time()
+        self.requests = Family(
+            "gateway_requests_total", "counter", "Proxied requests by service, route, method and status class",
+            ("service", "route", "method", "status")
+        )
+        self.duration = Family(
+            "gateway_request_duration_seconds", "histogram",
+            "Time from receiving a proxied request until its response starts", ("service", "route")
+        )
+        self.upstream = Family(
+            "gateway_upstream_duration_seconds", "histogram",
+            "Time spent waiting for upstream response headers", ("service",)
+        )
+        self.overhead = Family(
+            "gateway_overhead_duration_seconds", "histogram",
+            "Gateway time per request excluding upstream waits", ("service",)
+        )
+        self.in_flight = Family(
+            "gateway_in_flight_requests", "gauge", "Proxied requests currently being handled", ("service",)
+        )
+        self.errors = Family(
+            "gateway_errors_total", "counter", "Failed proxied requests by error class", ("service", "class")
+        )
+        self.families = [self.requests, self.duration, self.upstream, self.overhead, self.in_flight, self.errors]
+        self.collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def start(self, service: str, route: str, method: str) -> RequestTimer:
+        timer = RequestTimer(service, route, method)
+        self.in_flight.inc((service,))
+        current_timer.set(timer)
+        return timer
+
+    def add_upstream(self, service: str, seconds: float):
+        """Record an upstream wait and credit it to the request being handled, if any"""
+        timer = current_timer.get()
+        if timer is not None:
+            timer.upstream += seconds
+        self.upstream.observe((service,), seconds)
+
+    def finish(self, timer: RequestTimer, status_code: int):
+        elapsed = time.perf_counter() - timer.started
+        self.in_flight.inc((timer.service,), -1)
+        self.requests.inc((timer.service, timer.route, timer.method, f"{status_code // 100}xx"))
+        self.duration.observe((timer.service, timer.route), elapsed)
+        self.overhead.observe((timer.service,), max(0.0, elapsed - timer.upstream))
+
+    def error(self, service: str, error_class: str):
+        self.errors.inc((service, error_class))
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        self.collectors.append(collector)
+
+    def local_families(self) -> List[Family]:
+        families = list(self.families)
+        for collector in self.collectors:
+            families.extend(collector())
+        return families
+
+    def snapshot(self) -> dict:
+        """This worker's families for the snapshot board"""
+        return {"started_at": self.started_at, "families": [family.dump() for family in self.local_families()]}
+
+    def combined(self) -> Tuple[Dict[str, Family], float, int]:
+        """Families by name, the earliest start time and the number of live workers they cover"""
+        if self.board is None:
+            return {family.name: family for family in self.local_families()}, self.started_at, 1
+        self.board.publish(self.snapshot())
+        merged: Dict[str, Family] = {}
+        started_at = self.started_at
+        workers = 0
+        for snapshot, retired in self.board.collect():
+            started_at = min(started_at, snapshot["started_at"])
+            workers += not retired
+            for dump in snapshot["families"]:
+                # An exited worker's requests still count; its gauges no longer describe anything
+                if retired and dump["kind"] == "gauge":
+                    continue
+                family = merged.get(dump["name"])
+                if family is None:
+                    family = merged[dump["name"]] = Family.empty_like(dump)
+                family.add_dump(dump)
+        return merged, started_at, workers
+
+    def start_publishing(self):
+        if self.board is not None:
+            self.board.start(self.snapshot)
+
+    async def stop_publishing(self):
+        if self.board is not None:
+            await self.board.stop()
+
+    def render(self) -> str:
+        families, started_at, workers = self.combined()
+        lines = [
+            "# HELP gateway_uptime_seconds Seconds since the gateway process started",
+            "# TYPE gateway_uptime_seconds gauge",
+            f"gateway_uptime_seconds {time.time() - started_at:.3f}",
+            "# HELP gateway_workers Gateway worker processes covered by these metrics",
+            "# TYPE gateway_workers gauge",
+            f"gateway_workers {workers}",
+        ]
+        for family in families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def _merged(self, family: Family, index: int = 0) -> Dict[str, Histogram]:
+        merged: Dict[str, Histogram] = {}
+        for labels, histogram in family.children.items():
+            merged.setdefault(labels[index], Histogram(family.buckets)).merge(histogram)
+        return merged
+
+    def summary(self) -> dict:
+        """Aggregates for /api/stats"""
+        families, started_at, workers = self.combined()
+        requests = families[self.requests.name]
+        errors = families[self.errors.name]
+        per_service: Dict[str, dict] = {}
+        statuses: Dict[str, int] = {}
+        for (service, _, _, status), count in requests.children.items():
+            entry = per_service.setdefault(service, {"requests": 0, "errors": 0})
+            entry["requests"] += count
+            statuses[status] = statuses.get(status, 0) + count
+        for (service, _), count in errors.children.items():
+            per_service.setdefault(service, {"requests": 0, "errors": 0})["errors"] += count
+
+        total = Histogram(DEFAULT_BUCKETS)
+        for service, histogram in self._merged(families[self.duration.name]).items():
+            per_service[service]["latency"] = histogram.summary()
+            total.merge(histogram)
+        for service, histogram in self._merged(families[self.upstream.name]).items():
+            per_service.setdefault(service, {"requests": 0, "errors": 0})["upstream"] = histogram.summary()
+        for service, histogram in self._merged(families[self.overhead.name]).items():
+            per_service[service]["overhead"] = histogram.summary()
+
+        error_classes: Dict[str, int] = {}
+        for (_, error_class), count in errors.children.items():
+            error_classes[error_class] = error_classes.get(error_class, 0) + count
+
+        return {
+            "uptime_seconds": round(time.time() - started_at, 1),
+            "workers": workers,
+            "requests_total": sum(statuses.values()),
+            "responses_by_status": statuses,
+            "in_flight": sum(families[self.in_flight.name].children.values()),
+            "latency": total.summary(),
+            "errors_by_class": error_classes,
+            "services": per_service,
+        }
+
+
+def snapshot_family(name: str, kind: str, help_text: str, values: Dict, labels: Tuple[str, ...] = (),
+                    merge: str = "sum") -> Family:
+    """Family from a labels -> value map read at scrape time, for collectors"""
+    family = Family(name, kind, help_text, labels, merge=merge)
+    for key, value in values.items():
+        family.set(key if isinstance(key, tuple) else (key,), value)
+    return family
@@ -0,0 +1,189 @@
+"""
+Per-service HTTP connection pools for the API Gateway
+Each upstream service gets its own httpx client, limits and timeouts so a slow
+service cannot exhaust the connections used by the others
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import httpx
+
+from config import service_env
+
+logger = logging.getLogger("api-gateway")
+
+# Number of recent pool wait samples kept per service for percentiles
+WAIT_SAMPLE_SIZE = 1024
+
+
+def _env(service_name: str, key: str, default: str) -> str:
+    return service_env("GATEWAY_POOL", service_name, key, default)
+
+
+@dataclass
+class PoolConfig:
+    """Connection pool settings for one upstream service"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 5.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 10.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls, service_name: str) -> "PoolConfig":
+        """Build the config for a service from environment variables"""
+        return cls(
+            max_connections=int(_env(service_name, "MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(_env(service_name, "MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(_env(service_name, "KEEPALIVE_EXPIRY", "5.0")),
+            connect_timeout=float(_env(service_name, "CONNECT_TIMEOUT", "5.0")),
+            read_timeout=float(_env(service_name, "READ_TIMEOUT", "30.0")),
+            write_timeout=float(_env(service_name, "WRITE_TIMEOUT", "30.0")),
+            pool_timeout=float(_env(service_name, "POOL_TIMEOUT", "10.0")),
+            http2=_env(service_name, "HTTP2", "false").lower() == "true",
+        )
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ServicePool:
+    """Pooled client for a single upstream service with wait-time accounting"""
+
+    def __init__(self, name: str, config: PoolConfig,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.name = name
+        self.config = config
+
+        http2 = config.http2
+        if http2 and transport is None and not _http2_available():
+            logger.warning(f"HTTP/2 requested for {name} but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                connect=config.connect_timeout,
+                read=config.read_timeout,
+                write=config.write_timeout,
+                pool=config.pool_timeout,
+            ),
+            http2=http2,
+            transport=transport,
+        )
+
+        # Slots mirror the connection limit so waiting for a connection is measurable
+        self._slots = asyncio.Semaphore(config.max_connections)
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.pool_timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent_waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    async def _acquire(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.config.pool_timeout)
+        except asyncio.TimeoutError:
+            self.pool_timeouts += 1
+            raise httpx.PoolTimeout(f"No free connection to {self.name} within {self.config.pool_timeout}s")
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - started
+        self.requests += 1
+        self.in_flight += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self._recent_waits.append(waited)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def send(self, request: httpx.Request, stream: bool = False) -> httpx.Response:
+        """
+        Send a request through this service's pool.
+        Streamed responses hold their slot until close() is called.
+        """
+        await self._acquire()
+        try:
+            response = await self.client.send(request, stream=stream)
+        except BaseException:
+            self._release()
+            raise
+        if not stream:
+            self._release()
+        return response
+
+    async def close(self, response: httpx.Response):
+        """Close a streamed response and give its slot back to the pool"""
+        try:
+            await response.aclose()
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        """Pool usage figures for sizing max connections and timeouts"""
+        waits = sorted(self._recent_waits)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 3)
+
+        return {
+            "max_connections": self.config.max_connections,
+            "max_keepalive_connections": self.config.max_keepalive_connections,
+            "keepalive_expiry": self.config.keepalive_expiry,
+            "timeouts": {
+                "connect": self.config.connect_timeout,
+                "read": self.config.read_timeout,
+                "write": self.config.write_timeout,
+                "pool": self.config.pool_timeout,
+            },
+            "http2": self.http2,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "saturation": round(self.in_flight / self.config.max_connections, 3),
+            "requests": self.requests,
+            "pool_timeouts": self.pool_timeouts,
+            "wait_ms": {
+                "avg": round(self.wait_total / self.requests * 1000, 3) if self.requests else None,
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": round(self.wait_max * 1000, 3),
+            },
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def build_service_pools(service_names: Iterable[str],
+                        transport: Optional[httpx.AsyncBaseTransport] = None) -> Dict[str, ServicePool]:
+    """Create one pool per registered service, configured from the environment"""
+    return {
+        name: ServicePool(name, PoolConfig.from_env(name), transport=transport)
+        for name in service_names
+    }
@@ -0,0 +1,309 @@
+"""
+Token-bucket rate limiting for the API Gateway
+Every client gets a gateway-wide bucket plus one bucket per limited route.
+Buckets live in a pluggable backend: in-memory by default, a shared-memory
+table when the workers of one prefork launch must share counters, Redis when
+several gateway hosts must
+"""
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from worker_state import SharedTable, shared_table, state_dir
+
+logger = logging.getLogger("api-gateway")
+
+DEFAULT_CLIENT_LIMIT = "20:40"
+DEFAULT_ROUTE_LIMITS = "/api/auth/login=0.2:5"
+
+
+@dataclass(slots=True)
+class Decision:
+    """Outcome of taking a token from a bucket"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+
+@dataclass
+class RateLimitRule:
+    """Bucket refill rate (tokens per second) and capacity"""
+    rate: float
+    burst: int
+    prefix: str = ""
+
+
+def parse_limit(spec: str, prefix: str = "") -> RateLimitRule:
+    """Parse "rate:burst", e.g. "20:40" for 20 requests/s with bursts of 40"""
+    rate, _, burst = spec.partition(":")
+    rate = float(rate)
+    return RateLimitRule(rate=rate, burst=int(burst) if burst else max(1, int(math.ceil(rate))), prefix=prefix)
+
+
+def parse_route_limits(spec: str) -> List[RateLimitRule]:
+    """Parse "prefix=rate:burst,..." into rules, longest prefix first"""
+    rules = []
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        prefix, limit = item.split("=", 1)
+        rules.append(parse_limit(limit.strip(), prefix.strip().rstrip("/")))
+    return sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+def _decision(allowed: bool, tokens: float, rule: RateLimitRule, cost: float) -> Decision:
+    return Decision(
+        allowed=allowed,
+        limit=rule.burst,
+        remaining=int(tokens),
+        reset_after=(rule.burst - tokens) / rule.rate,
+        retry_after=0.0 if allowed else (cost - tokens) / rule.rate,
+    )
+
+
+class RateLimitBackend:
+    """Storage for token buckets; implementations must make take() atomic per key"""
+
+    async def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Decision:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Process-local buckets with O(1) updates and LRU eviction of idle clients"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def take_now(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Decision:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(rule.burst), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(rule.burst, bucket[0] + (now - bucket[1]) * rule.rate)
+            bucket[1] = now
+
+        allowed = bucket[0] >= cost
+        if allowed:
+            bucket[0] -= cost
+        return _decision(allowed, bucket[0], rule, cost)
+
+    async def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Decision:
+        return self.take_now(key, rule, cost)
+
+
+class SharedMemoryBackend(RateLimitBackend):
+    """Buckets shared by the workers of one prefork launch through a shared-memory table"""
+
+    def __init__(self, table: SharedTable):
+        self.table = table
+
+    def take_now(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Decision:
+        def take(bucket, now):
+            tokens, ts = bucket if bucket is not None else (float(rule.burst), now)
+            tokens = min(rule.burst, tokens + max(0.0, now - ts) * rule.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            return (tokens, now), _decision(allowed, tokens, rule, cost)
+
+        return self.table.update(key, take)
+
+    async def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Decision:
+        return self.take_now(key, rule, cost)
+
+    async def aclose(self):
+        self.table.close()
+
+
+# Refill and take in one round trip; Redis' own clock keeps gateways consistent
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """Buckets shared by all gateway processes through Redis"""
+
+    def __init__(self, url: str, key_prefix: str = "gateway:ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The 'redis' package is required for GATEWAY_RATE_LIMIT_BACKEND=redis")
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self.key_prefix = key_prefix
+
+    async def take(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Decision:
+        allowed, tokens = await self._script(keys=[self.key_prefix + key], args=[rule.rate, rule.burst, cost])
+        return _decision(bool(allowed), float(tokens), rule, cost)
+
+    async def aclose(self):
+        await self._redis.close()
+
+
+class RateLimiter:
+    """Applies the per-client and per-route rules to a request"""
+
+    def __init__(self, backend: RateLimitBackend, client_rule: RateLimitRule,
+                 route_rules: List[RateLimitRule], trust_forwarded_for: bool = False,
+                 identify: Optional[Callable[[dict], Awaitable[Optional[str]]]] = None):
+        self.backend = backend
+        self.client_rule = client_rule
+        self.route_rules = route_rules
+        self.trust_forwarded_for = trust_forwarded_for
+        # Resolves the user behind a request whose credentials verify, None otherwise
+        self.identify = identify
+        self.allowed = 0
+        self.limited = 0
+
+    def route_rule(self, path: str) -> Optional[RateLimitRule]:
+        for rule in self.route_rules:
+            if path == rule.prefix or path.startswith(rule.prefix + "/"):
+                return rule
+        return None
+
+    def address_id(self, scope) -> str:
+        headers = dict(scope["headers"])
+        if self.trust_forwarded_for and b"x-forwarded-for" in headers:
+            return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def client_id(self, scope) -> str:
+        """Callers with verified credentials are limited per user, everyone else per address
+
+        Unverified headers never pick the bucket: a caller could otherwise get a
+        fresh one by sending a different made-up token on every request
+        """
+        if self.identify is not None:
+            user = await self.identify(scope)
+            if user:
+                return "user:" + user
+        return self.address_id(scope)
+
+    async def check(self, scope) -> Tuple[Decision, Optional[Decision]]:
+        """Take from the client bucket and, if one applies, the route bucket"""
+        client_decision = await self.backend.take(await self.client_id(scope), self.client_rule)
+        route_decision = None
+        rule = self.route_rule(scope["path"])
+        if rule is not None and client_decision.allowed:
+            # Route limits guard endpoints such as login, which are attacked by callers
+            # without a valid token, so they always count per address
+            route_decision = await self.backend.take(f"{self.address_id(scope)}|{rule.prefix}", rule)
+        if client_decision.allowed and (route_decision is None or route_decision.allowed):
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return client_decision, route_decision
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "client_limit": {"rate": self.client_rule.rate, "burst": self.client_rule.burst},
+            "route_limits": {rule.prefix: {"rate": rule.rate, "burst": rule.burst} for rule in self.route_rules},
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+def rate_limit_headers(decision: Decision) -> List[Tuple[bytes, bytes]]:
+    return [
+        (b"ratelimit-limit", str(decision.limit).encode()),
+        (b"ratelimit-remaining", str(decision.remaining).encode()),
+        (b"ratelimit-reset", str(int(math.ceil(decision.reset_after))).encode()),
+    ]
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After once a bucket is empty"""
+
+    def __init__(self, app, limiter: RateLimiter, path_prefix: str = "/api/"):
+        self.app = app
+        self.limiter = limiter
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix) or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        client_decision, route_decision = await self.limiter.check(scope)
+        # Report the tighter of the two buckets
+        decision = client_decision
+        if route_decision is not None and (not route_decision.allowed or route_decision.remaining < client_decision.remaining):
+            decision = route_decision
+        headers = rate_limit_headers(decision)
+
+        if not decision.allowed:
+            retry_after = str(max(1, int(math.ceil(decision.retry_after))))
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": retry_after}
+            )
+            response.raw_headers.extend(headers)
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def build_rate_limiter() -> Optional[RateLimiter]:
+    """Create the limiter from GATEWAY_RATE_LIMIT_* variables, or None when disabled"""
+    if os.getenv("GATEWAY_RATE_LIMIT_ENABLED", "true").lower() != "true":
+        return None
+
+    max_clients = int(os.getenv("GATEWAY_RATE_LIMIT_MAX_CLIENTS", "100000"))
+    # Under the prefork launcher buckets default to a table its workers share
+    backend_name = os.getenv("GATEWAY_RATE_LIMIT_BACKEND", "shared" if state_dir() else "memory").lower()
+    if backend_name == "redis":
+        backend = RedisBackend(os.getenv("GATEWAY_RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    elif backend_name == "shared" and state_dir():
+        backend = SharedMemoryBackend(shared_table("gateway-rate-limit", max_clients, 2))
+    else:
+        backend = InMemoryBackend(max_clients)
+
+    return RateLimiter(
+        backend,
+        client_rule=parse_limit(os.getenv("GATEWAY_RATE_LIMIT_DEFAULT", DEFAULT_CLIENT_LIMIT)),
+        route_rules=parse_route_limits(os.getenv("GATEWAY_RATE_LIMIT_ROUTES", DEFAULT_ROUTE_LIMITS)),
+        trust_forwarded_for=os.getenv("GATEWAY_TRUST_FORWARDED_FOR", "false").lower() == "true",
+    )
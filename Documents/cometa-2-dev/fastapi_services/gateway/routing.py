@@ -0,0 +1,306 @@
+"""
+Data-driven routing for the API Gateway
+Services and routes are declared in a JSON file (routes.json by default) and
+compiled into a segment trie, so the catch-all handler finds the route for a
+path in time proportional to its depth instead of the number of routes.
+Per-route policies (upstream timeout, response caching, authentication,
+admission priority, live connections) sit next to the path rewrite, and the
+file is reloaded without a restart
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger("api-gateway")
+
+DEFAULT_ROUTES_FILE = os.path.join(os.path.dirname(__file__), "routes.json")
+
+HTTP_METHODS = ("GET", "HEAD", "POST", "PUT", "DELETE", "PATCH", "OPTIONS")
+DEFAULT_METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH")
+DEFAULT_BASE_METHODS = ("GET", "POST")
+
+# "public" skips token verification; "optional" and "required" override
+# GATEWAY_JWT_MODE for the route; unset routes follow GATEWAY_JWT_MODE
+AUTH_POLICIES = ("public", "optional", "required")
+
+# Admission priority classes, most important first; unset routes are classed
+# by method (writes "high", single reads "normal", listing reads "low")
+PRIORITIES = ("critical", "high", "normal", "low")
+
+# Server-Sent Events and WebSockets below the route: "direct" opens one upstream
+# connection per client; "user" lets a caller's connections share one upstream
+# event stream; "shared" lets every verified caller share it. A shared stream is
+# opened without any caller's credentials or identity, so "shared" only suits
+# feeds that are the same for every user (the activity feed is selected by its
+# query alone); feeds filtered by who is asking must use "user"
+LIVE_MODES = ("direct", "user", "shared")
+
+
+class RouteConfigError(ValueError):
+    """The route configuration file is missing or invalid"""
+
+
+@dataclass(frozen=True)
+class Route:
+    """A path prefix proxied to a service, with its rewrite and policies"""
+    prefix: str
+    service: str
+    rewrite: str
+    # Methods allowed below the prefix and on the prefix itself
+    methods: FrozenSet[str]
+    base_methods: FrozenSet[str]
+    timeout: Optional[float] = None
+    cache_ttl: Optional[float] = None
+    auth: Optional[str] = None
+    priority: Optional[str] = None
+    live: Optional[str] = None
+
+    def allowed(self, remainder: str) -> FrozenSet[str]:
+        return self.methods if remainder else self.base_methods
+
+    def upstream_path(self, remainder: str) -> str:
+        return (self.rewrite + remainder) or "/"
+
+    def label(self, remainder: str) -> str:
+        """Route template for metric labels, in the form of the former decorator routes"""
+        return f"{self.prefix}/{{path:path}}" if remainder else self.prefix
+
+    def describe(self) -> dict:
+        return {
+            "prefix": self.prefix,
+            "service": self.service,
+            "rewrite": self.rewrite,
+            "methods": sorted(self.methods),
+            "base_methods": sorted(self.base_methods),
+            "timeout": self.timeout,
+            "cache_ttl": self.cache_ttl,
+            "auth": self.auth,
+            "priority": self.priority,
+            "live": self.live,
+        }
+
+
+class _Node:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.route: Optional[Route] = None
+
+
+class RouteTable:
+    """Compiled routes: longest-prefix match over path segments"""
+
+    def __init__(self, services: Dict[str, List[str]], routes: List[Route]):
+        self.services = services
+        self.routes = routes
+        self._root = _Node()
+        for route in routes:
+            node = self._root
+            for segment in route.prefix.strip("/").split("/"):
+                node = node.children.setdefault(segment, _Node())
+            node.route = route
+
+    def match(self, path: str) -> Optional[Tuple[Route, str]]:
+        """The route with the longest prefix covering path, and the rest of the path"""
+        node = self._root
+        best = None
+        offset = 0
+        for segment in path[1:].split("/"):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            offset += len(segment) + 1
+            if node.route is not None:
+                best = (node.route, offset)
+        if best is None:
+            return None
+        return best[0], path[best[1]:]
+
+    def cache_ttls(self) -> Dict[str, float]:
+        return {route.prefix: route.cache_ttl for route in self.routes if route.cache_ttl is not None}
+
+
+def _methods(value, where: str) -> FrozenSet[str]:
+    if not isinstance(value, list):
+        raise RouteConfigError(f"{where}: methods must be a list")
+    methods = frozenset(str(method).upper() for method in value)
+    unknown = methods.difference(HTTP_METHODS)
+    if unknown:
+        raise RouteConfigError(f"{where}: unknown methods {sorted(unknown)}")
+    return methods
+
+
+def _seconds(value, where: str, name: str) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise RouteConfigError(f"{where}: {name} must be a non-negative number")
+    return float(value)
+
+
+def _service_urls(name: str, spec, docker_mode: bool) -> List[str]:
+    # Replicas from the environment win, e.g.
+    # GATEWAY_REPLICAS_PROJECT=http://project-1:8002,http://project-2:8002
+    replica_urls = os.getenv(f"GATEWAY_REPLICAS_{name.upper()}")
+    if replica_urls:
+        return [url.strip() for url in replica_urls.split(",") if url.strip()]
+    if isinstance(spec, dict):
+        spec = spec.get("docker" if docker_mode else "local")
+    if not isinstance(spec, list) or not spec or not all(isinstance(url, str) and url for url in spec):
+        raise RouteConfigError(f"service '{name}': expected a non-empty list of URLs")
+    return [url.rstrip("/") for url in spec]
+
+
+def parse_route_config(config: dict, docker_mode: bool) -> RouteTable:
+    """Validate a decoded route configuration and compile it"""
+    if not isinstance(config, dict) or not isinstance(config.get("services"), dict):
+        raise RouteConfigError("'services' must be an object")
+    if not isinstance(config.get("routes"), list):
+        raise RouteConfigError("'routes' must be a list")
+
+    services = {name: _service_urls(name, spec, docker_mode) for name, spec in config["services"].items()}
+    defaults = config.get("defaults", {})
+    default_methods = _methods(defaults.get("methods", list(DEFAULT_METHODS)), "defaults")
+    default_base_methods = _methods(defaults.get("base_methods", list(DEFAULT_BASE_METHODS)), "defaults")
+
+    routes = []
+    prefixes = set()
+    for index, entry in enumerate(config["routes"]):
+        where = f"route {index}"
+        if not isinstance(entry, dict):
+            raise RouteConfigError(f"{where}: expected an object")
+        prefix = entry.get("prefix")
+        if not isinstance(prefix, str) or not prefix.startswith("/") or prefix == "/" or prefix.endswith("/"):
+            raise RouteConfigError(f"{where}: prefix must start with '/' and not end with one")
+        where = f"route {prefix}"
+        if prefix in prefixes:
+            raise RouteConfigError(f"{where}: duplicate prefix")
+        prefixes.add(prefix)
+        if entry.get("service") not in services:
+            raise RouteConfigError(f"{where}: unknown service '{entry.get('service')}'")
+        rewrite = entry.get("rewrite", prefix)
+        if not isinstance(rewrite, str) or (rewrite and not rewrite.startswith("/")):
+            raise RouteConfigError(f"{where}: rewrite must be empty or start with '/'")
+        if entry.get("auth") is not None and entry["auth"] not in AUTH_POLICIES:
+            raise RouteConfigError(f"{where}: auth must be one of {', '.join(AUTH_POLICIES)}")
+        if entry.get("priority") is not None and entry["priority"] not in PRIORITIES:
+            raise RouteConfigError(f"{where}: priority must be one of {', '.join(PRIORITIES)}")
+        if entry.get("live") is not None and entry["live"] not in LIVE_MODES:
+            raise RouteConfigError(f"{where}: live must be one of {', '.join(LIVE_MODES)}")
+        timeout = _seconds(entry.get("timeout"), where, "timeout")
+        if timeout == 0:
+            raise RouteConfigError(f"{where}: timeout must be positive")
+
+        routes.append(Route(
+            prefix=prefix,
+            service=entry["service"],
+            rewrite=rewrite.rstrip("/"),
+            methods=_methods(entry["methods"], where) if "methods" in entry else default_methods,
+            base_methods=_methods(entry["base_methods"], where) if "base_methods" in entry else default_base_methods,
+            timeout=timeout,
+            cache_ttl=_seconds(entry.get("cache_ttl"), where, "cache_ttl"),
+            auth=entry.get("auth"),
+            priority=entry.get("priority"),
+            live=entry.get("live"),
+        ))
+    return RouteTable(services, routes)
+
+
+def load_route_table(path: str, docker_mode: bool) -> RouteTable:
+    try:
+        with open(path, encoding="utf-8") as config_file:
+            config = json.load(config_file)
+    except (OSError, ValueError) as e:
+        raise RouteConfigError(f"Cannot read {path}: {e}")
+    return parse_route_config(config, docker_mode)
+
+
+class RouteConfig:
+    """The active route table, reloaded when its file changes"""
+
+    def __init__(self, path: str, docker_mode: bool, reload_interval: float = 5.0):
+        self.path = path
+        self.docker_mode = docker_mode
+        self.reload_interval = reload_interval
+        self.table = load_route_table(path, docker_mode)
+        self._mtime = self._file_mtime()
+        self.version = 1
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+        self._listeners: List[Callable[[RouteTable], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def add_listener(self, listener: Callable[[RouteTable], None]):
+        """Call listener with every newly loaded table before it becomes active"""
+        self._listeners.append(listener)
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the file again if it changed; an invalid file leaves the active table in place"""
+        mtime = self._file_mtime()
+        if not force and mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            table = load_route_table(self.path, self.docker_mode)
+            for listener in self._listeners:
+                listener(table)
+        except RouteConfigError as e:
+            self.reload_errors += 1
+            self.last_error = str(e)
+            logger.error(f"Route configuration not reloaded: {e}")
+            raise
+        self.table = table
+        self.version += 1
+        self.last_error = None
+        logger.info(f"Loaded route table version {self.version} with {len(table.routes)} routes")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                self.reload()
+            except RouteConfigError:
+                pass
+
+    def start(self):
+        if self._task is None and self.reload_interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "file": self.path,
+            "version": self.version,
+            "routes": len(self.table.routes),
+            "reload_interval_seconds": self.reload_interval,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+        }
+
+
+def build_route_config(docker_mode: bool) -> RouteConfig:
+    """Load the route table from GATEWAY_ROUTES_FILE, polled every GATEWAY_ROUTES_RELOAD_INTERVAL seconds (0 = off)"""
+    return RouteConfig(
+        os.getenv("GATEWAY_ROUTES_FILE", DEFAULT_ROUTES_FILE),
+        docker_mode,
+        reload_interval=float(os.getenv("GATEWAY_ROUTES_RELOAD_INTERVAL", "5")),
+    )
@@ -0,0 +1,83 @@
+"""
+Request coalescing (single-flight) for the API Gateway
+Concurrent identical GETs from the same principal share one upstream call
+instead of each going upstream. The caller that starts the call streams the
+response to its client; the body is only buffered, up to a size limit, when
+other callers joined while the upstream was still answering
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+@dataclass
+class UpstreamResult:
+    """A complete upstream response that can be replayed to several callers"""
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class Flight:
+    """One upstream call in progress and the callers waiting on it"""
+
+    def __init__(self):
+        # Resolves to the replayable result, or None when followers must fetch alone
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self, max_body_bytes: int = 2 * 1024 * 1024):
+        self.max_body_bytes = max_body_bytes
+        self._flights: Dict[Hashable, Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+        # Followers sent back to fetch alone because the shared body was too large or never completed
+        self.released = 0
+
+    def join(self, key: Hashable) -> Optional[Flight]:
+        """The flight already running for key, counting the caller as a follower, or None"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            self.followers += 1
+        return flight
+
+    def lead(self, key: Hashable) -> Flight:
+        """Start the flight for key; the caller must end it with finish()"""
+        flight = self._flights[key] = Flight()
+        self.leaders += 1
+        return flight
+
+    def close(self, key: Hashable, flight: Flight):
+        """Let later callers start their own flight; those already waiting stay on this one"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def finish(self, key: Hashable, flight: Flight, result=None):
+        """Hand followers the result: an UpstreamResult, an exception, or None to fetch alone"""
+        self.close(key, flight)
+        if flight.result.done():
+            return
+        if isinstance(result, BaseException):
+            flight.result.set_exception(result)
+            # Mark the exception as retrieved even if every follower has gone away
+            flight.result.exception()
+        else:
+            if result is None:
+                self.released += flight.followers
+            flight.result.set_result(result)
+
+    def stats(self) -> dict:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._flights),
+            "upstream_calls": self.leaders,
+            "coalesced": self.followers,
+            "released": self.released,
+            "coalesced_ratio": round(self.followers / total, 3) if total else 0.0,
+            "max_body_bytes": self.max_body_bytes,
+        }
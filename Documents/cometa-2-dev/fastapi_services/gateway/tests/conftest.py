@@ -0,0 +1,16 @@
+"""
+Test setup for the API Gateway
+Modules import each other by bare name, as when the gateway runs from its own
+directory, and the gateway app verifies tokens against a fixed test secret
+"""
+import os
+import sys
+
+GATEWAY_DIR = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, GATEWAY_DIR)
+sys.path.insert(0, os.path.join(GATEWAY_DIR, '..', 'shared'))
+
+TEST_JWT_SECRET = "gateway-test-secret"
+
+os.environ.setdefault("GATEWAY_JWT_SECRET", TEST_JWT_SECRET)
+os.environ.pop("WORKER_STATE_DIR", None)
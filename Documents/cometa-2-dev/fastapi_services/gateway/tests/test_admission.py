@@ -0,0 +1,127 @@
+"""
+Tests for adaptive concurrency limits and priority load shedding
+"""
+import asyncio
+
+import pytest
+
+from admission import AIMD, GRADIENT, AdaptiveLimit, AdmissionController, Overloaded, classify
+
+
+def controller(**overrides) -> AdmissionController:
+    settings = dict(algorithm=GRADIENT, initial=2, min_limit=1, max_limit=10, max_queue=2,
+                    queue_timeout=1.0, retry_after=3)
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+@pytest.mark.parametrize("method, explicit, listing, priority", [
+    ("GET", None, True, "low"),
+    ("GET", None, False, "normal"),
+    ("POST", None, True, "high"),
+    ("GET", "critical", True, "critical"),
+])
+def test_classify(method, explicit, listing, priority):
+    assert classify(method, explicit, listing) == priority
+
+
+def test_failures_back_off_and_missing_samples_leave_the_limit():
+    limit = AdaptiveLimit(GRADIENT, initial=20, min_limit=4, max_limit=200)
+    limit.update(None, in_flight=20, failed=False)
+    assert limit.limit == 20
+    limit.update(0.01, in_flight=20, failed=True)
+    assert limit.limit == 18
+    for _ in range(50):
+        limit.update(None, in_flight=20, failed=True)
+    assert limit.limit == 4
+
+
+def test_rising_latency_shrinks_the_limit():
+    for algorithm in (GRADIENT, AIMD):
+        limit = AdaptiveLimit(algorithm, initial=50, min_limit=4, max_limit=200)
+        for _ in range(20):
+            limit.update(0.01, in_flight=50, failed=False)
+        before = limit.limit
+        for _ in range(10):
+            limit.update(0.2, in_flight=50, failed=False)
+        assert limit.limit < before
+
+
+def test_queued_requests_are_admitted_by_priority():
+    async def run():
+        service = controller(max_queue=5).service("team")
+        await service.acquire("low")
+        await service.acquire("low")
+        order = []
+
+        async def waiting(priority):
+            await service.acquire(priority)
+            order.append(priority)
+
+        tasks = [asyncio.create_task(waiting(priority)) for priority in ("low", "normal", "critical")]
+        await asyncio.sleep(0)
+        assert service.queue_depth == 3
+        for _ in range(3):
+            service.release(None, failed=False)
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["critical", "normal", "low"]
+
+
+def test_full_queue_sheds_the_least_important_request():
+    async def run():
+        service = controller(max_queue=1).service("team")
+        await service.acquire("normal")
+        await service.acquire("normal")
+        low = asyncio.create_task(service.acquire("low"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as shed:
+            await service.acquire("low")
+        assert shed.value.retry_after == 3
+        # A more important request displaces the queued one
+        high = asyncio.create_task(service.acquire("high"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await low
+        service.release(None, failed=False)
+        await high
+        return service.stats()
+
+    stats = asyncio.run(run())
+    assert stats["shed"] == {"low": 2}
+    assert stats["in_flight"] == 2
+
+
+def test_queue_timeout_sheds_and_leaves_no_waiter_behind():
+    async def run():
+        service = controller(initial=1, queue_timeout=0.01).service("team")
+        await service.acquire("normal")
+        with pytest.raises(Overloaded):
+            await service.acquire("normal")
+        assert service.queue_depth == 0
+        service.release(None, failed=False)
+        assert service.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_gives_its_slot_back():
+    async def run():
+        service = controller(initial=1).service("team")
+        await service.acquire("normal")
+        waiter = asyncio.create_task(service.acquire("normal"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        service.release(None, failed=False)
+        assert service.in_flight == 0
+        assert service.queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_unknown_algorithm_falls_back_to_gradient():
+    assert controller(algorithm="magic").algorithm == GRADIENT
@@ -0,0 +1,106 @@
+"""
+Tests for the gateway response cache
+"""
+import pytest
+
+from cache import ResponseCache, parse_routes, principal_for, request_key, shareable
+
+JSON = [(b"content-type", b"application/json")]
+
+
+def cache(**overrides) -> ResponseCache:
+    settings = dict(routes={"/api/projects": 30.0}, max_bytes=64 * 1024, max_entry_bytes=4 * 1024)
+    settings.update(overrides)
+    return ResponseCache(**settings)
+
+
+def store(c: ResponseCache, key, headers=JSON, body=b"[]", cache_control="", generation=None, status_code=200):
+    if generation is None:
+        generation = c.generation("/api/projects")
+    return c.store(key, "/api/projects", generation, status_code, headers, body, cache_control, None)
+
+
+def test_parse_routes():
+    assert parse_routes("/api/projects/=30, /api/materials=60,bad") == {"/api/projects": 30.0, "/api/materials": 60.0}
+
+
+def test_principal_separates_credentials_including_cookies():
+    assert principal_for({}) == "anonymous"
+    alice = principal_for({"cookie": "session=alice"})
+    bob = principal_for({"cookie": "session=bob"})
+    assert alice != "anonymous" and alice != bob
+    assert principal_for({"authorization": "Bearer a"}) != principal_for({"authorization": "Bearer b"})
+
+
+def test_request_key_normalises_query_order():
+    headers = {"accept-encoding": "gzip"}
+    assert request_key("/api/projects/", "b=2&a=1", headers) == request_key("/api/projects", "a=1&b=2", headers)
+
+
+@pytest.mark.parametrize("headers, expected", [
+    (JSON, True),
+    (JSON + [(b"vary", b"Accept-Encoding")], True),
+    (JSON + [(b"Set-Cookie", b"session=abc")], False),
+    (JSON + [(b"vary", b"Accept")], False),
+    (JSON + [(b"vary", b"accept-encoding, Authorization")], False),
+    (JSON + [(b"vary", b"*")], False),
+])
+def test_shareable(headers, expected):
+    assert shareable(headers) is expected
+
+
+def test_store_refuses_responses_it_must_not_replay():
+    c = cache()
+    assert store(c, ("a",), headers=JSON + [(b"set-cookie", b"session=abc")]) is None
+    assert store(c, ("b",), headers=JSON + [(b"vary", b"Accept-Language")]) is None
+    assert store(c, ("c",), status_code=404) is None
+    assert store(c, ("d",), body=b"x" * 5000) is None
+    assert store(c, ("e",), cache_control="no-store") is None
+    assert c.stats()["entries"] == 0
+    assert store(c, ("f",)) is not None
+
+
+def test_responses_fetched_before_a_write_are_not_stored():
+    c = cache()
+    generation = c.generation("/api/projects")
+    c.invalidate("/api/projects/42")
+    assert store(c, ("a",), generation=generation) is None
+
+
+def test_invalidation_drops_the_prefix():
+    c = cache()
+    store(c, ("a",))
+    c.invalidate("/api/projects/42")
+    assert c.get(("a",)) is None
+    assert c.bytes == 0
+
+
+def test_lru_eviction_keeps_within_max_bytes():
+    c = cache(max_bytes=4100)
+    for name in "abc":
+        store(c, (name,), body=b"x" * 800)
+    c.get(("a",))
+    store(c, ("d",), body=b"x" * 800)
+    assert c.get(("b",)) is None
+    assert c.get(("a",)) is not None
+    assert c.bytes <= c.max_bytes
+
+
+@pytest.mark.parametrize("cache_control, ttl", [
+    ("", 30.0),
+    ("max-age=10", 10.0),
+    ("public, s-maxage=5, max-age=10", 5.0),
+    ("max-age=600", 30.0),
+    ("max-age=soon", 30.0),
+    ("no-cache", 0.0),
+    ("no-store", None),
+])
+def test_ttl_for(cache_control, ttl):
+    assert cache().ttl_for("/api/projects", cache_control) == ttl
+
+
+def test_route_for_picks_the_longest_prefix():
+    c = cache(routes={"/api/projects": 30.0, "/api/projects/archive": 300.0})
+    assert c.route_for("/api/projects/archive/7") == "/api/projects/archive"
+    assert c.route_for("/api/projectsx") is None
+    assert cache(enabled=False).route_for("/api/projects") is None
@@ -0,0 +1,82 @@
+"""
+Tests for the upstream circuit breakers
+"""
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, BreakerConfig, CircuitBreaker
+
+
+def breaker(**overrides) -> CircuitBreaker:
+    config = dict(window_seconds=30, min_requests=10, error_rate_threshold=0.5, slow_call_seconds=1.0,
+                  slow_rate_threshold=0.8, consecutive_failures=3, open_seconds=60, half_open_max_calls=2)
+    config.update(overrides)
+    return CircuitBreaker("team", BreakerConfig(**config))
+
+
+def test_consecutive_failures_open_the_breaker():
+    b = breaker()
+    for _ in range(3):
+        assert b.allow_request()
+        b.record_failure(0.01, "HTTP 503")
+    assert b.state == OPEN
+    assert not b.allow_request()
+    assert b.stats()["rejected"] == 1
+    assert b.stats()["last_failure"] == "HTTP 503"
+    assert b.retry_after() > 1
+
+
+def test_a_success_resets_the_failure_run():
+    b = breaker(min_requests=100)
+    for _ in range(5):
+        b.record_failure(0.01)
+        b.record_failure(0.01)
+        b.record_success(0.01)
+    assert b.state == CLOSED
+    assert b.stats()["consecutive_failures"] == 0
+
+
+def test_error_rate_opens_once_the_window_has_enough_calls():
+    b = breaker(consecutive_failures=100)
+    for _ in range(4):
+        b.record_failure(0.01)
+        b.record_success(0.01)
+    assert b.state == CLOSED
+    b.record_failure(0.01)
+    b.record_success(0.01)
+    assert b.state == OPEN
+
+
+def test_slow_calls_open_the_breaker():
+    b = breaker()
+    for _ in range(10):
+        b.record_success(2.0)
+    assert b.state == OPEN
+
+
+def test_half_open_admits_limited_probes_and_closes_after_successes():
+    b = breaker(open_seconds=0)
+    for _ in range(3):
+        b.record_failure(0.01)
+    assert b.state == HALF_OPEN
+    assert b.allow_request() and b.allow_request()
+    assert not b.allow_request()
+    b.record_success(0.01)
+    b.record_success(0.01)
+    assert b.state == CLOSED
+
+
+def test_half_open_failure_reopens():
+    b = breaker(open_seconds=0)
+    for _ in range(3):
+        b.record_failure(0.01)
+    assert b.allow_request()
+    b.record_failure(0.01)
+    assert b.stats()["times_opened"] == 2
+
+
+def test_release_returns_an_abandoned_probe_slot():
+    b = breaker(open_seconds=0, half_open_max_calls=1)
+    for _ in range(3):
+        b.record_failure(0.01)
+    assert b.allow_request()
+    assert not b.allow_request()
+    b.release()
+    assert b.allow_request()
@@ -0,0 +1,191 @@
+"""
+Tests for the API Gateway app, with upstream services replaced by a mock transport
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+
+import httpx
+import pytest
+
+import main
+from admission import build_admission_controller
+from cache import build_response_cache
+from circuit_breaker import build_breakers
+from conftest import TEST_JWT_SECRET
+from live import build_live_hub
+from pools import build_service_pools
+from rate_limit import InMemoryBackend
+from single_flight import SingleFlight
+
+
+class Body(httpx.AsyncByteStream):
+    """Upstream body sent in chunks; on_chunk runs before each one is handed over"""
+
+    def __init__(self, chunks, on_chunk=None):
+        self.chunks = chunks
+        self.on_chunk = on_chunk
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            if self.on_chunk:
+                self.on_chunk()
+            yield chunk
+
+
+def jwt(claims: dict) -> str:
+    def b64url(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    signing_input = f"{b64url(json.dumps({'alg': 'HS256'}).encode())}.{b64url(json.dumps(claims).encode())}"
+    signature = hmac.new(TEST_JWT_SECRET.encode(), signing_input.encode("ascii"), hashlib.sha256).digest()
+    return f"{signing_input}.{b64url(signature)}"
+
+
+class Upstream:
+    """Records proxied requests and answers them with respond(request)"""
+
+    def __init__(self):
+        self.requests = []
+        self.respond = lambda request: httpx.Response(
+            200, headers={"content-type": "application/json"}, stream=Body([b'{"items": []}'])
+        )
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.respond(request)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Fresh gateway state per test, with every service answered by the returned Upstream"""
+    logging.disable(logging.WARNING)
+    mock = Upstream()
+    monkeypatch.setattr(main, "pools", build_service_pools(main.SERVICES, transport=httpx.MockTransport(mock)))
+    monkeypatch.setattr(main, "breakers", build_breakers(main.SERVICES))
+    monkeypatch.setattr(main, "admission", build_admission_controller())
+    monkeypatch.setattr(main, "live_hub", build_live_hub())
+    monkeypatch.setattr(main, "single_flight", SingleFlight())
+    cache = build_response_cache()
+    cache.set_route_ttls(main.route_config.table.cache_ttls())
+    monkeypatch.setattr(main, "response_cache", cache)
+    monkeypatch.setattr(main.rate_limiter, "backend", InMemoryBackend())
+    yield mock
+    logging.disable(logging.NOTSET)
+
+
+def call(requests):
+    """Send (method, path, headers) requests in order through the gateway app"""
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway") as client:
+            return [await client.request(method, path, headers=headers) for method, path, headers in requests]
+
+    return asyncio.run(run())
+
+
+def test_made_up_tokens_do_not_escape_the_login_limit(upstream):
+    responses = call([
+        ("POST", "/api/auth/login", {"authorization": f"Bearer {secrets.token_hex(8)}"}) for _ in range(10)
+    ])
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(429) == 5
+    assert responses[-1].headers["retry-after"]
+    assert len(upstream.requests) == 5
+
+
+@pytest.mark.parametrize("token", [
+    "MQ.e30.eA",
+    "W10.e30.eA",
+    "not-a-token",
+    jwt({"sub": "1", "exp": "tomorrow"}),
+    jwt({"sub": "1", "nbf": [1]}),
+])
+def test_malformed_tokens_get_401_not_500(upstream, token):
+    (response,) = call([("GET", "/api/teams", {"authorization": f"Bearer {token}"})])
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+    assert upstream.requests == []
+
+
+def test_verified_identity_replaces_client_supplied_headers(upstream):
+    call([("GET", "/api/teams", {"authorization": f"Bearer {jwt({'sub': '42'})}", "x-user-id": "1"})])
+    (request,) = upstream.requests
+    assert request.headers["x-user-id"] == "42"
+    assert request.headers["x-auth-verified"] == "gateway"
+
+
+def test_cache_serves_plain_responses_but_not_ones_setting_cookies(upstream):
+    responses = call([("GET", "/api/projects", {}), ("GET", "/api/projects", {})])
+    assert [response.headers.get("x-cache") for response in responses] == ["MISS", "HIT"]
+    assert len(upstream.requests) == 1
+
+    upstream.respond = lambda request: httpx.Response(
+        200, headers={"content-type": "application/json", "set-cookie": "session=abc"}, stream=Body([b"[]"])
+    )
+    call([("GET", "/api/projects?page=2", {}), ("GET", "/api/projects?page=2", {})])
+    assert len(upstream.requests) == 3
+
+
+def test_admission_slot_is_held_until_the_body_is_relayed(upstream):
+    in_flight = []
+
+    def sample():
+        in_flight.append(main.admission.service("team").in_flight)
+
+    upstream.respond = lambda request: httpx.Response(
+        200, headers={"content-type": "application/json"}, stream=Body([b"[", b"1", b"]"], on_chunk=sample)
+    )
+    (response,) = call([("GET", "/api/teams", {})])
+    assert response.content == b"[1]"
+    assert in_flight == [1, 1, 1]
+    assert main.admission.service("team").in_flight == 0
+
+
+def test_open_breaker_fast_fails_without_shrinking_the_limit(upstream):
+    breaker = main.breakers["team"]
+    for _ in range(breaker.config.consecutive_failures):
+        breaker.record_failure(0.01)
+    limit = main.admission.service("team").limit.limit
+
+    (response,) = call([("GET", "/api/teams", {})])
+    assert response.status_code == 503
+    assert response.headers["retry-after"]
+    assert upstream.requests == []
+    assert main.admission.service("team").limit.limit == limit
+    assert main.admission.service("team").in_flight == 0
+
+
+def test_upstream_errors_release_the_slot(upstream):
+    def refuse(request):
+        raise httpx.ConnectError("connection refused")
+
+    upstream.respond = refuse
+    responses = call([("GET", "/api/teams", {}) for _ in range(3)])
+    assert all(response.status_code in (502, 503) for response in responses)
+    assert main.admission.service("team").in_flight == 0
+
+
+def test_lone_get_is_streamed_not_marked_coalesced(upstream):
+    (response,) = call([("GET", "/api/teams", {})])
+    assert response.status_code == 200
+    assert "x-coalesced" not in response.headers
+    assert main.single_flight.stats()["in_flight"] == 0
+
+
+def test_shared_live_stream_is_opened_without_the_callers_credentials(upstream):
+    upstream.respond = lambda request: httpx.Response(
+        200, headers={"content-type": "text/event-stream"}, stream=Body([b"id: 1\ndata: hello\n\n"])
+    )
+    (response,) = call([("GET", "/api/activities", {
+        "accept": "text/event-stream",
+        "authorization": f"Bearer {jwt({'sub': '42'})}",
+    })])
+    assert response.status_code == 200
+    assert b"data: hello" in response.content
+    (request,) = upstream.requests
+    assert "authorization" not in request.headers
+    assert "x-user-id" not in request.headers
@@ -0,0 +1,138 @@
+"""
+Tests for gateway-side JWT verification
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from jwt_auth import KeysUnavailable, SigningKeys, TokenError, TokenVerifier, bearer_token, identity_headers
+
+SECRET = "test-secret"
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def segment(value) -> str:
+    return b64url(json.dumps(value).encode("utf-8"))
+
+
+def sign(header_b64: str, payload_b64: str, secret: str = SECRET, digest=hashlib.sha256) -> str:
+    signature = hmac.new(secret.encode("utf-8"), f"{header_b64}.{payload_b64}".encode("ascii"), digest).digest()
+    return f"{header_b64}.{payload_b64}.{b64url(signature)}"
+
+
+def token(claims, header=None, secret: str = SECRET) -> str:
+    return sign(segment(header or {"alg": "HS256", "typ": "JWT"}), segment(claims), secret)
+
+
+def verifier(fetch=None, static_secret=SECRET) -> TokenVerifier:
+    async def no_keys():
+        return []
+
+    return TokenVerifier(SigningKeys(fetch or no_keys, ttl=300, static_secret=static_secret), cache_ttl=30)
+
+
+def verify(v: TokenVerifier, value: str) -> dict:
+    return asyncio.run(v.verify(value))
+
+
+def test_valid_token_is_verified_and_cached():
+    v = verifier()
+    value = token({"sub": "42", "exp": time.time() + 60})
+    assert verify(v, value)["sub"] == "42"
+    assert verify(v, value)["sub"] == "42"
+    assert v.stats()["verified"] == 1
+    assert v.stats()["cache_hits"] == 1
+
+
+@pytest.mark.parametrize("value", [
+    "",
+    "abc",
+    "a.b",
+    "a.b.c.d",
+    "!!!.e30.eA",
+    "MQ.e30.eA",                                  # header is the number 1
+    "W10.e30.eA",                                 # header is a list
+    segment({"alg": "HS256", "kid": ["a"]}) + ".e30.eA",
+    segment({"alg": ["HS256"]}) + ".e30.eA",
+    segment({"alg": "HS256"}) + ".e30.é",
+    "é" + segment({"alg": "HS256"}) + ".e30.eA",
+])
+def test_malformed_tokens_are_rejected_as_token_errors(value):
+    v = verifier()
+    with pytest.raises(TokenError):
+        verify(v, value)
+    assert v.stats()["rejected"] == 1
+
+
+@pytest.mark.parametrize("claims", [
+    [1, 2],
+    "subject",
+    {"sub": "1", "exp": "tomorrow"},
+    {"sub": "1", "exp": None},
+    {"sub": "1", "exp": True},
+    {"sub": "1", "nbf": {"at": 1}},
+])
+def test_malformed_claims_are_rejected_as_token_errors(claims):
+    with pytest.raises(TokenError, match="Malformed"):
+        verify(verifier(), token(claims))
+
+
+def test_nan_expiry_is_rejected():
+    header_b64 = segment({"alg": "HS256"})
+    payload_b64 = b64url(b'{"sub": "1", "exp": NaN}')
+    with pytest.raises(TokenError, match="Malformed"):
+        verify(verifier(), sign(header_b64, payload_b64))
+
+
+def test_expired_and_not_yet_valid_tokens():
+    v = verifier()
+    with pytest.raises(TokenError, match="expired"):
+        verify(v, token({"sub": "1", "exp": time.time() - 60}))
+    with pytest.raises(TokenError, match="not yet valid"):
+        verify(v, token({"sub": "1", "nbf": time.time() + 60}))
+    # Within the leeway
+    assert verify(v, token({"sub": "1", "exp": time.time() - 1}))["sub"] == "1"
+
+
+def test_bad_signature_and_algorithms():
+    v = verifier()
+    with pytest.raises(TokenError, match="signature"):
+        verify(v, token({"sub": "1"}, secret="other-secret"))
+    with pytest.raises(TokenError, match="Unsupported"):
+        verify(v, token({"sub": "1"}, header={"alg": "none"}))
+    with pytest.raises(TokenError, match="Unknown signing key"):
+        verify(v, token({"sub": "1"}, header={"alg": "HS512"}))
+
+
+def test_no_keys_raises_keys_unavailable():
+    v = verifier(static_secret=None)
+    with pytest.raises(KeysUnavailable):
+        verify(v, token({"sub": "1"}))
+
+
+def test_keys_are_fetched_and_selected_by_kid():
+    async def fetch():
+        return [{"kid": "k1", "alg": "HS256", "k": b64url(b"fetched-secret")}]
+
+    v = verifier(fetch, static_secret=None)
+    good = token({"sub": "7"}, header={"alg": "HS256", "kid": "k1"}, secret="fetched-secret")
+    assert verify(v, good)["sub"] == "7"
+    with pytest.raises(TokenError, match="Unknown signing key"):
+        verify(v, token({"sub": "7"}, header={"alg": "HS256", "kid": "k2"}, secret="fetched-secret"))
+
+
+def test_bearer_token_and_identity_headers():
+    assert bearer_token("Bearer abc ") == "abc"
+    assert bearer_token("Basic abc") is None
+    assert bearer_token("Bearer ") is None
+    assert identity_headers({"user_id": 5, "role": "admin"}) == {
+        "x-auth-verified": "gateway", "x-user-id": "5", "x-user-role": "admin"
+    }
@@ -0,0 +1,143 @@
+"""
+Tests for Server-Sent Events parsing and fan-out
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from live import HEARTBEAT, EventParser, EventTooLarge, LiveHub, Subscriber, Subscription, event_id, websocket_close_code
+
+
+class EventStream(httpx.AsyncByteStream):
+    """Upstream body fed from a queue; None ends it"""
+
+    def __init__(self):
+        self.chunks = asyncio.Queue()
+
+    async def __aiter__(self):
+        while True:
+            chunk = await self.chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+def hub(**overrides) -> LiveHub:
+    settings = dict(heartbeat=0.05, idle_timeout=5, buffer_bytes=1024, max_event_bytes=256,
+                    max_connections=10, replay_events=3)
+    settings.update(overrides)
+    return LiveHub(**settings)
+
+
+def test_parser_splits_events_across_chunks():
+    parser = EventParser(max_event_bytes=100)
+    assert parser.feed(b"id: 1\ndata: a") == []
+    assert parser.feed(b"\n\nid: 2\r\ndata: b\r\n\r\nda") == [b"id: 1\ndata: a\n\n", b"id: 2\r\ndata: b\r\n\r\n"]
+    assert event_id(b"id: 2\r\ndata: b\r\n\r\n") == b"2"
+    assert event_id(b"data: x\n\n") is None
+
+
+def test_parser_refuses_oversized_events():
+    parser = EventParser(max_event_bytes=10)
+    with pytest.raises(EventTooLarge):
+        parser.feed(b"data: " + b"x" * 20)
+
+
+def test_slow_subscriber_is_cut_off():
+    async def run():
+        subscriber = Subscriber(max_bytes=10)
+        assert subscriber.offer(b"12345")
+        assert not subscriber.offer(b"123456")
+        assert subscriber.closed == "slow consumer"
+        assert await subscriber.next(0.01) == b"12345"
+        assert await subscriber.next(0.01) is None
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("code, sent", [(None, 1000), (1005, 1000), (1006, 1011), (4001, 4001), (999, 1000)])
+def test_websocket_close_code(code, sent):
+    assert websocket_close_code(code) == sent
+
+
+def test_subscribers_share_one_upstream_and_replay_after_last_event_id():
+    async def run():
+        live = hub()
+        stream = EventStream()
+        opened, closed = [], []
+
+        async def open_stream():
+            await asyncio.sleep(0.01)
+            opened.append(1)
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=stream)
+
+        async def close(service_name, response):
+            closed.append(service_name)
+
+        first, second = await asyncio.gather(
+            live.subscription(("activity", "/activities"), "activity", open_stream, close),
+            live.subscription(("activity", "/activities"), "activity", open_stream, close),
+        )
+        assert isinstance(first, Subscription) and first is second
+        assert len(opened) == 1
+
+        early = first.join(None)
+        for number in range(1, 5):
+            await stream.chunks.put(f"id: {number}\ndata: {number}\n\n".encode())
+        await asyncio.sleep(0.01)
+        late = first.join("2")
+        assert [await late.next(0.01) for _ in range(2)] == [b"id: 3\ndata: 3\n\n", b"id: 4\ndata: 4\n\n"]
+        assert (await early.next(0.01)).startswith(b"id: 1")
+
+        first.leave(late)
+        first.leave(early)
+        await asyncio.sleep(0.01)
+        return live, closed
+
+    live, closed = asyncio.run(run())
+    assert live.subscriptions == {}
+    assert closed == ["activity"]
+    assert live.stats()["events"] == 4
+
+
+def test_non_event_stream_answer_is_returned_for_relaying():
+    async def run():
+        async def open_stream():
+            return httpx.Response(401, json={"detail": "Not authenticated"})
+
+        async def close(service_name, response):
+            pass
+
+        live = hub()
+        answer = await live.subscription(("activity", "/activities"), "activity", open_stream, close)
+        assert isinstance(answer, httpx.Response) and answer.status_code == 401
+        assert live.subscriptions == {}
+
+    asyncio.run(run())
+
+
+def test_fanned_out_body_sends_heartbeats_and_ends_when_upstream_closes():
+    async def run():
+        live = hub()
+        stream = EventStream()
+
+        async def open_stream():
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=stream)
+
+        async def close(service_name, response):
+            pass
+
+        subscription = await live.subscription(("activity", "/activities"), "activity", open_stream, close)
+        body = live.fanned_out(subscription, subscription.join(None))
+        assert await body.__anext__() == HEARTBEAT
+        assert live.connections["sse"] == 1
+        await stream.chunks.put(b"data: hello\n\n")
+        assert await body.__anext__() == b"data: hello\n\n"
+        await stream.chunks.put(None)
+        with pytest.raises(StopAsyncIteration):
+            while True:
+                await body.__anext__()
+        return live
+
+    assert asyncio.run(run()).connections["sse"] == 0
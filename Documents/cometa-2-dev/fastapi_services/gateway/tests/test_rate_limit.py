@@ -0,0 +1,139 @@
+"""
+Tests for token-bucket rate limiting
+"""
+import asyncio
+
+import pytest
+
+from rate_limit import InMemoryBackend, RateLimiter, RateLimitMiddleware, parse_limit, parse_route_limits
+
+
+def scope(path="/api/teams", client="10.0.0.1", headers=()):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "client": (client, 50000),
+        "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    }
+
+
+def limiter(client="5:5", routes="/api/auth/login=1:2", identify=None, trust_forwarded_for=False) -> RateLimiter:
+    return RateLimiter(InMemoryBackend(), parse_limit(client), parse_route_limits(routes),
+                       trust_forwarded_for=trust_forwarded_for, identify=identify)
+
+
+def allowed(limiter: RateLimiter, request_scope) -> bool:
+    client, route = asyncio.run(limiter.check(request_scope))
+    return client.allowed and (route is None or route.allowed)
+
+
+def test_parse_limit_and_route_order():
+    assert parse_limit("20:40").burst == 40
+    assert parse_limit("2.5").burst == 3
+    rules = parse_route_limits("/api/auth=5:5, /api/auth/login/=0.2:5")
+    assert [rule.prefix for rule in rules] == ["/api/auth/login", "/api/auth"]
+
+
+def test_bucket_refuses_once_empty_and_reports_retry_after():
+    backend = InMemoryBackend()
+    rule = parse_limit("1:2")
+    assert backend.take_now("k", rule).allowed
+    assert backend.take_now("k", rule).allowed
+    decision = backend.take_now("k", rule)
+    assert not decision.allowed
+    assert 0 < decision.retry_after <= 1
+
+
+def test_backend_evicts_the_least_recently_used_client():
+    backend = InMemoryBackend(max_keys=2)
+    rule = parse_limit("1:1")
+    backend.take_now("a", rule)
+    backend.take_now("b", rule)
+    backend.take_now("a", rule)
+    backend.take_now("c", rule)
+    assert backend.take_now("a", rule).allowed is False
+    assert backend.take_now("b", rule).allowed is True
+
+
+def test_made_up_tokens_share_the_address_bucket():
+    rl = limiter()
+    results = [allowed(rl, scope(headers=[("authorization", f"Bearer forged-{i}")])) for i in range(8)]
+    assert results.count(True) == 5
+
+
+def test_unverified_x_token_does_not_pick_the_bucket():
+    async def identify(request_scope):
+        return None
+
+    rl = limiter(identify=identify)
+    results = [allowed(rl, scope(headers=[("x-token", f"t{i}")])) for i in range(8)]
+    assert results.count(True) == 5
+
+
+def test_verified_callers_get_their_own_bucket():
+    async def identify(request_scope):
+        return dict(request_scope["headers"]).get(b"x-test-user", b"").decode() or None
+
+    rl = limiter(identify=identify)
+    for user in ("u1", "u2"):
+        results = [allowed(rl, scope(headers=[("x-test-user", user)])) for _ in range(6)]
+        assert results.count(True) == 5
+
+
+def test_route_bucket_counts_per_address_even_for_verified_callers():
+    async def identify(request_scope):
+        return dict(request_scope["headers"])[b"x-test-user"].decode()
+
+    rl = limiter(identify=identify)
+    login = [allowed(rl, scope("/api/auth/login", headers=[("x-test-user", f"u{i}")])) for i in range(4)]
+    assert login == [True, True, False, False]
+
+
+def test_forwarded_for_is_ignored_unless_trusted():
+    rl = limiter()
+    results = [allowed(rl, scope(headers=[("x-forwarded-for", f"203.0.113.{i}")])) for i in range(8)]
+    assert results.count(True) == 5
+
+    trusting = limiter(trust_forwarded_for=True)
+    assert trusting.address_id(scope(headers=[("x-forwarded-for", "203.0.113.9, 10.0.0.2")])) == "ip:203.0.113.9"
+
+
+@pytest.mark.parametrize("path, method, limited", [
+    ("/api/teams", "GET", True),
+    ("/api/teams", "OPTIONS", False),
+    ("/health", "GET", False),
+])
+def test_middleware_answers_429_with_retry_after(path, method, limited):
+    calls = []
+
+    async def app(request_scope, receive, send):
+        calls.append(request_scope["path"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def run():
+        middleware = RateLimitMiddleware(app, limiter(client="1:1"))
+        responses = []
+        for _ in range(2):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            request_scope = scope(path)
+            request_scope["method"] = method
+            await middleware(request_scope, None, send)
+            responses.append(messages[0])
+        return responses
+
+    first, second = asyncio.run(run())
+    assert first["status"] == 200
+    if limited:
+        assert dict(first["headers"])[b"ratelimit-remaining"] == b"0"
+        assert second["status"] == 429
+        assert dict(second["headers"])[b"retry-after"] == b"1"
+        assert len(calls) == 1
+    else:
+        assert second["status"] == 200
+        assert len(calls) == 2
@@ -0,0 +1,85 @@
+"""
+Tests for request coalescing (single-flight)
+"""
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight, UpstreamResult
+
+
+def test_followers_receive_the_leaders_result():
+    async def run():
+        flights = SingleFlight()
+        assert flights.join("k") is None
+        flight = flights.lead("k")
+        followers = [flights.join("k") for _ in range(3)]
+        assert all(follower is flight for follower in followers)
+        result = UpstreamResult(200, [(b"content-type", b"application/json")], b"[]")
+        flights.finish("k", flight, result)
+        assert await flight.result is result
+        assert flights.join("k") is None
+        return flights.stats()
+
+    stats = asyncio.run(run())
+    assert stats["upstream_calls"] == 1
+    assert stats["coalesced"] == 3
+    assert stats["in_flight"] == 0
+
+
+def test_errors_reach_every_follower():
+    async def run():
+        flights = SingleFlight()
+        flight = flights.lead("k")
+        flights.join("k")
+        flights.finish("k", flight, RuntimeError("upstream down"))
+        with pytest.raises(RuntimeError):
+            await flight.result
+
+    asyncio.run(run())
+
+
+def test_an_error_nobody_waits_for_is_not_reported_as_unretrieved():
+    async def run():
+        loop = asyncio.get_running_loop()
+        unhandled = []
+        loop.set_exception_handler(lambda _, context: unhandled.append(context))
+        flights = SingleFlight()
+        flight = flights.lead("k")
+        flights.finish("k", flight, RuntimeError("upstream down"))
+        del flight
+        await asyncio.sleep(0)
+        return unhandled
+
+    assert asyncio.run(run()) == []
+
+
+def test_followers_are_released_to_fetch_alone():
+    async def run():
+        flights = SingleFlight()
+        flight = flights.lead("k")
+        flights.join("k")
+        flights.join("k")
+        flights.finish("k", flight, None)
+        assert await flight.result is None
+        return flights.stats()
+
+    assert asyncio.run(run())["released"] == 2
+
+
+def test_close_lets_new_callers_start_a_new_flight():
+    async def run():
+        flights = SingleFlight()
+        first = flights.lead("k")
+        flights.close("k", first)
+        assert flights.join("k") is None
+        second = flights.lead("k")
+        # Finishing the old flight must not end the new one
+        flights.finish("k", first, None)
+        assert flights.join("k") is second
+        flights.finish("k", second, None)
+        # Finishing twice is harmless
+        flights.finish("k", second, RuntimeError("late"))
+        assert second.result.result() is None
+
+    asyncio.run(run())
@@ -0,0 +1,79 @@
+"""
+Fast JSON encoding for COMETA services
+Uses orjson when it is installed (datetimes, UUIDs and enums are encoded
+natively, several times faster than the json module) and the standard library
+otherwise, with the same output for the types the services return. Handlers
+that return FastJSONResponse themselves skip FastAPI's jsonable_encoder pass
+"""
+import hashlib
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Iterable, List, Optional, Sequence
+from uuid import UUID
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # optional dependency; the json module is used instead
+    orjson = None
+
+
+def _default(value: Any):
+    """Types neither encoder handles natively, converted the way FastAPI's encoder does"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    if hasattr(value, "dict"):
+        return value.dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    loads = json.loads
+
+
+def row_dicts(fields: Sequence[str], rows: Iterable[Sequence]) -> List[dict]:
+    """Selected column rows as field -> value dicts, without building model instances"""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson where available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class StaticJSON:
+    """A response body encoded once, for endpoints whose content never changes while the process runs"""
+
+    def __init__(self, content: Any, max_age: int = 300):
+        self.body = dumps(content)
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:16]}"'
+        self.headers = {"etag": self.etag, "cache-control": f"public, max-age={max_age}"}
+
+    def response(self, request: Optional[Request] = None) -> Response:
+        if request is not None and request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type="application/json", headers=self.headers)
@@ -0,0 +1,153 @@
+"""
+Background health monitor shared by COMETA FastAPI services
+Dependency checks run on an interval in a background task and health endpoints
+answer from the cached results, with a latency history per dependency
+"""
+import asyncio
+import logging
+import os
+import statistics
+import time
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
+HEALTH_HISTORY_SIZE = int(os.getenv("HEALTH_HISTORY_SIZE", "30"))
+
+# A check returns whether the dependency is healthy plus optional details
+CheckFunction = Callable[[], Awaitable[tuple]]
+
+
+class DependencyHealth:
+    """Latest result and recent history of one dependency check"""
+
+    def __init__(self, name: str, check: CheckFunction, critical: bool, history_size: int):
+        self.name = name
+        self.check = check
+        self.critical = critical
+        self.healthy: Optional[bool] = None
+        self.detail: dict = {}
+        self.error: Optional[str] = None
+        self.latency: Optional[float] = None
+        self.checked_at: Optional[datetime] = None
+        self.consecutive_failures = 0
+        self.history = deque(maxlen=history_size)
+
+    def record(self, healthy: bool, latency: float, detail: dict = None, error: str = None):
+        self.healthy = healthy
+        self.latency = latency
+        self.detail = detail or {}
+        self.error = error
+        self.checked_at = datetime.now()
+        self.consecutive_failures = 0 if healthy else self.consecutive_failures + 1
+        self.history.append((self.checked_at, latency, healthy))
+
+    def snapshot(self, include_history: bool = True) -> dict:
+        if self.healthy is None:
+            status = "unknown"
+        else:
+            status = "healthy" if self.healthy else "unhealthy"
+        result = {
+            "status": status,
+            "critical": self.critical,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "checked_at": self.checked_at.isoformat() if self.checked_at else None,
+            "consecutive_failures": self.consecutive_failures,
+            **self.detail,
+        }
+        if self.error:
+            result["error"] = self.error
+
+        latencies = [latency * 1000 for _, latency, _ in self.history]
+        if latencies:
+            ordered = sorted(latencies)
+            result["latency_summary_ms"] = {
+                "p50": round(statistics.median(ordered), 2),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                "max": round(ordered[-1], 2),
+            }
+        if include_history:
+            result["history"] = [
+                {"at": at.isoformat(), "latency_ms": round(latency * 1000, 2), "healthy": healthy}
+                for at, latency, healthy in self.history
+            ]
+        return result
+
+
+class HealthMonitor:
+    """Runs registered dependency checks in the background and caches the results"""
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL, timeout: float = HEALTH_CHECK_TIMEOUT,
+                 history_size: int = HEALTH_HISTORY_SIZE):
+        self.interval = interval
+        self.timeout = timeout
+        self.history_size = history_size
+        self.dependencies: Dict[str, DependencyHealth] = {}
+        self.rounds = 0
+        self.last_round_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, check: CheckFunction, critical: bool = True):
+        self.dependencies[name] = DependencyHealth(name, check, critical, self.history_size)
+
+    def unregister(self, name: str):
+        self.dependencies.pop(name, None)
+
+    async def _run_check(self, dependency: DependencyHealth):
+        started = time.perf_counter()
+        try:
+            healthy, detail = await asyncio.wait_for(dependency.check(), timeout=self.timeout)
+            dependency.record(bool(healthy), time.perf_counter() - started, detail)
+        except asyncio.TimeoutError:
+            dependency.record(False, time.perf_counter() - started, error=f"Timed out after {self.timeout}s")
+        except Exception as e:
+            dependency.record(False, time.perf_counter() - started, error=str(e))
+
+    async def refresh(self):
+        """Run every check once, concurrently"""
+        await asyncio.gather(*(self._run_check(d) for d in self.dependencies.values()))
+        self.rounds += 1
+        self.last_round_at = datetime.now()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health monitor round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_healthy(self, name: str) -> bool:
+        dependency = self.dependencies.get(name)
+        return bool(dependency and dependency.healthy)
+
+    def ready(self) -> bool:
+        """True once checks have run and every critical dependency is healthy"""
+        return self.rounds > 0 and all(d.healthy for d in self.dependencies.values() if d.critical)
+
+    def snapshot(self, include_history: bool = True) -> dict:
+        return {name: d.snapshot(include_history) for name, d in self.dependencies.items()}
+
+    def summary(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "rounds": self.rounds,
+            "last_round_at": self.last_round_at.isoformat() if self.last_round_at else None,
+        }
@@ -0,0 +1,284 @@
+"""
+Preforked multi-worker launcher for COMETA FastAPI services
+The master binds the listening socket once and forks uvicorn workers, one per
+core by default, which import the application after the fork. SIGHUP replaces
+the workers one at a time with freshly imported code: each replacement must be
+serving before the worker it replaces is asked to drain, and a replacement that
+fails to start aborts the reload with the old workers still serving.
+SIGTERM/SIGINT drain every worker; workers that die are restarted. The master
+owns the state directory of worker_state and removes it on exit
+"""
+import logging
+import os
+import select
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from worker_state import STATE_DIR_ENV, WORKER_ID_ENV, retire_worker
+
+logger = logging.getLogger(__name__)
+
+# A worker that exits this soon after starting is failing to boot, not crashing under load
+BOOT_GRACE_SECONDS = 10.0
+
+
+def worker_count(variable: str) -> int:
+    """Workers from the service's variable, WEB_CONCURRENCY, or one per core"""
+    value = os.getenv(variable) or os.getenv("WEB_CONCURRENCY")
+    return max(1, int(value)) if value else (os.cpu_count() or 1)
+
+
+class Worker:
+    """A forked worker as seen by the master"""
+
+    def __init__(self, index: int, pid: int, ready_fd: int):
+        self.index = index
+        self.pid = pid
+        self.ready_fd = ready_fd
+        self.started = time.monotonic()
+        self.ready = False
+        # Set when the master asked it to drain, with the time it must be gone by
+        self.drain_deadline: Optional[float] = None
+
+
+class Prefork:
+    """Master process of a preforked pool of uvicorn workers"""
+
+    def __init__(self, app: str, host: str, port: int, workers: int, graceful_timeout: float = 30.0,
+                 app_dirs: Optional[List[str]] = None, **uvicorn_options):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        # Modules loaded from these directories are re-imported by every new worker
+        self.app_dirs = [os.path.abspath(path) for path in app_dirs or [os.path.dirname(os.path.abspath(sys.argv[0]))]]
+        self.app_dirs.append(os.path.dirname(os.path.abspath(__file__)))
+        self.uvicorn_options = uvicorn_options
+        self.children: Dict[int, Worker] = {}
+        self.state_dir = ""
+        self._signals: List[int] = []
+        self._wakeup_r = self._wakeup_w = -1
+        self._socket = None
+        self._stopping = False
+        self.reloads = 0
+
+    # Worker side
+
+    def _run_worker(self, index: int, ready_fd: int):
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        for fd in [self._wakeup_r, self._wakeup_w] + [worker.ready_fd for worker in self.children.values()]:
+            if fd >= 0:
+                os.close(fd)
+        os.environ[WORKER_ID_ENV] = str(index)
+        # The master may have imported the application (python main.py); forget
+        # it so this worker runs the code currently on disk
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, "__file__", None)
+            if path and name != "__main__" and any(os.path.abspath(path).startswith(root + os.sep)
+                                                   for root in self.app_dirs):
+                del sys.modules[name]
+
+        import uvicorn
+
+        class WorkerServer(uvicorn.Server):
+            async def startup(self, sockets=None):
+                await super().startup(sockets=sockets)
+                # Tell the master this worker accepts connections
+                os.write(ready_fd, b"1")
+                os.close(ready_fd)
+
+        config = uvicorn.Config(self.app, timeout_graceful_shutdown=self.graceful_timeout, **self.uvicorn_options)
+        WorkerServer(config).run(sockets=[self._socket])
+
+    # Master side
+
+    def _spawn(self, index: int) -> Worker:
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            status = 1
+            try:
+                self._run_worker(index, ready_w)
+                status = 0
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+            finally:
+                os._exit(status)
+        os.close(ready_w)
+        worker = self.children[pid] = Worker(index, pid, ready_r)
+        logger.info(f"Started worker {index} [{pid}]")
+        return worker
+
+    def _handle_signal(self, signum, frame):
+        # SIGCHLD only needs to wake the master, which happens through the wakeup fd
+        if signum != signal.SIGCHLD:
+            self._signals.append(signum)
+
+    def _stop_requested(self) -> bool:
+        return any(signum in (signal.SIGTERM, signal.SIGINT) for signum in self._signals)
+
+    def _wait(self, timeout: float):
+        """Sleep until a signal, a worker becoming ready, or the timeout"""
+        pending = {worker.ready_fd: worker for worker in self.children.values() if worker.ready_fd >= 0}
+        try:
+            readable, _, _ = select.select([self._wakeup_r, *pending], [], [], timeout)
+        except InterruptedError:
+            return
+        for fd in readable:
+            if fd == self._wakeup_r:
+                os.read(self._wakeup_r, 512)
+                continue
+            worker = pending[fd]
+            if os.read(fd, 1):
+                worker.ready = True
+                logger.info(f"Worker {worker.index} [{worker.pid}] ready")
+            os.close(fd)
+            worker.ready_fd = -1
+
+    def _reap(self) -> List[Worker]:
+        """Collect exited workers; returns those that exited without being asked to"""
+        crashed = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            worker = self.children.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.ready_fd >= 0:
+                os.close(worker.ready_fd)
+            retire_worker(self.state_dir, pid)
+            if worker.drain_deadline is None and not self._stopping:
+                logger.error(f"Worker {worker.index} [{pid}] exited unexpectedly (status {status})")
+                crashed.append(worker)
+        now = time.monotonic()
+        for worker in self.children.values():
+            if worker.drain_deadline is not None and now > worker.drain_deadline:
+                logger.warning(f"Worker {worker.index} [{worker.pid}] did not drain in time; killing it")
+                os.kill(worker.pid, signal.SIGKILL)
+                worker.drain_deadline = float("inf")
+        return crashed
+
+    def _drain(self, worker: Worker):
+        worker.drain_deadline = time.monotonic() + self.graceful_timeout + 5
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _serving(self, index: int) -> Optional[Worker]:
+        for worker in self.children.values():
+            if worker.index == index and worker.drain_deadline is None:
+                return worker
+        return None
+
+    def _replace(self, index: int) -> bool:
+        """Start a new worker for index and wait until it serves; False if it failed to boot"""
+        worker = self._spawn(index)
+        deadline = time.monotonic() + BOOT_GRACE_SECONDS + self.graceful_timeout
+        while not worker.ready:
+            self._wait(0.5)
+            self._respawn(self._reap())
+            if worker.pid not in self.children or time.monotonic() > deadline or self._stop_requested():
+                if worker.pid in self.children:
+                    self._drain(worker)
+                return worker.ready
+        return True
+
+    def _respawn(self, crashed: List[Worker]):
+        for worker in crashed:
+            if not worker.ready and time.monotonic() - worker.started < BOOT_GRACE_SECONDS:
+                # Restarting a worker that cannot boot would only loop; keep the others serving
+                logger.error(f"Worker {worker.index} failed to boot; not restarting it")
+                continue
+            if self._serving(worker.index) is None:
+                self._spawn(worker.index)
+
+    def reload(self):
+        """Roll every worker over to freshly imported code, one at a time"""
+        self.reloads += 1
+        logger.info(f"Reloading {self.workers} workers")
+        for index in range(self.workers):
+            old = self._serving(index)
+            if not self._replace(index):
+                logger.error(f"Reload aborted: replacement for worker {index} did not start")
+                return
+            if old is not None and old.pid in self.children:
+                self._drain(old)
+        logger.info("Reload complete")
+
+    def stop(self):
+        self._stopping = True
+        logger.info(f"Stopping {len(self.children)} workers")
+        for worker in list(self.children.values()):
+            self._drain(worker)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self._wait(0.2)
+            self._reap()
+        for worker in self.children.values():
+            os.kill(worker.pid, signal.SIGKILL)
+
+    def run(self) -> int:
+        import uvicorn
+
+        self._socket = uvicorn.Config(self.app, host=self.host, port=self.port).bind_socket()
+        self._socket.set_inheritable(True)
+        self.state_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(self.app.split(':')[0])}-workers-",
+                                          dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        os.environ[STATE_DIR_ENV] = self.state_dir
+
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        for fd in (self._wakeup_r, self._wakeup_w):
+            os.set_blocking(fd, False)
+        signal.set_wakeup_fd(self._wakeup_w)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, self._handle_signal)
+
+        logger.info(f"Master [{os.getpid()}] serving {self.app} on {self.host}:{self.port} "
+                    f"with {self.workers} workers")
+        try:
+            for index in range(self.workers):
+                self._spawn(index)
+            while True:
+                self._wait(1.0)
+                self._respawn(self._reap())
+                while self._signals:
+                    signum = self._signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self.reload()
+                    elif signum in (signal.SIGTERM, signal.SIGINT):
+                        self.stop()
+                        return 0
+                if not self.children:
+                    logger.error("No workers left; exiting")
+                    return 1
+        finally:
+            signal.set_wakeup_fd(-1)
+            self._socket.close()
+            shutil.rmtree(self.state_dir, ignore_errors=True)
+
+
+def serve(app: str, host: str, port: int, workers: int, **uvicorn_options):
+    """Run app ("module:attribute") in a preforked pool; GRACEFUL_TIMEOUT_SECONDS bounds draining"""
+    logging.basicConfig(level=logging.INFO)
+    if not hasattr(os, "fork"):
+        import uvicorn
+        logger.warning("Preforking needs os.fork; running a single process")
+        uvicorn.run(app, host=host, port=port, **uvicorn_options)
+        return
+    graceful_timeout = float(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+    sys.exit(Prefork(app, host, port, workers, graceful_timeout=graceful_timeout, **uvicorn_options).run())
@@ -0,0 +1,305 @@
+"""
+Request tracing shared by COMETA FastAPI services
+Every request gets a request ID and a W3C trace context (traceparent), timed
+spans for the work done while handling it, a Server-Timing response header and
+optional export of the spans to a file or a collector
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(value: Optional[str]):
+    """(trace_id, parent span id, sampled) from a traceparent header, or None"""
+    match = TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+class Span:
+    """One timed unit of work within a trace"""
+    __slots__ = ("name", "span_id", "parent_id", "start", "started", "duration", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Optional[dict] = None):
+        self.name = name
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attributes = attributes or {}
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+
+
+class RequestTrace:
+    """Trace context and spans of the request being handled"""
+
+    def __init__(self, service: str, request_id: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.service = service
+        self.request_id = request_id
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.root = Span("request", parent_id)
+        self.spans: List[Span] = []
+
+    def traceparent(self, span: Optional[Span] = None) -> str:
+        """traceparent for an outgoing call made from span (default: the request span)"""
+        return format_traceparent(self.trace_id, (span or self.root).span_id, self.sampled)
+
+    def server_timing(self, prefix: str) -> str:
+        """Server-Timing value: total time so far plus the summed duration per span name"""
+        totals: Dict[str, list] = {}
+        for span in self.spans:
+            if span.duration is not None:
+                entry = totals.setdefault(span.name, [0.0, 0])
+                entry[0] += span.duration
+                entry[1] += 1
+        elapsed = time.perf_counter() - self.root.started
+        metrics = [f'{prefix};dur={elapsed * 1000:.2f};desc="total"']
+        for name, (duration, count) in totals.items():
+            desc = f';desc="{count} calls"' if count > 1 else ""
+            metrics.append(f"{prefix}-{name};dur={duration * 1000:.2f}{desc}")
+        return ", ".join(metrics)
+
+    def records(self) -> List[dict]:
+        return [
+            {
+                "trace_id": self.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "service": self.service,
+                "name": span.name,
+                "request_id": self.request_id,
+                "start": span.start,
+                "duration_ms": round((span.duration or 0.0) * 1000, 3),
+                "attributes": span.attributes,
+            }
+            for span in [self.root] + self.spans
+        ]
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    trace = current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block of work as a span of the current request (no-op outside one)"""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    child = Span(name, trace.root.span_id, attributes)
+    trace.spans.append(child)
+    try:
+        yield child
+    finally:
+        child.end()
+
+
+class SpanExporter:
+    """Buffers finished spans and writes them in batches off the event loop"""
+
+    def __init__(self, flush_interval: float = 2.0, max_buffer: int = 10_000):
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def export(self, records: List[dict]):
+        if len(self._buffer) + len(records) > self.max_buffer:
+            self.dropped += len(records)
+            return
+        self._buffer.extend(records)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            await self.write(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.errors += 1
+            self.dropped += len(batch)
+            logger.warning(f"Span export of {len(batch)} records failed: {e}")
+
+    async def write(self, batch: List[dict]):
+        raise NotImplementedError
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "exporter": type(self).__name__,
+            "buffered": len(self._buffer),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class FileExporter(SpanExporter):
+    """Appends spans as JSON lines to a local file"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def _append(self, batch: List[dict]):
+        with open(self.path, "a", encoding="utf-8") as trace_file:
+            trace_file.write("".join(json.dumps(record, default=str) + "\n" for record in batch))
+
+    async def write(self, batch: List[dict]):
+        await asyncio.to_thread(self._append, batch)
+
+
+class HttpExporter(SpanExporter):
+    """POSTs span batches as JSON to a collector endpoint"""
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(**kwargs)
+        import httpx
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=5.0)
+
+    async def write(self, batch: List[dict]):
+        response = await self._client.post(self.url, json={"spans": batch})
+        response.raise_for_status()
+
+    async def aclose(self):
+        await super().aclose()
+        await self._client.aclose()
+
+
+class Tracer:
+    """Per-service tracing settings shared by the middleware and outgoing calls"""
+
+    def __init__(self, service: str, timing_prefix: str, exporter: Optional[SpanExporter] = None,
+                 sample_ratio: float = 1.0):
+        self.service = service
+        self.timing_prefix = timing_prefix
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    def begin(self, headers: Dict[str, str]) -> RequestTrace:
+        """Continue the caller's trace or start a new one"""
+        request_id = headers.get("x-request-id", "")
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        parent = parse_traceparent(headers.get("traceparent"))
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = new_trace_id(), None, random.random() < self.sample_ratio
+        trace = RequestTrace(self.service, request_id, trace_id, parent_id, sampled)
+        current_trace.set(trace)
+        return trace
+
+    def end(self, trace: RequestTrace, status_code: int):
+        trace.root.end()
+        trace.root.attributes["status_code"] = status_code
+        if self.exporter is not None and trace.sampled:
+            self.exporter.export(trace.records())
+
+    async def aclose(self):
+        if self.exporter is not None:
+            await self.exporter.aclose()
+
+
+class TracingMiddleware:
+    """ASGI middleware adding request IDs, trace context and Server-Timing to every response"""
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        trace = self.tracer.begin(headers)
+        trace.root.attributes.update({"method": scope["method"], "path": scope["path"]})
+        status_code = 500
+
+        async def send_with_trace(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Replaces any request ID relayed from an upstream with this hop's own
+                message["headers"] = [
+                    (name, value) for name, value in message.get("headers", []) if name.lower() != b"x-request-id"
+                ] + [
+                    (b"x-request-id", trace.request_id.encode("latin-1")),
+                    (b"server-timing", trace.server_timing(self.tracer.timing_prefix).encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            self.tracer.end(trace, status_code)
+
+
+def build_tracer(service: str, timing_prefix: str) -> Tracer:
+    """Tracer from TRACE_* settings: TRACE_EXPORTER is none, file or http"""
+    exporter_name = os.getenv("TRACE_EXPORTER", "none").lower()
+    flush_interval = float(os.getenv("TRACE_FLUSH_INTERVAL", "2.0"))
+    exporter = None
+    if exporter_name == "file":
+        exporter = FileExporter(os.getenv("TRACE_FILE", f"traces-{service}.jsonl"), flush_interval=flush_interval)
+    elif exporter_name == "http":
+        exporter = HttpExporter(
+            os.getenv("TRACE_COLLECTOR_URL", "http://localhost:4318/v1/spans"), flush_interval=flush_interval
+        )
+    return Tracer(service, timing_prefix, exporter, float(os.getenv("TRACE_SAMPLE_RATIO", "1.0")))
@@ -0,0 +1,302 @@
+"""
+State shared by the workers of one prefork launch
+The launcher (prefork.py) creates a state directory, on tmpfs where available,
+and exports it to its workers. Inside it live fixed-size shared-memory tables
+for counters that must agree across workers (rate limits, login lockouts),
+Unix datagram sockets for broadcasting cache invalidations, and per-worker
+snapshots from which metrics are aggregated. Outside the launcher every
+helper returns None and services keep their process-local state
+"""
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import socket
+import struct
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR_ENV = "WORKER_STATE_DIR"
+WORKER_ID_ENV = "WORKER_ID"
+
+# Linux' default datagram limit is ~208KB; larger messages must be split by the sender
+MAX_MESSAGE_BYTES = 200 * 1024
+
+
+def state_dir() -> Optional[str]:
+    """The launch's state directory, or None outside the prefork launcher"""
+    return os.getenv(STATE_DIR_ENV) or None
+
+
+def worker_id() -> str:
+    return os.getenv(WORKER_ID_ENV, "0")
+
+
+class SharedTable:
+    """Fixed-size hash table of float records in a memory-mapped file
+
+    Keys are hashed to buckets of bucket_size slots; each bucket is guarded by
+    an fcntl byte-range lock, which the kernel releases if a worker dies while
+    holding it. A full bucket evicts its least recently updated record, so the
+    table behaves like the LRU-bounded in-memory stores it replaces. Times are
+    time.monotonic(), which is the same clock in every process of a host
+    """
+
+    def __init__(self, path: str, slots: int, values: int, bucket_size: int = 8):
+        self.values = values
+        self.bucket_size = bucket_size
+        self.buckets = 1 << max(0, math.ceil(math.log2(max(1, slots) / bucket_size)))
+        self.record = struct.Struct(f"16sd{values}d")
+        self.size = self.buckets * bucket_size * self.record.size
+        # Geometry is part of the name: workers of an older release never share a differently laid out file
+        self.path = f"{path}-{self.buckets * bucket_size}x{values}.table"
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < self.size:
+            os.ftruncate(self._fd, self.size)
+        self._map = mmap.mmap(self._fd, self.size)
+        self.evictions = 0
+
+    def _bucket(self, key: str) -> Tuple[bytes, int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        return digest, int.from_bytes(digest[:8], "little") & (self.buckets - 1)
+
+    def update(self, key: str, function: Callable[[Optional[tuple], float], tuple]):
+        """Apply function(values or None, now) -> (new values or None to delete, result) atomically"""
+        digest, bucket = self._bucket(key)
+        first = bucket * self.bucket_size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, bucket)
+        try:
+            now = time.monotonic()
+            found = empty = oldest = None
+            oldest_touched = None
+            for slot in range(first, first + self.bucket_size):
+                record = self.record.unpack_from(self._map, slot * self.record.size)
+                if record[0] == digest:
+                    found = slot, record
+                    break
+                if record[1] == 0.0:
+                    if empty is None:
+                        empty = slot
+                elif oldest_touched is None or record[1] < oldest_touched:
+                    oldest, oldest_touched = slot, record[1]
+
+            values, result = function(found[1][2:] if found else None, now)
+            slot = found[0] if found else (empty if empty is not None else oldest)
+            if values is None:
+                if found:
+                    self.record.pack_into(self._map, slot * self.record.size, bytes(16), 0.0, *[0.0] * self.values)
+            else:
+                if not found and empty is None:
+                    self.evictions += 1
+                self.record.pack_into(self._map, slot * self.record.size, digest, now, *values)
+            return result
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, bucket)
+
+    def get(self, key: str) -> Optional[tuple]:
+        return self.update(key, lambda values, now: (values, values))
+
+    def delete(self, key: str):
+        self.update(key, lambda values, now: (None, None))
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+def shared_table(name: str, slots: int, values: int) -> Optional[SharedTable]:
+    """Table shared by every worker of the launch, or None outside the launcher"""
+    directory = state_dir()
+    if directory is None:
+        return None
+    return SharedTable(os.path.join(directory, name), slots, values)
+
+
+class WorkerBroadcast:
+    """Fire-and-forget JSON messages to the other workers of the launch
+
+    Every worker binds a Unix datagram socket named after the channel and its
+    pid; publishing sends one datagram to each peer socket found in the state
+    directory. Messages are best effort: a peer whose socket buffer is full
+    misses the message and falls back to its own expiry
+    """
+
+    def __init__(self, directory: str, channel: str, handler: Callable[[dict], None]):
+        self.directory = os.path.join(directory, "bus")
+        self.channel = channel
+        self.handler = handler
+        self.path = os.path.join(self.directory, f"{channel}.{os.getpid()}.sock")
+        self._socket: Optional[socket.socket] = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._socket.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._socket.fileno(), self._receive)
+
+    def _receive(self):
+        while True:
+            try:
+                data = self._socket.recv(MAX_MESSAGE_BYTES)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.received += 1
+            try:
+                self.handler(json.loads(data))
+            except Exception as e:
+                logger.warning(f"Could not apply {self.channel} message from another worker: {e}")
+
+    def peers(self) -> List[str]:
+        prefix = self.channel + "."
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.startswith(prefix) and name.endswith(".sock") and os.path.join(self.directory, name) != self.path]
+
+    def publish(self, message: dict) -> int:
+        """Send message to every other worker; returns how many peers it reached"""
+        if self._socket is None:
+            return 0
+        data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        delivered = 0
+        for peer in self.peers():
+            try:
+                self._socket.sendto(data, peer)
+                delivered += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker that bound it has exited
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except OSError as e:
+                self.dropped += 1
+                logger.debug(f"Dropped {self.channel} message for {peer}: {e}")
+        self.published += 1
+        return delivered
+
+    def close(self):
+        if self._socket is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._socket.fileno())
+        except RuntimeError:
+            pass
+        self._socket.close()
+        self._socket = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "dropped": self.dropped}
+
+
+def worker_broadcast(channel: str, handler: Callable[[dict], None]) -> Optional[WorkerBroadcast]:
+    """Broadcast channel between the workers of the launch, or None outside the launcher"""
+    directory = state_dir()
+    if directory is None:
+        return None
+    return WorkerBroadcast(directory, channel, handler)
+
+
+class SnapshotBoard:
+    """Per-worker JSON snapshots, published on an interval and read by whichever worker aggregates
+
+    When a worker exits the launcher marks its snapshot retired (retire_worker):
+    its counters still count towards totals, its gauges no longer do
+    """
+
+    def __init__(self, directory: str, name: str, interval: float = 2.0):
+        self.directory = os.path.join(directory, "snapshots", name)
+        self.interval = interval
+        self.path = os.path.join(self.directory, f"{os.getpid()}.json")
+        self._task: Optional[asyncio.Task] = None
+        self._source: Optional[Callable[[], dict]] = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def publish(self, snapshot: dict):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(snapshot, handle, separators=(",", ":"))
+        os.replace(temporary, self.path)
+
+    def collect(self, include_retired: bool = True) -> List[Tuple[dict, bool]]:
+        """(snapshot, retired) for every worker of the launch"""
+        snapshots = []
+        for name in os.listdir(self.directory):
+            retired = name.endswith(".retired.json")
+            if not name.endswith(".json") or (retired and not include_retired):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as handle:
+                    snapshots.append((json.load(handle), retired))
+            except (OSError, ValueError):
+                # Removed or replaced between listing and reading
+                continue
+        return snapshots
+
+    def start(self, source: Callable[[], dict]):
+        self._source = source
+        self.publish(source())
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.publish(self._source())
+            except Exception as e:
+                logger.warning(f"Could not publish worker snapshot: {e}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.publish(self._source())
+
+
+def snapshot_board(name: str) -> Optional[SnapshotBoard]:
+    """Snapshot board of the launch (interval from WORKER_SNAPSHOT_SECONDS), or None outside the launcher"""
+    directory = state_dir()
+    if directory is None:
+        return None
+    return SnapshotBoard(directory, name, float(os.getenv("WORKER_SNAPSHOT_SECONDS", "2")))
+
+
+def retire_worker(directory: str, pid: int):
+    """Mark an exited worker's snapshots retired; called by the launcher after reaping it"""
+    root = os.path.join(directory, "snapshots")
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        path = os.path.join(root, name, f"{pid}.json")
+        if os.path.exists(path):
+            os.replace(path, os.path.join(root, name, f"{pid}.retired.json"))
+
+
+def sum_counts(snapshots: Sequence[dict]) -> dict:
+    """Integer leaves of nested stats dicts summed across workers; other values are left out"""
+    totals: dict = {}
+    for snapshot in snapshots:
+        for key, value in snapshot.items():
+            if isinstance(value, dict):
+                totals[key] = sum_counts([totals.get(key, {}), value])
+                if not totals[key]:
+                    del totals[key]
+            elif isinstance(value, int) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+    return totals